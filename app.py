@@ -3,13 +3,25 @@
 from flask import Flask, redirect, url_for, render_template
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
-from models import db, User
+from models import db
 from views.auth import auth_bp
 from views.sales import sales_bp
 from views.b2bc import b2bc_bp
 from views.booking import booking_bp
 from views.dashboard import dashboard_bp
 from views.products import products_bp
+from views.exports import exports_bp
+from utils.rollups import init_rollups
+from utils.dashboard_cache import init_dashboard_cache
+from utils.availability import init_availability
+from utils.user_cache import init_user_cache, load_user
+from utils.reference_data import init_reference_data
+from utils.commission import init_commissions
+from utils.pricing import init_pricing
+from utils.request_timing import init_request_timing
+from utils.slow_queries import init_slow_query_log
+from utils.db_engine import init_db_engine
+from sheet_to_db import sheets_cli
 from flask_wtf import CSRFProtect  # Import CSRFProtect if implementing later
 import os
 
@@ -23,8 +35,19 @@ def create_app():
     else:
         app.config.from_object('config.DevelopmentConfig')
     
+    init_db_engine(app)
     db.init_app(app)
+    init_request_timing(app)
+    init_slow_query_log(app)
     migrate = Migrate(app, db)
+    init_rollups(app)
+    init_dashboard_cache(app)
+    init_availability(app)
+    init_user_cache(app)
+    init_reference_data(app)
+    init_commissions(app)
+    init_pricing(app)
+    app.cli.add_command(sheets_cli)
     
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
@@ -33,9 +56,8 @@ def create_app():
     # Initialize CSRF Protection (to be implemented later)
     # csrf = CSRFProtect(app)
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    # Cached per process, see utils/user_cache.py
+    login_manager.user_loader(load_user)
     
     # Register Blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -44,6 +66,7 @@ def create_app():
     app.register_blueprint(booking_bp, url_prefix='/bookings')  # Ensure this line exists
     app.register_blueprint(dashboard_bp, url_prefix='/dashboard')
     app.register_blueprint(products_bp, url_prefix='/products')
+    app.register_blueprint(exports_bp, url_prefix='/exports')
     
     @app.route('/')
     def home():
@@ -0,0 +1,246 @@
+# benchmark.py
+"""
+Endpoint benchmark suite.
+
+Drives the dashboard, the list pages and the write endpoints through the
+Flask test client, logged in as an admin and as branch staff, and reports
+p50/p95/max latency and the SQL statement count of each scenario (read from
+the Server-Timing header, see utils/request_timing.py). Results can be saved
+as a JSON baseline and later runs compared against it:
+
+    DATABASE_URL=sqlite:///bench.db python benchmark.py --save-baseline baseline.json
+    DATABASE_URL=sqlite:///bench.db python benchmark.py --compare baseline.json
+
+Meant for a database filled by generate_data.py: the write scenarios insert
+rows. Read scenarios run against a cold dashboard/availability cache unless
+--warm-cache is given.
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import math
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+from app import create_app
+from models import db, User, SalesVoucherGroup, Booking, Product
+from utils.dashboard_cache import dashboard_cache
+from utils.availability import availability_cache
+
+SERVER_TIMING_SQL = re.compile(r'sql;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class Scenario:
+    """One request shape, issued `iterations` times as `role`."""
+
+    def __init__(self, name, role, method, path, form=None, json_body=None, expect=(200,), cold=False):
+        self.name = name
+        self.role = role
+        self.method = method
+        self.path = path  # str, or callable(iteration) -> str
+        self.form = form  # callable(iteration) -> dict
+        self.json_body = json_body  # callable(iteration) -> dict
+        self.expect = expect
+        self.cold = cold  # clear the result caches before every request
+
+    def request_args(self, iteration):
+        kwargs = {'method': self.method}
+        if self.form is not None:
+            kwargs['data'] = self.form(iteration)
+        if self.json_body is not None:
+            kwargs['json'] = self.json_body(iteration)
+        path = self.path(iteration) if callable(self.path) else self.path
+        return path, kwargs
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+# --------------------------------------------------------------------------------
+# Fixtures & scenarios
+# --------------------------------------------------------------------------------
+def load_fixtures(staff_username):
+    """Ids the write scenarios need, read from the benchmark database."""
+    staff = User.query.filter_by(username=staff_username).first()
+    if staff is None or staff.branch_id is None:
+        raise SystemExit(f"Branch staff user '{staff_username}' not found; run generate_data.py first.")
+    product = Product.query.filter_by(category='voucher').order_by(Product.id).first()
+    group_product = Product.query.filter_by(category='activities_group').order_by(Product.id).first()
+    group_sale = SalesVoucherGroup.query.filter_by(branch_id=staff.branch_id, sale_type='group')\
+        .order_by(SalesVoucherGroup.id.desc()).first()
+    booking_ids = [booking_id for booking_id, in db.session.query(Booking.id)
+                   .filter(Booking.branch_id == staff.branch_id, Booking.status.in_(('booked', 'confirmed')))
+                   .order_by(Booking.id.desc()).limit(20)]
+    if not (product and group_product and group_sale and booking_ids):
+        raise SystemExit("The database has no generated sales/bookings; run generate_data.py first.")
+    return {'branch_id': staff.branch_id, 'product_id': product.id, 'group_product_id': group_product.id,
+            'group_sale_id': group_sale.id, 'booking_ids': booking_ids}
+
+
+def scenarios(fx):
+    today = date.today()
+    month = today.strftime('%Y-%m')
+    # Far enough ahead that generated bookings never fill these slots
+    future = today + timedelta(days=3 * 365)
+
+    def voucher_sale(i):
+        return {'sale_type': 'voucher', 'product_id': fx['product_id'], 'partner_name': f'Bench Partner {i % 7}',
+                'quantity': 2, 'price_per_unit': 750, 'status': 'waiting', 'noted': 'benchmark'}
+
+    def b2bc_sale(i):
+        return {'course_name': 'Benchmark Course', 'price': 12000 + i, 'branch': fx['branch_id'],
+                'noted': 'benchmark'}
+
+    def booking_changes(i):
+        status = 'confirmed' if i % 2 else 'booked'
+        return {'changes': [{'booking_id': booking_id, 'status': status} for booking_id in fx['booking_ids']]}
+
+    def bulk_bookings(i):
+        day = (future + timedelta(days=i)).isoformat()
+        return {'bookings': [{'booking_date': day, 'time_slot': slot, 'branch_id': fx['branch_id'], 'headcount': 5}
+                             for slot in ('09:00', '10:00', '11:00', '13:00', '14:00')] * 2,
+                'booking_name': 'Benchmark'}
+
+    def quote(i):
+        return {'lines': [{'product_id': fx['group_product_id'], 'quantity': q} for q in range(5, 105, 5)]
+                + [{'product_id': fx['product_id'], 'quantity': 3}]}
+
+    availability = f"/bookings/availability?date_from={today.isoformat()}&date_to={(today + timedelta(days=27)).isoformat()}"
+    reads = []
+    for role in ('admin', 'staff'):
+        reads += [
+            Scenario(f'dashboard page ({role})', role, 'GET', '/dashboard/'),
+            Scenario(f'dashboard widgets ({role})', role, 'GET', '/dashboard/api/', cold=True),
+            Scenario(f'voucher/group sales list ({role})', role, 'GET', '/sales/voucher_group_sales'),
+            Scenario(f'voucher/group sales list, month ({role})', role, 'GET',
+                     f'/sales/voucher_group_sales?month={month}'),
+            Scenario(f'bookings list ({role})', role, 'GET', '/bookings/bookings'),
+            Scenario(f'b2bc sales list ({role})', role, 'GET', '/b2bc/b2bc_sales'),
+            Scenario(f'availability 4 weeks ({role})', role, 'GET', availability, cold=True),
+        ]
+    writes = [
+        Scenario('create voucher sale (staff)', 'staff', 'POST', '/sales/new_voucher_group_sale',
+                 form=voucher_sale, expect=(302,)),
+        Scenario('create b2bc sale (staff)', 'staff', 'POST', '/b2bc/new_b2bc_sale', form=b2bc_sale, expect=(302,)),
+        Scenario('bulk update 20 bookings (staff)', 'staff', 'POST', '/bookings/update_booking_fields',
+                 json_body=booking_changes),
+        Scenario('bulk create 10 bookings (staff)', 'staff', 'POST',
+                 f"/bookings/api/new_for_sale/{fx['group_sale_id']}/bulk", json_body=bulk_bookings, expect=(201,)),
+        Scenario('quote 21 lines (admin)', 'admin', 'POST', '/products/api/quote', json_body=quote),
+    ]
+    return reads + writes
+
+
+# --------------------------------------------------------------------------------
+# Runner
+# --------------------------------------------------------------------------------
+def login(app, username, password):
+    client = app.test_client()
+    response = client.post('/auth/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise SystemExit(f"Could not log in as '{username}'.")
+    return client
+
+
+def run_scenario(client, scenario, iterations, warmup, warm_cache):
+    latencies, queries, sql_ms, errors = [], [], [], 0
+    for i in range(warmup + iterations):
+        if scenario.cold and not warm_cache:
+            dashboard_cache.clear()
+            availability_cache.clear()
+        path, kwargs = scenario.request_args(i)
+        started = time.perf_counter()
+        response = client.open(path, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        if response.status_code not in scenario.expect:
+            errors += 1
+        match = SERVER_TIMING_SQL.search(response.headers.get('Server-Timing', ''))
+        if match:
+            sql_ms.append(float(match.group(1)))
+            queries.append(int(match.group(2)))
+    return {
+        'n': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_p50': percentile(queries, 50) if queries else None,
+        'queries_max': max(queries) if queries else None,
+        'sql_ms_p50': round(percentile(sql_ms, 50), 2) if sql_ms else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing scenarios that got slower or issue more statements than the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance) and result['p95_ms'] - base['p95_ms'] > 1:
+            regressions.append(f"{name}: p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if base.get('queries_max') is not None and (result['queries_max'] or 0) > base['queries_max']:
+            regressions.append(f"{name}: queries {base['queries_max']} -> {result['queries_max']}")
+        if result['errors'] > base['errors']:
+            regressions.append(f"{name}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the main endpoints through the test client.")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', help="Run only scenarios matching this glob, e.g. '*list*'")
+    parser.add_argument('--admin', default='bench_admin')
+    parser.add_argument('--staff', default='bench_staff_1')
+    parser.add_argument('--password', default='benchmark')
+    parser.add_argument('--warm-cache', action='store_true', help="Let cached scenarios hit the result caches")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Compare with a saved baseline; exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False, REQUEST_TIMING_ENABLED=True)
+    # Keep the N+1 warnings of utils/request_timing.py, drop per-request debug output
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        fixtures = load_fixtures(args.staff)
+        database = db.engine.url.render_as_string(hide_password=True)
+    clients = {'admin': login(app, args.admin, args.password), 'staff': login(app, args.staff, args.password)}
+
+    results = {}
+    print(f"{'scenario':<44} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'queries':>8} {'errors':>7}")
+    for scenario in scenarios(fixtures):
+        if args.only and not fnmatch.fnmatch(scenario.name, args.only):
+            continue
+        result = results[scenario.name] = run_scenario(clients[scenario.role], scenario,
+                                                       args.iterations, args.warmup, args.warm_cache)
+        print(f"{scenario.name:<44} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['max_ms']:>8.1f} "
+              f"{result['queries_max'] if result['queries_max'] is not None else '-':>8} {result['errors']:>7}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'created': datetime.utcnow().isoformat(timespec='seconds'), 'database': database,
+                       'iterations': args.iterations, 'results': results}, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,65 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'mygym.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine profile per backend, merged into SQLALCHEMY_ENGINE_OPTIONS (see utils/db_engine.py).
+    # SQLite: pragmas run on every new connection (WAL: readers don't block the writer;
+    # busy_timeout: wait for the write lock instead of failing; negative cache_size is KiB)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': 10000,
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    }
+    # PostgreSQL: connection pool per worker process (the dashboard runs up to
+    # DASHBOARD_QUERY_CONCURRENCY connections per request) and server-side timeouts
+    POSTGRES_POOL_SIZE = 5
+    POSTGRES_MAX_OVERFLOW = 10
+    POSTGRES_POOL_TIMEOUT = 30
+    POSTGRES_POOL_RECYCLE = 1800
+    POSTGRES_POOL_PRE_PING = True
+    POSTGRES_STATEMENT_TIMEOUT_MS = 30000
+    POSTGRES_LOCK_TIMEOUT_MS = 10000
+    # Reruns of a write transaction that failed on a lock (utils.db_engine.retry_on_lock)
+    DB_LOCK_RETRIES = 3
+    DB_LOCK_RETRY_DELAY_MS = 50
     SESSION_COOKIE_HTTPONLY = True
     REMEMBER_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
+    # Read dashboard figures from the daily rollup tables (see utils/rollups.py)
+    DASHBOARD_USE_ROLLUPS = True
+    # In-process dashboard result cache (see utils/dashboard_cache.py)
+    DASHBOARD_CACHE_TTL = 300
+    DASHBOARD_CACHE_SIZE = 256
+    # Max threads (each with its own pooled connection) used to compute the
+    # independent dashboard sections of one request; 1 runs them sequentially
+    DASHBOARD_QUERY_CONCURRENCY = 4
+    # Rows per page on the keyset-paginated list pages (?per_page= is capped at the max)
+    LIST_PAGE_SIZE = 50
+    LIST_MAX_PAGE_SIZE = 500
+    # Slot availability calendar (see utils/availability.py)
+    AVAILABILITY_CACHE_TTL = 300
+    AVAILABILITY_CACHE_SIZE = 2048
+    AVAILABILITY_MAX_DAYS = 92
+    # Logged-in user cache behind Flask-Login's user_loader (see utils/user_cache.py)
+    USER_CACHE_TTL = 60
+    USER_CACHE_SIZE = 1024
+    # Seconds between checks of the shared version counters (catalog, users, bulk writes; see
+    # utils/reference_data.py): how long another process's change can take to reach this one
+    REFERENCE_DATA_CHECK_INTERVAL = 5
+    # Per-request SQL/render timings in a Server-Timing header (see utils/request_timing.py);
+    # warn when one request runs more than REQUEST_TIMING_QUERY_WARN statements (0 disables)
+    REQUEST_TIMING_ENABLED = True
+    REQUEST_TIMING_QUERY_WARN = 25
+    # Also log one JSON line per request
+    REQUEST_TIMING_LOG = False
+    # Opt-in log of statements slower than SLOW_QUERY_THRESHOLD_MS, with their query plan,
+    # kept in a ring buffer of SLOW_QUERY_LOG_SIZE entries (see utils/slow_queries.py)
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', '').lower() in ('1', 'true', 'yes')
+    SLOW_QUERY_THRESHOLD_MS = 200
+    SLOW_QUERY_LOG_SIZE = 200
+    SLOW_QUERY_EXPLAIN = True
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -23,3 +79,7 @@ class ProductionConfig(Config):
     DEBUG = False
     SESSION_COOKIE_SECURE = True
     REMEMBER_COOKIE_SECURE = True
+    POSTGRES_POOL_SIZE = 10
+    POSTGRES_MAX_OVERFLOW = 20
+    POSTGRES_STATEMENT_TIMEOUT_MS = 15000
+    POSTGRES_LOCK_TIMEOUT_MS = 5000
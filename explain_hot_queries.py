@@ -0,0 +1,134 @@
+# explain_hot_queries.py
+"""
+Runs the hot code paths (dashboard sections, list pages, exports) against the
+configured database, captures every SELECT they emit and prints the database's
+query plan for each one. Exits with status 1 when a plan falls back to a full
+table scan of sales_voucher_group, sales_b2bc or bookings.
+
+Works on SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN, with
+enable_seqscan off so tiny tables do not hide a missing index).
+
+Only branch-scoped and date-windowed shapes are checked: admin all-time
+totals necessarily read every row and are served from the rollup tables.
+
+    python explain_hot_queries.py [--create-schema]
+"""
+import re
+import sys
+from datetime import datetime, timedelta
+from flask_login import login_user
+from sqlalchemy import event
+from app import create_app
+from models import db, User
+from utils import dashboard_stats
+from utils.pagination import encode_cursor
+
+WATCHED_TABLES = ('sales_voucher_group', 'sales_b2bc', 'bookings')
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (%s)\b(?!.*USING (COVERING )?INDEX)' % '|'.join(WATCHED_TABLES))
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (%s)\b' % '|'.join(WATCHED_TABLES))
+
+
+def _as_user(role, branch_id=1):
+    """A transient user to drive the views with, never persisted."""
+    return User(id=0, username=f'explain_{role}', role=role, branch_id=branch_id)
+
+
+def hot_paths(app):
+    """(name, callable) for every code path whose queries are checked."""
+    today = datetime.utcnow().date()
+    month = today.strftime('%Y-%m')
+    cursor = encode_cursor([datetime.utcnow(), 10 ** 9])
+    booking_cursor = encode_cursor([today, '09:00', 10 ** 9])
+    week_ago = (today - timedelta(days=7)).isoformat()
+
+    def view(path, role, branch_id=1):
+        def run():
+            with app.test_request_context(path):
+                login_user(_as_user(role, branch_id))
+                endpoint, args = app.url_map.bind('localhost').match(path.split('?')[0])
+                response = app.view_functions[endpoint](**args)
+                # Exports are generators: pull the rows through
+                if hasattr(response, 'response'):
+                    for _ in response.response:
+                        pass
+        return run
+
+    return [
+        ('dashboard (branch, raw)', lambda: dashboard_stats.compute_widgets(list(dashboard_stats.WIDGETS), 1, today, use_rollups=False)),
+        ('dashboard (branch, rollups)', lambda: dashboard_stats.compute_widgets(list(dashboard_stats.WIDGETS), 1, today, use_rollups=True)),
+        ('dashboard upcoming bookings (admin)', lambda: dashboard_stats.upcoming_bookings(dashboard_stats.ALL_BRANCHES, today)),
+        ('voucher/group sales list', view('/sales/voucher_group_sales', 'admin')),
+        ('voucher/group sales list, next page', view(f'/sales/voucher_group_sales?cursor={cursor}', 'admin')),
+        ('voucher/group sales list, month', view(f'/sales/voucher_group_sales?month={month}', 'admin')),
+        ('bookings list (admin)', view('/bookings/bookings', 'admin')),
+        ('bookings list (admin, branch)', view('/bookings/bookings?branch_id=1', 'admin')),
+        ('bookings list (branch staff)', view('/bookings/bookings', 'branch_staff')),
+        ('bookings list, next page', view(f'/bookings/bookings?cursor={booking_cursor}', 'branch_staff')),
+        ('b2bc sales list (branch staff)', view('/b2bc/b2bc_sales', 'branch_staff')),
+        ('export voucher/group sales', view(f'/exports/voucher_group_sales.csv?date_from={week_ago}&branch_id=1', 'admin')),
+        ('export b2bc sales', view(f'/exports/b2bc_sales.csv?date_from={week_ago}', 'branch_staff')),
+        ('export bookings', view(f'/exports/bookings.csv?date_from={week_ago}&branch_id=1', 'admin')),
+    ]
+
+
+def capture(fn):
+    """Run fn and return the SELECT statements (with parameters) it executed."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        db.session.rollback()
+    return statements
+
+
+def explain(statement, parameters):
+    """Return the plan lines and the subset of them that are full table scans."""
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == 'sqlite':
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            lines = [row[-1] for row in rows]
+            return lines, [line for line in lines if SQLITE_FULL_SCAN.search(line)]
+        if dialect == 'postgresql':
+            conn.exec_driver_sql('SET enable_seqscan = off')
+            rows = conn.exec_driver_sql('EXPLAIN ' + statement, parameters).fetchall()
+            lines = [row[0] for row in rows]
+            return lines, [line for line in lines if POSTGRES_FULL_SCAN.search(line)]
+    raise SystemExit(f"Unsupported database dialect: {dialect}")
+
+
+def main():
+    app = create_app()
+    failures = 0
+    with app.app_context():
+        if '--create-schema' in sys.argv:
+            db.create_all()
+        for name, fn in hot_paths(app):
+            seen = set()
+            print(f"== {name}")
+            for statement, parameters in capture(fn):
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                lines, scans = explain(statement, parameters)
+                status = 'FULL SCAN' if scans else 'ok'
+                print(f"  [{status}] {' '.join(statement.split())[:160]}")
+                for line in lines:
+                    print(f"      {line}")
+                failures += bool(scans)
+    if failures:
+        print(f"\n{failures} hot queries fall back to a full table scan.")
+        sys.exit(1)
+    print("\nAll hot queries use an index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 # forms.py
 from flask_wtf import FlaskForm
 from wtforms import (
-    StringField, PasswordField, SubmitField, BooleanField, SelectField,
-    FloatField, TextAreaField, HiddenField, IntegerField, DateField
+    Form, StringField, PasswordField, SubmitField, BooleanField, SelectField,
+    FloatField, TextAreaField, HiddenField, IntegerField, DateField, FieldList, FormField
 )
-from wtforms.validators import DataRequired, Length, Email, EqualTo, Optional, ValidationError
+from wtforms.validators import DataRequired, Length, Email, EqualTo, Optional, ValidationError, NumberRange
 import datetime
 
+# Bookable time slots (12:00 is the lunch break)
+TIME_SLOTS = ('08:00', '09:00', '10:00', '11:00', '13:00', '14:00', '15:00', '16:00', '17:00')
+
+BOOKING_STATUSES = [
+    ('not_booked', 'Not Booked'),
+    ('booked', 'Booked'),
+    ('confirmed', 'Confirmed'),
+    ('used', 'Used'),
+    ('canceled', 'Canceled'),
+]
+
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=3, max=50)])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -56,27 +67,19 @@ class VoucherGroupSaleForm(FlaskForm):
 class B2BCSaleForm(FlaskForm):
     course_name = StringField('Course Name', validators=[DataRequired(), Length(max=100)])
     price = FloatField('Price', validators=[DataRequired()])
+    branch = SelectField('Branch', coerce=int, validators=[DataRequired()])
     noted = TextAreaField('Notes', validators=[Optional()])
     submit = SubmitField('Record Sale')
 
 class UpdateBookingForm(FlaskForm):
     booking_name = StringField('Booking Name', validators=[Optional(), Length(max=100)])
     booking_date = DateField('Booking Date', validators=[Optional()])  # can be optional
-    time_slot = SelectField('Time Slot', choices=[
-        ('08:00','08:00'), ('09:00','09:00'), ('10:00','10:00'),
-        ('11:00','11:00'), ('13:00','13:00'), ('14:00','14:00'),
-        ('15:00','15:00'), ('16:00','16:00'), ('17:00','17:00')
-    ], validators=[Optional()])
+    time_slot = SelectField('Time Slot', choices=[(slot, slot) for slot in TIME_SLOTS],
+                            validators=[Optional()])
     
     branch_id = SelectField('Branch', coerce=int, validators=[Optional()])
     
-    status = SelectField('Status', choices=[
-        ('not_booked', 'Not Booked'),
-        ('booked','Booked'),
-        ('confirmed','Confirmed'),
-        ('used','Used'),
-        ('canceled','Canceled')
-    ], validators=[DataRequired()])
+    status = SelectField('Status', choices=BOOKING_STATUSES, validators=[DataRequired()])
     
     actual_quantity = IntegerField('Actual Quantity', validators=[DataRequired()])
     noted = TextAreaField('Notes', validators=[Optional()])
@@ -89,21 +92,12 @@ class UpdateBookingForm(FlaskForm):
 class NewBookingForm(FlaskForm):
     booking_name = StringField('Booking Name', validators=[Optional(), Length(max=100)])
     booking_date = DateField('Booking Date', validators=[Optional()])  # can be optional
-    time_slot = SelectField('Time Slot', choices=[
-        ('08:00','08:00'), ('09:00','09:00'), ('10:00','10:00'),
-        ('11:00','11:00'), ('13:00','13:00'), ('14:00','14:00'),
-        ('15:00','15:00'), ('16:00','16:00'), ('17:00','17:00')
-    ], validators=[Optional()])
+    time_slot = SelectField('Time Slot', choices=[(slot, slot) for slot in TIME_SLOTS],
+                            validators=[Optional()])
     
     branch_id = SelectField('Branch', coerce=int, validators=[Optional()])
     
-    status = SelectField('Status', choices=[
-        ('not_booked', 'Not Booked'),
-        ('booked','Booked'),
-        ('confirmed','Confirmed'),
-        ('used','Used'),
-        ('canceled','Canceled')
-    ], default='not_booked')
+    status = SelectField('Status', choices=BOOKING_STATUSES, default='not_booked')
     
     noted = TextAreaField('Notes', validators=[Optional()])
     submit = SubmitField('Create Booking')
@@ -112,15 +106,28 @@ class NewBookingForm(FlaskForm):
         if field.data and field.data < datetime.date.today():
             raise ValidationError("Booking date cannot be in the past.")
 
+# One row of the bulk booking form; rows without a date are ignored
+class BulkBookingRowForm(Form):
+    booking_date = DateField('Date', validators=[Optional()])
+    time_slot = SelectField('Time Slot', choices=[('', '-')] + [(slot, slot) for slot in TIME_SLOTS],
+                            validators=[Optional()])
+    branch_id = SelectField('Branch', coerce=int, validators=[Optional()])
+    headcount = IntegerField('Headcount', validators=[Optional(), NumberRange(min=0)])
+
+    def validate_booking_date(form, field):
+        if field.data and field.data < datetime.date.today():
+            raise ValidationError("Booking date cannot be in the past.")
+
+class BulkBookingForm(FlaskForm):
+    booking_name = StringField('Booking Name', validators=[Optional(), Length(max=100)])
+    status = SelectField('Status', choices=BOOKING_STATUSES, default='booked')
+    noted = TextAreaField('Notes', validators=[Optional()])
+    rows = FieldList(FormField(BulkBookingRowForm), min_entries=10)
+    submit = SubmitField('Create Bookings')
+
 # New Inline Update Form
 class InlineUpdateBookingForm(FlaskForm):
-    status = SelectField('Status', choices=[
-        ('not_booked', 'Not Booked'),
-        ('booked','Booked'),
-        ('confirmed','Confirmed'),
-        ('used','Used'),
-        ('canceled','Canceled')
-    ], validators=[DataRequired()])
+    status = SelectField('Status', choices=BOOKING_STATUSES, validators=[DataRequired()])
     actual_quantity = IntegerField('Actual Quantity', validators=[DataRequired()])
     submit = SubmitField('Update')
 
@@ -129,4 +136,6 @@ class ProductForm(FlaskForm):
     name = StringField("Name", validators=[DataRequired(), Length(max=100)])
     category = StringField("Category", validators=[DataRequired(), Length(max=50)])
     default_price = FloatField("Price", validators=[DataRequired()])
+    pricing_tiers = TextAreaField("Pricing Tiers", validators=[Optional()],
+                                  description="max quantity:unit price pairs, e.g. 10:900, 20:800")
     submit = SubmitField("Save")
\ No newline at end of file
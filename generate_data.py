@@ -0,0 +1,243 @@
+# generate_data.py
+"""
+Fills the configured database with synthetic data for benchmarking.
+
+Creates branches, users, products with pricing tiers, partners, voucher/group
+sales with their bookings and B2BC sales spread over the last --years years.
+Products, partners, branches and salespeople are drawn with a Zipf-like skew,
+so a few of them carry most of the volume the way real data does.
+
+Rows are written with Core executemany INSERTs in --batch-size chunks, which
+bypasses the ORM and its hooks; the rollup tables are rebuilt at the end.
+Point DATABASE_URL at a scratch database:
+
+    DATABASE_URL=sqlite:///bench.db python generate_data.py --create-schema \\
+        --voucher-sales 1000000 --b2bc-sales 200000
+
+Generated users log in with --password: bench_admin (admin) and
+bench_staff_<n> (branch staff of branch n).
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import (db, Branch, User, Product, PricingTier, CommissionRule,
+                    SalesVoucherGroup, SalesB2BC, Booking, bcrypt)
+from forms import TIME_SLOTS
+from utils.rollups import rebuild_rollups
+
+VOUCHER_PRODUCTS = [
+    ("1 Day Pass (Group)", 750), ("2 Day Pass (Group)", 1300), ("3 Day Pass (Group)", 1800),
+    ("1 Day Pass (PV)", 1390), ("2 Day Pass (PV)", 2500), ("3 Day Pass (PV)", 3450),
+]
+GROUP_PRODUCTS = [
+    ("Activities Group (On-site, 10p)", 900, [(10, 900), (15, 850), (20, 800), (30, 750), (40, 700), (50, 650)]),
+    ("Activities Group (Off-site, 20p)", 1300, [(20, 1300), (40, 1100), (60, 1000), (80, 950), (100, 850)]),
+]
+COURSES = ["Climbing Basics", "Team Building", "Rope Course", "Kayak Intro", "Leadership Camp",
+           "Survival Skills", "First Aid", "Zipline Day"]
+SALE_STATUSES = (('paid', 70), ('waiting', 25), ('canceled', 5))
+BOOKING_STATUSES = (('booked', 35), ('confirmed', 25), ('used', 30), ('not_booked', 5), ('canceled', 5))
+GROUP_SHARE = 0.3  # share of voucher/group sales that are activity groups
+
+
+def zipf_weights(n, s=1.1):
+    """Cumulative Zipf weights, for random.choices(cum_weights=...)."""
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def cumulative(pairs):
+    values, weights = zip(*pairs)
+    return values, list(itertools.accumulate(weights))
+
+
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = datetime.utcnow().replace(microsecond=0)
+        self.span_seconds = int(args.years * 365 * 86400)
+
+    def _random_dates(self, k):
+        # Recent dates are more frequent: volume grows over time
+        return [self.now - timedelta(seconds=int(self.span_seconds * (1 - self.rng.random() ** 0.7)))
+                for _ in range(k)]
+
+    def _next_id(self, model):
+        return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+    def _insert(self, model, rows):
+        if rows:
+            db.session.connection().execute(model.__table__.insert(), rows)
+
+    # ----------------------------------------------------------------------------
+    # Reference data
+    # ----------------------------------------------------------------------------
+    def reference_data(self):
+        args = self.args
+        branches = [Branch(name=f"Bench Branch {i}", location=f"Zone {i % 7}", capacity=args.branch_capacity)
+                    for i in range(1, args.branches + 1)]
+        db.session.add_all(branches)
+        db.session.flush()
+        self.branch_ids = [b.id for b in branches]
+
+        # One bcrypt hash for every generated user: hashing is deliberately slow
+        password_hash = bcrypt.generate_password_hash(args.password).decode('utf-8')
+        users = [User(username='bench_admin', email='bench_admin@example.com', role='admin',
+                      password_hash=password_hash)]
+        for i in range(1, args.users + 1):
+            branch_id = self.branch_ids[(i - 1) % len(self.branch_ids)]
+            users.append(User(username=f'bench_staff_{i}', email=f'bench_staff_{i}@example.com',
+                              role='branch_staff', branch_id=branch_id, password_hash=password_hash))
+        db.session.add_all(users)
+
+        existing = {name for name, in db.session.query(Product.name)}
+        for name, price in VOUCHER_PRODUCTS:
+            if name not in existing:
+                db.session.add(Product(name=name, category='voucher', default_price=price))
+        for name, price, tiers in GROUP_PRODUCTS:
+            if name not in existing:
+                db.session.add(Product(name=name, category='activities_group', default_price=price,
+                                       pricing_tiers=[PricingTier(max_quantity=q, unit_price=p) for q, p in tiers]))
+        if not db.session.query(CommissionRule.id).first():
+            db.session.add_all([CommissionRule(min_amount=0, max_amount=9999.99, rate=0.05),
+                                CommissionRule(min_amount=10000, max_amount=49999.99, rate=0.08),
+                                CommissionRule(min_amount=50000, max_amount=10 ** 9, rate=0.1)])
+        db.session.flush()
+        self.staff = [(u.id, u.branch_id) for u in users if u.role == 'branch_staff'] or [(users[0].id, None)]
+        db.session.commit()
+
+    # ----------------------------------------------------------------------------
+    # Sales & bookings
+    # ----------------------------------------------------------------------------
+    def voucher_sales(self):
+        args, rng = self.args, self.rng
+        vouchers = [(name, price) for name, price in VOUCHER_PRODUCTS]
+        groups = [(name, price) for name, price, _ in GROUP_PRODUCTS]
+        voucher_weights, group_weights = zipf_weights(len(vouchers)), zipf_weights(len(groups))
+        partners = [f"Partner {i:04d}" for i in range(1, args.partners + 1)]
+        partner_weights = zipf_weights(len(partners))
+        staff_weights = zipf_weights(len(self.staff), 0.8)
+        statuses, status_weights = cumulative(SALE_STATUSES)
+        booking_statuses, booking_weights = cumulative(BOOKING_STATUSES)
+
+        sale_id, booking_id = self._next_id(SalesVoucherGroup), self._next_id(Booking)
+        created = bookings_created = 0
+        while created < args.voucher_sales:
+            k = min(args.batch_size, args.voucher_sales - created)
+            dates = self._random_dates(k)
+            partner_picks = rng.choices(partners, cum_weights=partner_weights, k=k)
+            staff_picks = rng.choices(self.staff, cum_weights=staff_weights, k=k)
+            status_picks = rng.choices(statuses, cum_weights=status_weights, k=k)
+            group_picks = rng.choices(groups, cum_weights=group_weights, k=k)
+            voucher_picks = rng.choices(vouchers, cum_weights=voucher_weights, k=k)
+            sales, bookings = [], []
+            for i in range(k):
+                is_group = rng.random() < GROUP_SHARE
+                if is_group:
+                    name, price = group_picks[i]
+                    quantity = rng.randint(8, 80)
+                else:
+                    name, price = voucher_picks[i]
+                    quantity = rng.choice((1, 1, 2, 2, 4, 10, 20, 50))
+                salesperson_id, branch_id = staff_picks[i]
+                total_price = quantity * price
+                sales.append({
+                    'id': sale_id, 'sale_date': dates[i], 'sale_type': 'group' if is_group else 'voucher',
+                    'product_name': name, 'quantity': quantity, 'price_per_unit': price,
+                    'total_price': total_price, 'vat_7': total_price * 0.07, 'total_sale': total_price * 1.07,
+                    'partner_name': partner_picks[i], 'partner_company': f"{partner_picks[i]} Co., Ltd.",
+                    'branch_id': branch_id, 'salesperson_id': salesperson_id, 'status': status_picks[i],
+                })
+                if is_group or rng.random() < args.voucher_booking_share:
+                    for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                        bookings.append({
+                            'id': booking_id, 'voucher_group_sale_id': sale_id,
+                            'booking_name': partner_picks[i],
+                            'booking_date': (dates[i] + timedelta(days=rng.randint(1, 60))).date(),
+                            'time_slot': rng.choice(TIME_SLOTS),
+                            'status': rng.choices(booking_statuses, cum_weights=booking_weights)[0],
+                            'actual_quantity': min(quantity, rng.randint(1, 12)),
+                            'branch_id': branch_id,
+                        })
+                        booking_id += 1
+                sale_id += 1
+            self._insert(SalesVoucherGroup, sales)
+            self._insert(Booking, bookings)
+            db.session.commit()
+            created += k
+            bookings_created += len(bookings)
+        return created, bookings_created
+
+    def b2bc_sales(self):
+        args, rng = self.args, self.rng
+        course_weights = zipf_weights(len(COURSES))
+        staff_weights = zipf_weights(len(self.staff), 0.8)
+        sale_id = self._next_id(SalesB2BC)
+        created = 0
+        while created < args.b2bc_sales:
+            k = min(args.batch_size, args.b2bc_sales - created)
+            dates = self._random_dates(k)
+            courses = rng.choices(COURSES, cum_weights=course_weights, k=k)
+            staff_picks = rng.choices(self.staff, cum_weights=staff_weights, k=k)
+            rows = []
+            for i in range(k):
+                price = round(rng.lognormvariate(9.5, 0.8), 2)
+                rate = 0.05 if price < 10000 else 0.08 if price < 50000 else 0.1
+                user_id, branch_id = staff_picks[i]
+                rows.append({
+                    'id': sale_id, 'sale_date': dates[i], 'course_name': courses[i], 'price': price,
+                    'commission_rate': rate, 'commission_amount': price * rate,
+                    'user_id': user_id, 'branch_id': branch_id,
+                })
+                sale_id += 1
+            self._insert(SalesB2BC, rows)
+            db.session.commit()
+            created += k
+        return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic benchmark data.")
+    parser.add_argument('--branches', type=int, default=10)
+    parser.add_argument('--users', type=int, default=50, help="Branch staff users, spread over the branches")
+    parser.add_argument('--partners', type=int, default=500)
+    parser.add_argument('--voucher-sales', type=int, default=100000)
+    parser.add_argument('--b2bc-sales', type=int, default=20000)
+    parser.add_argument('--voucher-booking-share', type=float, default=0.5,
+                        help="Share of voucher sales that get bookings (group sales always do)")
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--branch-capacity', type=int, default=500)
+    parser.add_argument('--password', default='benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--create-schema', action='store_true', help="Create missing tables first")
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if args.create_schema:
+            db.create_all()
+        if db.session.query(User.id).filter_by(username='bench_admin').first():
+            raise SystemExit("This database already holds generated data; use a fresh DATABASE_URL.")
+        generator = Generator(args)
+        started = time.perf_counter()
+        generator.reference_data()
+        sales, bookings = generator.voucher_sales()
+        print(f"{sales} voucher/group sales and {bookings} bookings "
+              f"in {time.perf_counter() - started:.1f}s")
+        mark = time.perf_counter()
+        b2bc = generator.b2bc_sales()
+        print(f"{b2bc} B2BC sales in {time.perf_counter() - mark:.1f}s")
+        mark = time.perf_counter()
+        # Bulk inserts bypass the rollup hooks
+        rebuild_rollups()
+        print(f"Rollups rebuilt in {time.perf_counter() - mark:.1f}s; total {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
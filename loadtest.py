@@ -0,0 +1,278 @@
+# loadtest.py
+"""
+Concurrent load test with mixed read/write traffic.
+
+Serves the app (create_app) on a local threaded WSGI server and runs virtual
+users against it over HTTP, each with its own logged-in session: branch
+staff create voucher and B2BC sales, update bookings in bulk and page through
+the bookings list, while admins reload the dashboard. Reports throughput,
+latency percentiles and error rates per action, and counts the database
+lock/timeout errors the server raised ("database is locked" on SQLite, lock
+and statement timeouts on PostgreSQL).
+
+Meant for a database filled by generate_data.py, which creates the users:
+
+    DATABASE_URL=sqlite:///bench.db python loadtest.py --staff 50 --admins 5 --duration 60
+
+CSRF protection is turned off for the run, as in benchmark.py.
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from flask import got_request_exception
+from werkzeug.serving import make_server
+from app import create_app
+from models import db, User, Booking, Product
+from benchmark import percentile
+
+# Relative frequency of each action per virtual user type
+STAFF_MIX = {'create voucher sale': 3, 'create b2bc sale': 1, 'update bookings': 3, 'list bookings': 3}
+ADMIN_MIX = {'dashboard widgets': 4, 'list sales': 1}
+
+
+class Stats:
+    """Results of every request, shared by the virtual users."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.server_errors = Counter()
+
+    def record(self, action, ms, error=None):
+        with self.lock:
+            self.latencies[action].append(ms)
+            if error is not None:
+                self.errors[action][error] += 1
+
+    def record_server_exception(self, sender, exception, **extra):
+        message = str(exception).lower()
+        if 'locked' in message or 'lock timeout' in message or 'deadlock' in message:
+            kind = 'database lock'
+        elif 'timeout' in message or 'timed out' in message:
+            kind = 'database timeout'
+        else:
+            kind = type(exception).__name__
+        with self.lock:
+            self.server_errors[kind] += 1
+
+
+# --------------------------------------------------------------------------------
+# Virtual users
+# --------------------------------------------------------------------------------
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as their 3xx status instead of following them."""
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url, username, password, mix, fixtures, stats, ready, duration, think_ms, seed, timeout):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.actions, self.weights = zip(*mix.items())
+        self.fixtures = fixtures
+        self.stats = stats
+        self.ready = ready  # Barrier releasing all users at once after their login
+        self.duration = duration
+        self.think_ms = think_ms
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        self.iteration = 0
+
+    def request(self, path, form=None, json_body=None):
+        """Return the HTTP status; redirects are not followed."""
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+        elif json_body is not None:
+            data, headers = json.dumps(json_body).encode(), {'Content-Type': 'application/json'}
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def login(self):
+        status = self.request('/auth/login', form={'username': self.username, 'password': self.password})
+        if status != 302:
+            raise RuntimeError(f"Login as {self.username} failed with HTTP {status}")
+
+    def run(self):
+        # Logins (bcrypt) are kept out of the measured period
+        try:
+            self.login()
+        except Exception as e:
+            self.stats.record('login', 0, str(e))
+            return
+        finally:
+            self.ready.wait()
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            started = time.perf_counter()
+            error = None
+            try:
+                status, expected = getattr(self, '_' + action.replace(' ', '_'))()
+                if status not in expected:
+                    error = f"HTTP {status}"
+            except (socket.timeout, TimeoutError):
+                error = 'client timeout'
+            except urllib.error.URLError as e:
+                error = 'client timeout' if isinstance(e.reason, socket.timeout) else f"connection: {e.reason}"
+            self.stats.record(action, (time.perf_counter() - started) * 1000, error)
+            self.iteration += 1
+            if self.think_ms:
+                time.sleep(self.rng.uniform(0, 2 * self.think_ms) / 1000)
+
+    # Actions return (status, expected statuses); a successful form POST redirects
+    def _create_voucher_sale(self):
+        fx = self.fixtures
+        return self.request('/sales/new_voucher_group_sale', form={
+            'sale_type': 'voucher', 'product_id': fx['product_id'], 'partner_name': 'Load Test',
+            'quantity': 2, 'price_per_unit': 750, 'status': 'waiting', 'noted': 'loadtest'}), (302,)
+
+    def _create_b2bc_sale(self):
+        return self.request('/b2bc/new_b2bc_sale', form={
+            'course_name': 'Load Test Course', 'price': self.rng.randint(1000, 60000),
+            'branch': self.fixtures['branch_id'], 'noted': 'loadtest'}), (302,)
+
+    def _update_bookings(self):
+        ids = self.rng.sample(self.fixtures['booking_ids'], min(10, len(self.fixtures['booking_ids'])))
+        status = self.rng.choice(('booked', 'confirmed'))
+        # 409 is a legitimate capacity refusal, not a failure of the app
+        return self.request('/bookings/update_booking_fields', json_body={
+            'changes': [{'booking_id': booking_id, 'status': status} for booking_id in ids]}), (200, 409)
+
+    def _list_bookings(self):
+        return self.request('/bookings/bookings'), (200,)
+
+    def _dashboard_widgets(self):
+        return self.request('/dashboard/api/'), (200, 304)
+
+    def _list_sales(self):
+        return self.request('/sales/voucher_group_sales'), (200,)
+
+
+# --------------------------------------------------------------------------------
+# Setup & report
+# --------------------------------------------------------------------------------
+def load_fixtures(staff_usernames):
+    """Per staff user: their branch and a pool of that branch's bookings."""
+    product = Product.query.filter_by(category='voucher').order_by(Product.id).first()
+    if product is None:
+        raise SystemExit("No products found; run generate_data.py first.")
+    fixtures = {}
+    for username in staff_usernames:
+        user = User.query.filter_by(username=username).first()
+        if user is None or user.branch_id is None:
+            raise SystemExit(f"Branch staff user '{username}' not found; run generate_data.py with more --users.")
+        booking_ids = [booking_id for booking_id, in db.session.query(Booking.id)
+                       .filter(Booking.branch_id == user.branch_id, Booking.status.in_(('booked', 'confirmed')),
+                               Booking.booking_date >= date.today() - timedelta(days=30))
+                       .order_by(Booking.id.desc()).limit(200)]
+        if not booking_ids:
+            raise SystemExit(f"Branch {user.branch_id} has no recent bookings; run generate_data.py first.")
+        fixtures[username] = {'branch_id': user.branch_id, 'product_id': product.id, 'booking_ids': booking_ids}
+    return fixtures
+
+
+def report(stats, elapsed):
+    total = sum(len(values) for values in stats.latencies.values())
+    failed = sum(sum(counter.values()) for counter in stats.errors.values())
+    print(f"\n{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s, "
+          f"{failed} failed ({100 * failed / total if total else 0:.1f}%)")
+    print(f"{'action':<22} {'count':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    summary = {}
+    for action in sorted(stats.latencies):
+        values = stats.latencies[action]
+        errors = sum(stats.errors[action].values())
+        summary[action] = {
+            'count': len(values), 'errors': errors, 'error_kinds': dict(stats.errors[action]),
+            'p50_ms': round(percentile(values, 50), 1), 'p95_ms': round(percentile(values, 95), 1),
+            'p99_ms': round(percentile(values, 99), 1),
+        }
+        print(f"{action:<22} {len(values):>6} {len(values) / elapsed:>7.1f} {summary[action]['p50_ms']:>8.1f} "
+              f"{summary[action]['p95_ms']:>8.1f} {summary[action]['p99_ms']:>8.1f} {errors:>7}")
+        for kind, count in stats.errors[action].most_common():
+            print(f"    {count} x {kind}")
+    print("Server-side exceptions: " +
+          (", ".join(f"{count} x {kind}" for kind, count in stats.server_errors.most_common()) or "none"))
+    return {'requests': total, 'failed': failed, 'seconds': round(elapsed, 1),
+            'throughput': round(total / elapsed, 1), 'actions': summary,
+            'server_errors': dict(stats.server_errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent virtual users against a local server.")
+    parser.add_argument('--staff', type=int, default=50, help="Branch staff virtual users (bench_staff_1..N)")
+    parser.add_argument('--admins', type=int, default=5, help="Admin virtual users (all log in as --admin)")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of load")
+    parser.add_argument('--think-ms', type=float, default=100, help="Mean pause between a user's requests")
+    parser.add_argument('--timeout', type=float, default=30, help="Client timeout per request, seconds")
+    parser.add_argument('--admin', default='bench_admin')
+    parser.add_argument('--password', default='benchmark')
+    parser.add_argument('--port', type=int, default=0, help="Local port (default: any free port)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', metavar='PATH', help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.update(WTF_CSRF_ENABLED=False)
+    app.logger.setLevel(logging.WARNING)
+    stats = Stats()
+    got_request_exception.connect(stats.record_server_exception, app)
+    staff_usernames = [f'bench_staff_{i}' for i in range(1, args.staff + 1)]
+    with app.app_context():
+        fixtures = load_fixtures(staff_usernames)
+
+    # Per-request access log lines would drown the report
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    print(f"Serving on {base_url}: {args.staff} staff and {args.admins} admin users for {args.duration:.0f}s")
+
+    ready = threading.Barrier(args.staff + args.admins + 1)
+    users = [VirtualUser(base_url, username, args.password, STAFF_MIX, fixtures[username], stats,
+                         ready, args.duration, args.think_ms, args.seed + i, args.timeout)
+             for i, username in enumerate(staff_usernames)]
+    users += [VirtualUser(base_url, args.admin, args.password, ADMIN_MIX, None, stats,
+                          ready, args.duration, args.think_ms, args.seed + 10000 + i, args.timeout)
+              for i in range(args.admins)]
+    for user in users:
+        user.start()
+    ready.wait()
+    started = time.monotonic()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - started
+    server.shutdown()
+
+    result = report(stats, elapsed)
+    if args.json:
+        result.update(created=datetime.utcnow().isoformat(timespec='seconds'),
+                      staff=args.staff, admins=args.admins, think_ms=args.think_ms)
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Add daily sales/booking rollup tables
+
+Revision ID: 9b1f2c7d4e10
+Revises: 4163deb3bcd5
+Create Date: 2026-10-18 09:12:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1f2c7d4e10'
+down_revision = '4163deb3bcd5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=True),
+    sa.Column('day', sa.Date(), nullable=True),
+    sa.Column('sale_type', sa.String(length=50), nullable=False),
+    sa.Column('product_name', sa.String(length=100), nullable=False),
+    sa.Column('sale_count', sa.Integer(), nullable=False),
+    sa.Column('voucher_revenue', sa.Float(), nullable=False),
+    sa.Column('b2bc_revenue', sa.Float(), nullable=False),
+    sa.Column('commission', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('branch_id', 'day', 'sale_type', 'product_name', name='uq_daily_sales_rollup_key')
+    )
+    op.create_table('daily_booking_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=True),
+    sa.Column('day', sa.Date(), nullable=True),
+    sa.Column('booking_count', sa.Integer(), nullable=False),
+    sa.Column('headcount', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('branch_id', 'day', name='uq_daily_booking_rollup_key')
+    )
+
+    # Backfill from the existing data (same aggregation as `flask rollups rebuild`)
+    op.execute("""
+        INSERT INTO daily_sales_rollup
+            (branch_id, day, sale_type, product_name, sale_count, voucher_revenue, b2bc_revenue, commission)
+        SELECT branch_id, date(sale_date), sale_type, COALESCE(product_name, ''),
+               COUNT(id), COALESCE(SUM(total_sale), 0), 0, 0
+        FROM sales_voucher_group
+        GROUP BY branch_id, date(sale_date), sale_type, COALESCE(product_name, '')
+    """)
+    op.execute("""
+        INSERT INTO daily_sales_rollup
+            (branch_id, day, sale_type, product_name, sale_count, voucher_revenue, b2bc_revenue, commission)
+        SELECT branch_id, date(sale_date), 'b2bc', COALESCE(course_name, ''),
+               COUNT(id), 0, COALESCE(SUM(price), 0), COALESCE(SUM(commission_amount), 0)
+        FROM sales_b2bc
+        GROUP BY branch_id, date(sale_date), COALESCE(course_name, '')
+    """)
+    op.execute("""
+        INSERT INTO daily_booking_rollup (branch_id, day, booking_count, headcount)
+        SELECT branch_id, booking_date, COUNT(id), COALESCE(SUM(actual_quantity), 0)
+        FROM bookings
+        GROUP BY branch_id, booking_date
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_booking_rollup')
+    op.drop_table('daily_sales_rollup')
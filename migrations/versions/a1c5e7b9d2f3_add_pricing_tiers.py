@@ -0,0 +1,45 @@
+"""Add pricing tiers
+
+Revision ID: a1c5e7b9d2f3
+Revises: d4f6a8c2e0b5
+Create Date: 2026-10-18 15:06:44.270913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c5e7b9d2f3'
+down_revision = 'd4f6a8c2e0b5'
+branch_labels = None
+depends_on = None
+
+# The brackets formerly hard-coded in SalesVoucherGroup.compute_activity_group_price
+ON_SITE_TIERS = [(10, 900), (15, 850), (20, 800), (30, 750), (40, 700), (50, 650)]
+OFF_SITE_TIERS = [(20, 1300), (40, 1100), (60, 1000), (80, 950), (100, 850)]
+
+
+def upgrade():
+    op.create_table('pricing_tiers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('max_quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('product_id', 'max_quantity', name='uq_pricing_tiers_product_id_max_quantity')
+    )
+    for pattern, tiers in (('%On-site%', ON_SITE_TIERS), ('%Off-site%', OFF_SITE_TIERS)):
+        for max_quantity, unit_price in tiers:
+            op.execute(sa.text(
+                "INSERT INTO pricing_tiers (product_id, max_quantity, unit_price) "
+                "SELECT id, :max_quantity, :unit_price FROM products "
+                "WHERE name LIKE :pattern"
+            ).bindparams(max_quantity=max_quantity, unit_price=unit_price, pattern=pattern))
+    op.execute("INSERT INTO reference_data_version (name, version) VALUES ('pricing', 0)")
+
+
+def downgrade():
+    op.execute("DELETE FROM reference_data_version WHERE name = 'pricing'")
+    op.drop_table('pricing_tiers')
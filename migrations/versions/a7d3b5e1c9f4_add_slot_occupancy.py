@@ -0,0 +1,46 @@
+"""Add slot occupancy table
+
+Revision ID: a7d3b5e1c9f4
+Revises: f2c4e8a6b9d0
+Create Date: 2026-10-18 12:02:17.553091
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3b5e1c9f4'
+down_revision = 'f2c4e8a6b9d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('slot_occupancy',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('time_slot', sa.String(length=50), nullable=False),
+    sa.Column('booking_count', sa.Integer(), nullable=False),
+    sa.Column('headcount', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('branch_id', 'day', 'time_slot', name='uq_slot_occupancy_key')
+    )
+
+    # Backfill from the existing bookings (same aggregation as `flask rollups rebuild`)
+    op.execute("""
+        INSERT INTO slot_occupancy (branch_id, day, time_slot, booking_count, headcount)
+        SELECT branch_id, booking_date, time_slot, COUNT(id),
+               SUM(CASE WHEN actual_quantity > 0 THEN actual_quantity ELSE 1 END)
+        FROM bookings
+        WHERE branch_id IS NOT NULL AND booking_date IS NOT NULL
+          AND time_slot IS NOT NULL AND time_slot != ''
+          AND (status IS NULL OR status != 'canceled')
+        GROUP BY branch_id, booking_date, time_slot
+    """)
+
+
+def downgrade():
+    op.drop_table('slot_occupancy')
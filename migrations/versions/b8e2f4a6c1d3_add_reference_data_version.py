@@ -0,0 +1,29 @@
+"""Add reference data version counter
+
+Revision ID: b8e2f4a6c1d3
+Revises: a7d3b5e1c9f4
+Create Date: 2026-10-18 13:47:52.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a6c1d3'
+down_revision = 'a7d3b5e1c9f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reference_data_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO reference_data_version (name, version) VALUES ('catalog', 0)")
+
+
+def downgrade():
+    op.drop_table('reference_data_version')
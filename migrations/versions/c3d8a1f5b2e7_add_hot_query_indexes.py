@@ -0,0 +1,46 @@
+"""Add composite indexes for the dashboard, list and filter queries
+
+Revision ID: c3d8a1f5b2e7
+Revises: 9b1f2c7d4e10
+Create Date: 2026-10-18 10:02:17.554930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8a1f5b2e7'
+down_revision = '9b1f2c7d4e10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Branch-scoped period filters (dashboard KPIs, trends, lists, exports)
+    op.create_index('ix_sales_voucher_group_branch_id_sale_date', 'sales_voucher_group', ['branch_id', 'sale_date'], unique=False)
+    op.create_index('ix_sales_b2bc_branch_id_sale_date', 'sales_b2bc', ['branch_id', 'sale_date'], unique=False)
+    op.create_index('ix_bookings_branch_id_booking_date', 'bookings', ['branch_id', 'booking_date', 'time_slot'], unique=False)
+    # Admin (all branches) date windows and keyset pagination
+    op.create_index('ix_sales_voucher_group_sale_date', 'sales_voucher_group', ['sale_date'], unique=False)
+    op.create_index('ix_sales_b2bc_sale_date', 'sales_b2bc', ['sale_date'], unique=False)
+    op.create_index('ix_bookings_booking_date', 'bookings', ['booking_date', 'time_slot'], unique=False)
+    # Covering indexes for the group-by rankings
+    op.create_index('ix_sales_voucher_group_branch_id_sale_type', 'sales_voucher_group', ['branch_id', 'sale_type'], unique=False)
+    op.create_index('ix_sales_voucher_group_branch_id_product_name', 'sales_voucher_group', ['branch_id', 'product_name'], unique=False)
+    op.create_index('ix_sales_voucher_group_branch_id_partner_name', 'sales_voucher_group', ['branch_id', 'partner_name', 'total_sale'], unique=False)
+    # Eager loading of a sale's bookings
+    op.create_index('ix_bookings_voucher_group_sale_id', 'bookings', ['voucher_group_sale_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_bookings_voucher_group_sale_id', table_name='bookings')
+    op.drop_index('ix_sales_voucher_group_branch_id_partner_name', table_name='sales_voucher_group')
+    op.drop_index('ix_sales_voucher_group_branch_id_product_name', table_name='sales_voucher_group')
+    op.drop_index('ix_sales_voucher_group_branch_id_sale_type', table_name='sales_voucher_group')
+    op.drop_index('ix_bookings_booking_date', table_name='bookings')
+    op.drop_index('ix_sales_b2bc_sale_date', table_name='sales_b2bc')
+    op.drop_index('ix_sales_voucher_group_sale_date', table_name='sales_voucher_group')
+    op.drop_index('ix_bookings_branch_id_booking_date', table_name='bookings')
+    op.drop_index('ix_sales_b2bc_branch_id_sale_date', table_name='sales_b2bc')
+    op.drop_index('ix_sales_voucher_group_branch_id_sale_date', table_name='sales_voucher_group')
@@ -0,0 +1,89 @@
+"""Make the daily rollup key columns NOT NULL
+
+Revision ID: c7e1a3f5b8d2
+Revises: a1c5e7b9d2f3
+Create Date: 2026-10-18 17:41:05.630294
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e1a3f5b8d2'
+down_revision = 'a1c5e7b9d2f3'
+branch_labels = None
+depends_on = None
+
+# NO_BRANCH / NO_DAY of utils/rollups.py
+NO_BRANCH = 0
+NO_DAY = '1900-01-01'
+
+
+def _create_tables(nullable):
+    # The rollups are derived data: recreate the tables and backfill them
+    op.create_table('daily_sales_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=nullable),
+    sa.Column('day', sa.Date(), nullable=nullable),
+    sa.Column('sale_type', sa.String(length=50), nullable=False),
+    sa.Column('product_name', sa.String(length=100), nullable=False),
+    sa.Column('sale_count', sa.Integer(), nullable=False),
+    sa.Column('voucher_revenue', sa.Float(), nullable=False),
+    sa.Column('b2bc_revenue', sa.Float(), nullable=False),
+    sa.Column('commission', sa.Float(), nullable=False),
+    *([sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], )] if nullable else []),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('branch_id', 'day', 'sale_type', 'product_name', name='uq_daily_sales_rollup_key')
+    )
+    op.create_table('daily_booking_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('branch_id', sa.Integer(), nullable=nullable),
+    sa.Column('day', sa.Date(), nullable=nullable),
+    sa.Column('booking_count', sa.Integer(), nullable=False),
+    sa.Column('headcount', sa.Integer(), nullable=False),
+    *([sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], )] if nullable else []),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('branch_id', 'day', name='uq_daily_booking_rollup_key')
+    )
+
+
+def _backfill(branch_id, day):
+    """Same aggregation as `flask rollups rebuild`; branch_id/day are SQL templates over the raw column."""
+    op.execute(f"""
+        INSERT INTO daily_sales_rollup
+            (branch_id, day, sale_type, product_name, sale_count, voucher_revenue, b2bc_revenue, commission)
+        SELECT {branch_id.format('branch_id')}, {day.format('date(sale_date)')}, sale_type,
+               COALESCE(product_name, ''), COUNT(id), COALESCE(SUM(total_sale), 0), 0, 0
+        FROM sales_voucher_group
+        GROUP BY branch_id, date(sale_date), sale_type, COALESCE(product_name, '')
+    """)
+    op.execute(f"""
+        INSERT INTO daily_sales_rollup
+            (branch_id, day, sale_type, product_name, sale_count, voucher_revenue, b2bc_revenue, commission)
+        SELECT {branch_id.format('branch_id')}, {day.format('date(sale_date)')}, 'b2bc',
+               COALESCE(course_name, ''), COUNT(id), 0, COALESCE(SUM(price), 0), COALESCE(SUM(commission_amount), 0)
+        FROM sales_b2bc
+        GROUP BY branch_id, date(sale_date), COALESCE(course_name, '')
+    """)
+    op.execute(f"""
+        INSERT INTO daily_booking_rollup (branch_id, day, booking_count, headcount)
+        SELECT {branch_id.format('branch_id')}, {day.format('booking_date')},
+               COUNT(id), COALESCE(SUM(actual_quantity), 0)
+        FROM bookings
+        GROUP BY branch_id, booking_date
+    """)
+
+
+def upgrade():
+    op.drop_table('daily_booking_rollup')
+    op.drop_table('daily_sales_rollup')
+    _create_tables(nullable=False)
+    _backfill(f"COALESCE({{}}, {NO_BRANCH})", f"COALESCE({{}}, '{NO_DAY}')")
+
+
+def downgrade():
+    op.drop_table('daily_booking_rollup')
+    op.drop_table('daily_sales_rollup')
+    _create_tables(nullable=True)
+    _backfill("{}", "{}")
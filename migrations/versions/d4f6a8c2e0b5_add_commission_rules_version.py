@@ -0,0 +1,24 @@
+"""Add commission rules version counter
+
+Revision ID: d4f6a8c2e0b5
+Revises: b8e2f4a6c1d3
+Create Date: 2026-10-18 14:32:10.518377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6a8c2e0b5'
+down_revision = 'b8e2f4a6c1d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("INSERT INTO reference_data_version (name, version) VALUES ('commission_rules', 0)")
+
+
+def downgrade():
+    op.execute("DELETE FROM reference_data_version WHERE name = 'commission_rules'")
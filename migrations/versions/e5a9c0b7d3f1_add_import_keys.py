@@ -0,0 +1,36 @@
+"""Add import_key natural keys to imported sales
+
+Revision ID: e5a9c0b7d3f1
+Revises: c3d8a1f5b2e7
+Create Date: 2026-10-18 10:41:05.317762
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c0b7d3f1'
+down_revision = 'c3d8a1f5b2e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sales_voucher_group', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('import_key', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_sales_voucher_group_import_key', ['import_key'], unique=True)
+
+    with op.batch_alter_table('sales_b2bc', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('import_key', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_sales_b2bc_import_key', ['import_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sales_b2bc', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_b2bc_import_key')
+        batch_op.drop_column('import_key')
+
+    with op.batch_alter_table('sales_voucher_group', schema=None) as batch_op:
+        batch_op.drop_index('ix_sales_voucher_group_import_key')
+        batch_op.drop_column('import_key')
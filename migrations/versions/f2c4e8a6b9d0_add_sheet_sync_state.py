@@ -0,0 +1,41 @@
+"""Add sheet sync state tables
+
+Revision ID: f2c4e8a6b9d0
+Revises: e5a9c0b7d3f1
+Create Date: 2026-10-18 11:20:44.108215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c4e8a6b9d0'
+down_revision = 'e5a9c0b7d3f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sheet_sync_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(length=120), nullable=False),
+    sa.Column('last_row', sa.Integer(), nullable=False),
+    sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('source')
+    )
+    op.create_table('sheet_sync_rows',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(length=120), nullable=False),
+    sa.Column('import_key', sa.String(length=64), nullable=False),
+    sa.Column('row_hash', sa.String(length=40), nullable=False),
+    sa.Column('row_number', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('source', 'import_key', name='uq_sheet_sync_rows_source_import_key')
+    )
+
+
+def downgrade():
+    op.drop_table('sheet_sync_rows')
+    op.drop_table('sheet_sync_state')
@@ -46,6 +46,14 @@ class Branch(db.Model):
 
 class SalesVoucherGroup(db.Model):
     __tablename__ = 'sales_voucher_group'
+    __table_args__ = (
+        db.Index('ix_sales_voucher_group_branch_id_sale_date', 'branch_id', 'sale_date'),
+        db.Index('ix_sales_voucher_group_sale_date', 'sale_date'),
+        db.Index('ix_sales_voucher_group_branch_id_sale_type', 'branch_id', 'sale_type'),
+        db.Index('ix_sales_voucher_group_branch_id_product_name', 'branch_id', 'product_name'),
+        db.Index('ix_sales_voucher_group_branch_id_partner_name', 'branch_id', 'partner_name', 'total_sale'),
+        db.Index('ix_sales_voucher_group_import_key', 'import_key', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -69,6 +77,9 @@ class SalesVoucherGroup(db.Model):
     salesperson_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     status = db.Column(db.String(50), default='waiting')
     
+    # Natural key of imported rows (see sheet_to_db.py); NULL for sales entered in the app
+    import_key = db.Column(db.String(64), nullable=True)
+    
     salesperson = db.relationship('User', backref='voucher_group_sales', foreign_keys=[salesperson_id])
     
     bookings = db.relationship(
@@ -83,30 +94,19 @@ class SalesVoucherGroup(db.Model):
         return f"<SalesVoucherGroup (id={self.id}, type={self.sale_type})>"
 
     def compute_activity_group_price(self):
-        brackets_on_site = [(10, 900), (15, 850), (20, 800), (30, 750), (40, 700), (50, 650)]
-        brackets_off_site = [(20, 1300), (40, 1100), (60, 1000), (80, 950), (100, 850)]
-
-        if 'On-site' in (self.product_name or ''):
-            bracket_list = brackets_on_site
-        elif 'Off-site' in (self.product_name or ''):
-            bracket_list = brackets_off_site
-        else:
-            return
-
-        q = self.quantity or 0
-        bracket_list = sorted(bracket_list, key=lambda x: x[0])
-        chosen_bracket_price = None
-        for bracket_people, bracket_price in bracket_list:
-            if q <= bracket_people:
-                chosen_bracket_price = bracket_price
-                break
-        if not chosen_bracket_price:
-            chosen_bracket_price = bracket_list[-1][1]
-
-        self.price_per_unit = chosen_bracket_price
+        """Set price_per_unit from the product's pricing tiers (see utils/pricing.py)."""
+        from utils.pricing import price_list
+        price = price_list().tier_price_by_name(self.product_name, self.quantity or 0)
+        if price is not None:
+            self.price_per_unit = price
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_branch_id_booking_date', 'branch_id', 'booking_date', 'time_slot'),
+        db.Index('ix_bookings_booking_date', 'booking_date', 'time_slot'),
+        db.Index('ix_bookings_voucher_group_sale_id', 'voucher_group_sale_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     
@@ -130,6 +130,11 @@ class Booking(db.Model):
 
 class SalesB2BC(db.Model):
     __tablename__ = 'sales_b2bc'
+    __table_args__ = (
+        db.Index('ix_sales_b2bc_branch_id_sale_date', 'branch_id', 'sale_date'),
+        db.Index('ix_sales_b2bc_sale_date', 'sale_date'),
+        db.Index('ix_sales_b2bc_import_key', 'import_key', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -140,6 +145,7 @@ class SalesB2BC(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'))
     noted = db.Column(db.Text)
+    import_key = db.Column(db.String(64), nullable=True)
 
     def __repr__(self):
         return f"<SalesB2BC (id={self.id}, course={self.course_name})>"
@@ -164,5 +170,114 @@ class Product(db.Model):
     default_price = db.Column(db.Float, default=0.0)
     description = db.Column(db.Text)
 
+    pricing_tiers = db.relationship('PricingTier', backref='product', lazy=True,
+                                    order_by='PricingTier.max_quantity',
+                                    cascade='all, delete-orphan', passive_deletes=True)
+
     def __repr__(self):
         return f"<Product {self.name} (category={self.category}, price={self.default_price})>"
+
+class PricingTier(db.Model):
+    """Unit price of a product for quantities up to max_quantity (see utils/pricing.py)."""
+    __tablename__ = 'pricing_tiers'
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'max_quantity', name='uq_pricing_tiers_product_id_max_quantity'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    max_quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<PricingTier product={self.product_id} <={self.max_quantity} @ {self.unit_price}>"
+
+class DailySalesRollup(db.Model):
+    __tablename__ = 'daily_sales_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'day', 'sale_type', 'product_name', name='uq_daily_sales_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # NOT NULL so that the unique key holds; NO_BRANCH / NO_DAY (utils/rollups.py) stand in for NULL
+    branch_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    sale_type = db.Column(db.String(50), nullable=False)  # 'voucher', 'group' or 'b2bc'
+    product_name = db.Column(db.String(100), nullable=False, default='')  # course_name for B2BC
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    voucher_revenue = db.Column(db.Float, nullable=False, default=0.0)
+    b2bc_revenue = db.Column(db.Float, nullable=False, default=0.0)
+    commission = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<DailySalesRollup {self.branch_id} {self.day} {self.sale_type} {self.product_name}>"
+
+class DailyBookingRollup(db.Model):
+    __tablename__ = 'daily_booking_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'day', name='uq_daily_booking_rollup_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    branch_id = db.Column(db.Integer, nullable=False)  # see DailySalesRollup
+    day = db.Column(db.Date, nullable=False)
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    headcount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyBookingRollup {self.branch_id} {self.day}>"
+
+class SlotOccupancy(db.Model):
+    """Booked places per branch, day and time slot, maintained by utils/rollups.py."""
+    __tablename__ = 'slot_occupancy'
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'day', 'time_slot', name='uq_slot_occupancy_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    branch_id = db.Column(db.Integer, db.ForeignKey('branches.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    time_slot = db.Column(db.String(50), nullable=False)
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    headcount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SlotOccupancy {self.branch_id} {self.day} {self.time_slot} ({self.headcount})>"
+
+class ReferenceDataVersion(db.Model):
+    """Counter bumped by every commit that changes products or branches (see utils/reference_data.py)."""
+    __tablename__ = 'reference_data_version'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ReferenceDataVersion {self.name}={self.version}>"
+
+class SheetSyncState(db.Model):
+    """Watermark of the incremental sync of one source sheet (see sheet_to_db.py)."""
+    __tablename__ = 'sheet_sync_state'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(120), unique=True, nullable=False)  # e.g. 'ProjectH_Sales/P2V'
+    last_row = db.Column(db.Integer, nullable=False, default=0)  # data rows seen by the last run
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<SheetSyncState {self.source} (last_row={self.last_row})>"
+
+class SheetSyncRow(db.Model):
+    """Content hash of every row of a source sheet as of the last sync."""
+    __tablename__ = 'sheet_sync_rows'
+    __table_args__ = (
+        db.UniqueConstraint('source', 'import_key', name='uq_sheet_sync_rows_source_import_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(120), nullable=False)
+    import_key = db.Column(db.String(64), nullable=False)
+    row_hash = db.Column(db.String(40), nullable=False)
+    row_number = db.Column(db.Integer, nullable=True)  # 1-based data row it was last seen at
+
+    def __repr__(self):
+        return f"<SheetSyncRow {self.source} {self.import_key}>"
@@ -1,6 +1,6 @@
 # seed_products.py
 from app import create_app
-from models import db, Product
+from models import db, Product, PricingTier
 
 def seed_products():
     app = create_app()
@@ -19,6 +19,11 @@ def seed_products():
             # ...
             Product(name="B2BC Base", category="b2bc", default_price=0),
         ]
+        # (max people, unit price) per activity product, see utils/pricing.py
+        tiers = {
+            "Activities Group (On-site, 10p)": [(10, 900), (15, 850), (20, 800), (30, 750), (40, 700), (50, 650)],
+            "Activities Group (Off-site, 20p)": [(20, 1300), (40, 1100), (60, 1000), (80, 950), (100, 850)],
+        }
 
         for item in items:
             # check if product already in db
@@ -28,6 +33,9 @@ def seed_products():
                 existing.category = item.category
             else:
                 db.session.add(item)
+                existing = item
+            if item.name in tiers and not existing.pricing_tiers:
+                existing.pricing_tiers = [PricingTier(max_quantity=q, unit_price=p) for q, p in tiers[item.name]]
 
         db.session.commit()
         print("Products seeded successfully.")
@@ -1,15 +1,31 @@
 # sheet_to_db.py
-import gspread
-from google.oauth2.service_account import Credentials
-from app import create_app
-from models import db, SalesVoucherGroup, SalesB2BC, Booking, Branch, User
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, update, delete
+from models import db, SalesVoucherGroup, SalesB2BC, Booking, Branch, User, SheetSyncState, SheetSyncRow
+from utils.rollups import rebuild_rollups
+from utils.reference_data import bump_bulk_writes
+import argparse
+import csv
 import datetime
-from flask import flash
+import hashlib
+import itertools
+import json
+import os
+
+# Rows per INSERT/UPDATE batch
+IMPORT_CHUNK_SIZE = 1000
+# Optional column holding a stable id of the row in the source system
+ROW_ID_COLUMN = "Row ID"
+SPREADSHEET_NAME = "ProjectH_Sales"
 
 def get_worksheet(sheet_name, worksheet_title):
     """
     Returns a gspread worksheet object given a sheet name and a worksheet title.
     """
+    import gspread
+    from google.oauth2.service_account import Credentials
+
     scope = [
         "https://spreadsheets.google.com/feeds",
         "https://www.googleapis.com/auth/spreadsheets",
@@ -21,113 +37,471 @@ def get_worksheet(sheet_name, worksheet_title):
     sheet = client.open(sheet_name)
     return sheet.worksheet(worksheet_title)
 
+# --------------------------------------------------------------------------------
+# Stage 1: lookup maps, loaded once per import
+# --------------------------------------------------------------------------------
+def load_branch_map():
+    return {name: id for id, name in db.session.query(Branch.id, Branch.name)}
+
+def load_user_map():
+    return {username: id for id, username in db.session.query(User.id, User.username)}
+
+def ensure_branches(names, branch_map):
+    """Create every missing branch in one batch and add them to branch_map."""
+    missing = sorted({name for name in names if name not in branch_map})
+    if missing:
+        branches = [Branch(name=name, location="Unknown Location") for name in missing]
+        db.session.add_all(branches)
+        db.session.flush()
+        branch_map.update({b.name: b.id for b in branches})
+    return branch_map
+
+def ensure_fallback_salesperson(user_map, branch_id=None):
+    """Id of the 'admin' user that B2BC rows without a known salesperson are assigned to."""
+    if 'admin' not in user_map:
+        salesperson = User(username='admin', email='admin@example.com', role='admin', branch_id=branch_id)
+        salesperson.set_password('adminpassword')
+        db.session.add(salesperson)
+        db.session.flush()
+        user_map['admin'] = salesperson.id
+    return user_map['admin']
+
+# --------------------------------------------------------------------------------
+# Stage 2: sheet rows -> insert mappings
+# --------------------------------------------------------------------------------
+def _date(value, default=None):
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.strptime(value, '%Y-%m-%d') if value else default
+
+def _float(value, default=0.0):
+    if value in (None, ''):
+        return default
+    if isinstance(value, str):
+        value = value.replace(',', '')
+    return float(value)
+
+def _text(value, default=""):
+    return default if value is None else str(value)
+
+def natural_key(row, parts, seen):
+    """
+    Stable import_key for a row: its explicit "Row ID" when the export has
+    one, otherwise a hash of its natural key. `seen` counts identical natural
+    keys within one import so that genuinely repeated rows stay distinct.
+    """
+    row_id = row.get(ROW_ID_COLUMN)
+    if row_id not in (None, ''):
+        return f"row:{row_id}"[:64]
+    base = '|'.join(_text(part) for part in parts)
+    occurrence = seen.get(base, 0)
+    seen[base] = occurrence + 1
+    return 'nk:' + hashlib.sha1(f"{base}|{occurrence}".encode('utf-8')).hexdigest()
+
+def _key_date(value):
+    parsed = _date(value)
+    return parsed.strftime('%Y-%m-%d') if parsed else ''
+
+def p2v_import_key(row, seen):
+    return natural_key(row, ('p2v', _key_date(row.get("Sale Date")), _text(row.get("Partner Name")),
+                             row.get("Voucher Type"), '%.2f' % _float(row.get("Total Sale", 0)),
+                             _text(row.get("Branch Name"), "Default Branch")), seen)
+
+def b2bc_import_key(row, seen):
+    return natural_key(row, ('b2bc', _key_date(row.get("Sale Date")), _text(row.get("Salesperson"), "admin"),
+                             _text(row.get("Course Name"), "Muay Thai Course"),
+                             '%.2f' % _float(row.get("Price", 0)),
+                             _text(row.get("Branch Name"), "Default Branch")), seen)
+
+def _without_missing_date(mapping):
+    """
+    Leave sale_date out when the sheet has none, so that re-imports do not
+    overwrite it; new rows get the current time on insert (_with_sale_date).
+    """
+    if mapping['sale_date'] is None:
+        del mapping['sale_date']
+    return mapping
+
+def _with_sale_date(mappings):
+    now = datetime.datetime.utcnow()
+    return [m if 'sale_date' in m else dict(m, sale_date=now) for m in mappings]
+
+def p2v_row_to_mappings(row, branch_map, import_key):
+    """Return (sale, booking or None) insert mappings for a P2V row."""
+    branch_id = branch_map[_text(row.get("Branch Name"), "Default Branch")]
+    sale = {
+        'sale_date': _date(row.get("Sale Date")),
+        'sale_type': "voucher",
+        'product_name': row.get("Voucher Type"),
+        'quantity': int(_float(row.get("Quantity Sold", 1), 1)),
+        'price_per_unit': _float(row.get("Price (Per Unit)", 0)),
+        'total_price': _float(row.get("Total Price", 0)),
+        'vat_7': _float(row.get("Vat 7%", 0)),
+        'total_sale': _float(row.get("Total Sale", 0)),
+        'partner_name': _text(row.get("Partner Name")),
+        'branch_id': branch_id,
+        'noted': _text(row.get("Notes")),
+        'import_key': import_key,
+    }
+    booking = None
+    if row.get("Booking Date"):
+        booking = {
+            'booking_date': _date(row.get("Booking Date")).date(),
+            'time_slot': _text(row.get("Time")),
+            'status': 'booked',
+            'branch_id': branch_id,
+            'noted': _text(row.get("Booking Notes")),
+        }
+    return _without_missing_date(sale), booking
+
+def b2bc_row_to_mapping(row, branch_map, user_map, fallback_user_id, import_key):
+    salesperson = _text(row.get("Salesperson"), "admin")
+    price = _float(row.get("Price", 0))
+    commission_rate = _float(row.get("Commission Rate", 0.1), 0.1)
+    return _without_missing_date({
+        'sale_date': _date(row.get("Sale Date")),
+        'course_name': _text(row.get("Course Name"), "Muay Thai Course"),
+        'price': price,
+        'commission_rate': commission_rate,
+        'commission_amount': price * commission_rate,
+        'user_id': user_map.get(salesperson, fallback_user_id),
+        'branch_id': branch_map[_text(row.get("Branch Name"), "Default Branch")],
+        'noted': _text(row.get("Notes")),
+        'import_key': import_key,
+    })
+
+# --------------------------------------------------------------------------------
+# Stage 3: chunked bulk upserts on import_key
+# --------------------------------------------------------------------------------
+def _chunks(items, size):
+    """Yield lists of up to `size` items from any iterable (including generators)."""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _existing_ids(model, keys):
+    """import_key -> id for the keys that are already in the table."""
+    rows = db.session.query(model.import_key, model.id).filter(model.import_key.in_(keys))
+    return dict(rows.all())
+
+def _insert_sale_ids(sales):
+    """INSERT a chunk of sales and return their ids in the same order."""
+    dialect = db.engine.dialect
+    if getattr(dialect, 'insert_executemany_returning_sort_by_parameter_order', False):
+        stmt = insert(SalesVoucherGroup).returning(SalesVoucherGroup.id, sort_by_parameter_order=True)
+        return db.session.execute(stmt, sales).scalars().all()
+    # No ordered RETURNING for executemany on this backend: one flush per chunk
+    objects = [SalesVoucherGroup(**sale) for sale in sales]
+    db.session.add_all(objects)
+    db.session.flush()
+    return [obj.id for obj in objects]
+
+def upsert_sales_with_bookings(pairs, stats):
+    """
+    Upsert one chunk of (sale, booking or None) mapping pairs. New sales are
+    inserted and each booking is linked to the id its sale received. Sales
+    already imported are updated in place; their bookings belong to the staff
+    from then on (status, notes, reschedules) and are left alone, only a sale
+    without any booking yet gets the one from the sheet.
+    """
+    existing = _existing_ids(SalesVoucherGroup, [sale['import_key'] for sale, _ in pairs])
+    new = [(sale, booking) for sale, booking in pairs if sale['import_key'] not in existing]
+    known = [(dict(sale, id=existing[sale['import_key']]), booking)
+             for sale, booking in pairs if sale['import_key'] in existing]
+
+    bookings = []
+    if new:
+        ids = _insert_sale_ids(_with_sale_date([sale for sale, _ in new]))
+        bookings = [dict(booking, voucher_group_sale_id=sale_id)
+                    for sale_id, (_, booking) in zip(ids, new) if booking is not None]
+    if known:
+        db.session.execute(update(SalesVoucherGroup), [sale for sale, _ in known])
+        with_booking = {sale['id']: booking for sale, booking in known if booking is not None}
+        booked = {sale_id for sale_id, in db.session.query(Booking.voucher_group_sale_id)
+                  .filter(Booking.voucher_group_sale_id.in_(list(with_booking))).distinct()} if with_booking else set()
+        bookings += [dict(booking, voucher_group_sale_id=sale_id)
+                     for sale_id, booking in with_booking.items() if sale_id not in booked]
+    if bookings:
+        db.session.execute(insert(Booking), bookings)
+    # Core writes bypass the flush hooks of the dashboard and availability caches
+    bump_bulk_writes(db.session)
+
+    stats['inserted'] += len(new)
+    stats['updated'] += len(known)
+    stats['bookings'] += len(bookings)
+
+def upsert(model, mappings, stats):
+    """Upsert one chunk of mappings of a model that has an import_key."""
+    existing = _existing_ids(model, [m['import_key'] for m in mappings])
+    new = [m for m in mappings if m['import_key'] not in existing]
+    known = [dict(m, id=existing[m['import_key']]) for m in mappings if m['import_key'] in existing]
+    if new:
+        db.session.execute(insert(model), _with_sale_date(new))
+    if known:
+        db.session.execute(update(model), known)
+    # Core writes bypass the dashboard cache's flush hook
+    bump_bulk_writes(db.session)
+    stats['inserted'] += len(new)
+    stats['updated'] += len(known)
+
+# --------------------------------------------------------------------------------
+# Pipelines
+# --------------------------------------------------------------------------------
+def _branch_names(rows):
+    return [_text(row.get("Branch Name"), "Default Branch") for row in rows]
+
+def _keyed(rows, key_fn):
+    """Pair every record with its import_key, in source order."""
+    seen = {}
+    for row in rows:
+        yield key_fn(row, seen), row
+
+def upsert_p2v_rows(keyed_rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Upsert (import_key, P2V record) pairs chunk by chunk. Caller commits."""
+    stats = {'inserted': 0, 'updated': 0, 'bookings': 0}
+    branch_map = load_branch_map()
+    for chunk in _chunks(keyed_rows, chunk_size):
+        ensure_branches(_branch_names(row for _, row in chunk), branch_map)
+        upsert_sales_with_bookings([p2v_row_to_mappings(row, branch_map, key) for key, row in chunk], stats)
+    return stats
+
+def upsert_b2bc_rows(keyed_rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Upsert (import_key, B2BC record) pairs chunk by chunk. Caller commits."""
+    stats = {'inserted': 0, 'updated': 0}
+    branch_map = load_branch_map()
+    user_map = load_user_map()
+    fallback_user_id = user_map.get('admin')
+    for chunk in _chunks(keyed_rows, chunk_size):
+        names = _branch_names(row for _, row in chunk)
+        ensure_branches(names, branch_map)
+        if fallback_user_id is None and any(_text(row.get("Salesperson"), "admin") not in user_map
+                                            for _, row in chunk):
+            fallback_user_id = ensure_fallback_salesperson(user_map, branch_map[names[0]])
+        upsert(SalesB2BC, [b2bc_row_to_mapping(row, branch_map, user_map, fallback_user_id, key)
+                           for key, row in chunk], stats)
+    return stats
+
+def import_p2v_rows(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import P2V records (any iterable of dicts), chunk by chunk.
+    Re-importing the same rows updates them instead of duplicating. Caller commits.
+    """
+    return upsert_p2v_rows(_keyed(rows, p2v_import_key), chunk_size)
+
+def import_b2bc_rows(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import B2BC records (any iterable of dicts), chunk by chunk. Caller commits."""
+    return upsert_b2bc_rows(_keyed(rows, b2bc_import_key), chunk_size)
+
+# --------------------------------------------------------------------------------
+# Offline files (CSV / XLSX exports with the same column layout as the sheets)
+# --------------------------------------------------------------------------------
+def iter_file_records(path):
+    """Yield one dict per data row of a CSV or XLSX file without loading it whole."""
+    if path.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [_text(h).strip() for h in next(rows, [])]
+            for values in rows:
+                if any(v not in (None, '') for v in values):
+                    yield dict(zip(headers, values))
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                if any(v not in (None, '') for v in row.values()):
+                    yield {k.strip(): v for k, v in row.items() if k}
+
+def import_file(path, kind, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import a local P2V or B2BC export file; idempotent on import_key."""
+    records = iter_file_records(path)
+    if kind == 'p2v':
+        stats = import_p2v_rows(records, chunk_size)
+    elif kind == 'b2bc':
+        stats = import_b2bc_rows(records, chunk_size)
+    else:
+        raise ValueError(f"Unknown import kind '{kind}' (expected 'p2v' or 'b2bc').")
+    db.session.commit()
+    return stats
+
+# --------------------------------------------------------------------------------
+# Incremental sync
+#
+# Every run still reads the whole source (a sheet offers no change feed), but
+# only rows whose content hash differs from the one stored in sheet_sync_rows
+# are written, so database work scales with the delta. Rows that disappeared
+# from the source are reported, not deleted.
+# --------------------------------------------------------------------------------
+SYNC_KINDS = {
+    'p2v': (p2v_import_key, upsert_p2v_rows, SalesVoucherGroup),
+    'b2bc': (b2bc_import_key, upsert_b2bc_rows, SalesB2BC),
+}
+
+class SheetSource:
+    """A worksheet of the Google spreadsheet."""
+    def __init__(self, kind, worksheet_title, sheet_name=SPREADSHEET_NAME):
+        self.kind = kind
+        self.sheet_name = sheet_name
+        self.worksheet_title = worksheet_title
+        self.name = f"{sheet_name}/{worksheet_title}"
+
+    def records(self):
+        return get_worksheet(self.sheet_name, self.worksheet_title).get_all_records()
+
+class FileSource:
+    """A local CSV/XLSX file with the worksheet's column layout (e.g. a scheduled export)."""
+    def __init__(self, kind, path, name=None):
+        self.kind = kind
+        self.path = path
+        self.name = name or f"file:{os.path.basename(path)}"
+
+    def records(self):
+        return iter_file_records(self.path)
+
+def row_hash(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def sync_source(source, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Apply the new and changed rows of `source` and record their hashes.
+    Returns a report dict; the caller commits.
+    """
+    key_fn, upsert_fn, model = SYNC_KINDS[source.kind]
+    state = SheetSyncState.query.filter_by(source=source.name).first()
+    if state is None:
+        state = SheetSyncState(source=source.name, last_row=0)
+        db.session.add(state)
+    stored = {key: (id, hash) for id, key, hash in db.session.query(
+        SheetSyncRow.id, SheetSyncRow.import_key, SheetSyncRow.row_hash).filter_by(source=source.name)}
+
+    changed, new_hashes, changed_hashes, present = [], [], [], set()
+    row_count = 0
+    for row_count, (key, row) in enumerate(_keyed(source.records(), key_fn), start=1):
+        present.add(key)
+        digest = row_hash(row)
+        previous = stored.get(key)
+        if previous is not None and previous[1] == digest:
+            continue
+        changed.append((key, row))
+        mapping = {'source': source.name, 'import_key': key, 'row_hash': digest, 'row_number': row_count}
+        if previous is None:
+            new_hashes.append(mapping)
+        else:
+            changed_hashes.append(dict(mapping, id=previous[0]))
+
+    stats = upsert_fn(changed, chunk_size)
+    for chunk in _chunks(new_hashes, chunk_size):
+        db.session.execute(insert(SheetSyncRow), chunk)
+    for chunk in _chunks(changed_hashes, chunk_size):
+        db.session.execute(update(SheetSyncRow), chunk)
+
+    deleted = sorted(set(stored) - present)
+    deleted_ids = {}
+    for chunk in _chunks(deleted, chunk_size):
+        deleted_ids.update(_existing_ids(model, chunk))
+        db.session.execute(delete(SheetSyncRow).where(SheetSyncRow.id.in_([stored[key][0] for key in chunk])))
+
+    report = {
+        'source': source.name,
+        'rows': row_count,
+        'appended': max(row_count - state.last_row, 0),
+        'new': len(new_hashes),
+        'changed': len(changed_hashes),
+        'unchanged': row_count - len(changed),
+        'deleted': len(deleted),
+        # Ids of the sales whose row is gone from the source, for manual review
+        'deleted_sale_ids': sorted(deleted_ids.values()),
+    }
+    report.update(stats)
+    state.last_row = row_count
+    state.last_synced_at = datetime.datetime.utcnow()
+    return report
+
+def default_sources():
+    return [SheetSource('p2v', "P2V"), SheetSource('b2bc', "B2BC")]
+
+def sync_sources(sources, chunk_size=IMPORT_CHUNK_SIZE):
+    """Sync each source in its own transaction and return their reports."""
+    reports = []
+    for source in sources:
+        reports.append(sync_source(source, chunk_size))
+        db.session.commit()
+    if any(report['inserted'] or report['updated'] for report in reports):
+        # Bulk upserts bypass the rollup hooks
+        rebuild_rollups()
+    return reports
+
+def _format_report(report):
+    line = (f"{report['source']}: {report['rows']} rows ({report['appended']} appended), "
+            f"{report['new']} new, {report['changed']} changed, {report['unchanged']} unchanged, "
+            f"{report['deleted']} deleted")
+    if report['deleted_sale_ids']:
+        line += f"\n  rows removed from the source (sale ids): {report['deleted_sale_ids']}"
+    return line
+
+sheets_cli = AppGroup('sheets', help='Synchronise sales from the P2V/B2BC sheets.')
+
+@sheets_cli.command('sync')
+@click.option('--p2v-file', help="Sync from a CSV/XLSX export instead of the P2V worksheet.")
+@click.option('--b2bc-file', help="Sync from a CSV/XLSX export instead of the B2BC worksheet.")
+def sync_command(p2v_file, b2bc_file):
+    """Apply only the rows added or changed since the last sync."""
+    if p2v_file or b2bc_file:
+        sources = [FileSource(kind, path) for kind, path in (('p2v', p2v_file), ('b2bc', b2bc_file)) if path]
+    else:
+        sources = default_sources()
+    for report in sync_sources(sources):
+        click.echo(_format_report(report))
+
 def migrate_p2v_to_db():
     # Example: read the "P2V" tab in your spreadsheet
-    ws = get_worksheet("ProjectH_Sales", "P2V")
-    data = ws.get_all_records()
-    
-    for row in data:
-        sale_date_str = row.get("Sale Date")
-        sale_date = datetime.datetime.strptime(sale_date_str, '%Y-%m-%d') if sale_date_str else datetime.datetime.utcnow()
-        
-        product_name = row.get("Voucher Type")
-        quantity = row.get("Quantity Sold", 1)
-        price_per_unit = float(row.get("Price (Per Unit)", 0))
-        total_price = float(row.get("Total Price", 0))
-        vat_7 = float(row.get("Vat 7%", 0))
-        total_sale = float(row.get("Total Sale", 0))
-        partner_name = row.get("Partner Name", "")
-        branch_name = row.get("Branch Name", "Default Branch")
-        
-        # Ensure branch exists
-        branch = Branch.query.filter_by(name=branch_name).first()
-        if not branch:
-            branch = Branch(name=branch_name, location="Unknown Location")
-            db.session.add(branch)
-            db.session.commit()
-        
-        sale = SalesVoucherGroup(
-            sale_date=sale_date,
-            sale_type="voucher",
-            product_name=product_name,
-            quantity=int(quantity),
-            price_per_unit=price_per_unit,
-            total_price=total_price,
-            vat_7=vat_7,
-            total_sale=total_sale,
-            partner_name=partner_name,
-            branch_id=branch.id,
-            noted=row.get("Notes", "")
-        )
-        db.session.add(sale)
-        
-        # If there's a booking date, create a booking
-        booking_date_str = row.get("Booking Date")
-        if booking_date_str:
-            booking_date = datetime.datetime.strptime(booking_date_str, '%Y-%m-%d').date()
-            time_slot = row.get("Time", "")
-            booking = Booking(
-                voucher_group_sale_id=sale.id,
-                booking_date=booking_date,
-                time_slot=time_slot,
-                status='booked',
-                branch_id=branch.id,
-                noted=row.get("Booking Notes", "")
-            )
-            db.session.add(booking)
-    
+    ws = get_worksheet(SPREADSHEET_NAME, "P2V")
+    stats = import_p2v_rows(ws.get_all_records())
     db.session.commit()
+    print(f"P2V: {stats}")
 
 def migrate_b2bc_to_db():
     # Read the "B2BC" tab
-    ws = get_worksheet("ProjectH_Sales", "B2BC")
-    data = ws.get_all_records()
-
-    for row in data:
-        sale_date_str = row.get("Sale Date")
-        sale_date = datetime.datetime.strptime(sale_date_str, '%Y-%m-%d') if sale_date_str else datetime.datetime.utcnow()
-        
-        course_name = row.get("Course Name", "Muay Thai Course")
-        price = float(row.get("Price", 0))
-        commission_rate = float(row.get("Commission Rate", 0.1))
-        commission_amount = price * commission_rate
-        branch_name = row.get("Branch Name", "Default Branch")
-        
-        # Ensure branch exists
-        branch = Branch.query.filter_by(name=branch_name).first()
-        if not branch:
-            branch = Branch(name=branch_name, location="Unknown Location")
-            db.session.add(branch)
-            db.session.commit()
-        
-        # Ensure the salesperson exists
-        salesperson_username = row.get("Salesperson", "admin")
-        salesperson = User.query.filter_by(username=salesperson_username).first()
-        if not salesperson:
-            salesperson = User(username='admin', email='admin@example.com', role='admin', branch_id=branch.id)
-            salesperson.set_password('adminpassword')
-            db.session.add(salesperson)
-            db.session.commit()
-        
-        sale = SalesB2BC(
-            sale_date=sale_date,
-            course_name=course_name,
-            price=price,
-            commission_rate=commission_rate,
-            commission_amount=commission_amount,
-            user_id=salesperson.id,
-            branch_id=branch.id,
-            noted=row.get("Notes", "")
-        )
-        db.session.add(sale)
-    
+    ws = get_worksheet(SPREADSHEET_NAME, "B2BC")
+    stats = import_b2bc_rows(ws.get_all_records())
     db.session.commit()
+    print(f"B2BC: {stats}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Import P2V/B2BC sales from Google Sheets or local files.")
+    parser.add_argument('--p2v-file', help="CSV/XLSX export of the P2V sheet")
+    parser.add_argument('--b2bc-file', help="CSV/XLSX export of the B2BC sheet")
+    parser.add_argument('--sync', action='store_true',
+                        help="Apply only new/changed rows of the worksheets (same as `flask sheets sync`)")
+    args = parser.parse_args()
+
+    # Imported here: app.py imports this module for the `flask sheets` commands
+    from app import create_app
+
     app = create_app()
     with app.app_context():
-        migrate_p2v_to_db()
-        migrate_b2bc_to_db()
+        if args.sync:
+            for report in sync_sources(default_sources()):
+                print(_format_report(report))
+            return
+        if args.p2v_file or args.b2bc_file:
+            if args.p2v_file:
+                print(f"P2V: {import_file(args.p2v_file, 'p2v')}")
+            if args.b2bc_file:
+                print(f"B2BC: {import_file(args.b2bc_file, 'b2bc')}")
+        else:
+            migrate_p2v_to_db()
+            migrate_b2bc_to_db()
+        # Bulk inserts bypass the rollup hooks
+        rebuild_rollups()
         print("Data migrated successfully.")
 
 if __name__ == "__main__":
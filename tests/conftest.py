@@ -0,0 +1,23 @@
+# tests/conftest.py
+import os
+import tempfile
+import pytest
+
+# Config reads DATABASE_URL at import time: point it at a scratch database
+# before the app is imported, never at mygym.db
+_db_dir = tempfile.mkdtemp(prefix='mygym-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+
+from app import create_app
+from models import db
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
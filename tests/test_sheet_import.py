@@ -0,0 +1,42 @@
+# tests/test_sheet_import.py
+from models import db, Booking, SalesVoucherGroup
+from sheet_to_db import import_p2v_rows
+
+P2V_ROWS = [
+    {"Sale Date": "2024-03-01", "Partner Name": "Klook", "Voucher Type": "1 Day Pass", "Total Sale": 1500,
+     "Branch Name": "Patong", "Booking Date": "2024-03-05", "Time": "09:00", "Booking Notes": "from sheet"},
+    {"Sale Date": "2024-03-02", "Partner Name": "Agoda", "Voucher Type": "1 Day Pass", "Total Sale": 750,
+     "Branch Name": "Patong", "Booking Date": "2024-03-06", "Time": "15:00", "Booking Notes": ""},
+]
+
+
+def _bookings():
+    return {b.voucher_group_sale_id: (b.status, b.noted, b.booking_date, b.time_slot)
+            for b in Booking.query.order_by(Booking.id)}
+
+
+def test_reimport_keeps_staff_booking_changes(app):
+    assert import_p2v_rows(P2V_ROWS) == {'inserted': 2, 'updated': 0, 'bookings': 2}
+    db.session.commit()
+    used, canceled = Booking.query.order_by(Booking.id).all()
+    used.status, used.noted = 'used', 'checked in at the door'
+    canceled.status, canceled.noted = 'canceled', 'guest cancelled by phone'
+    db.session.commit()
+    before = _bookings()
+
+    assert import_p2v_rows(P2V_ROWS) == {'inserted': 0, 'updated': 2, 'bookings': 0}
+    db.session.commit()
+
+    assert _bookings() == before
+    assert Booking.query.count() == 2
+    assert SalesVoucherGroup.query.count() == 2
+
+
+def test_reimport_adds_booking_to_sale_without_one(app):
+    rows = [dict(P2V_ROWS[0], **{"Booking Date": "", "Time": ""})]
+    assert import_p2v_rows(rows)['bookings'] == 0
+    db.session.commit()
+
+    assert import_p2v_rows(P2V_ROWS[:1])['bookings'] == 1
+    db.session.commit()
+    assert Booking.query.one().status == 'booked'
@@ -0,0 +1,162 @@
+# utils/availability.py
+"""
+Branch x date x time slot availability, read from slot_occupancy.
+
+Occupancy is cached per (branch_id, week starting Monday). A range request
+reads every cached week and fetches all missing weeks with one query.
+Committing a booking change drops the weeks that booking was in, before
+and after the change. Bookings written by other worker processes through
+the ORM show up once their cached weeks expire (AVAILABILITY_CACHE_TTL).
+Bulk writes that bypass the flush hooks (sheet imports, rollup rebuilds)
+bump the shared BULK_WRITES version after which every process, CLI writers
+included, clears the cache: the writer right after its commit, the others
+within REFERENCE_DATA_CHECK_INTERVAL seconds. Capacity is applied when the
+response is built, from the reference data cache, so editing a branch does
+not invalidate anything.
+"""
+from datetime import timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from forms import TIME_SLOTS
+from models import db, Booking, SlotOccupancy
+from utils.cache import TTLCache, MISSING
+from utils.reference_data import reference_data, CacheVersion, BULK_WRITES
+
+availability_cache = TTLCache(maxsize=2048, ttl=300)
+availability_version = CacheVersion(BULK_WRITES, availability_cache)
+
+SLOT_INDEX = {slot: i for i, slot in enumerate(TIME_SLOTS)}
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _weeks(date_from, date_to):
+    week = week_start(date_from)
+    while week <= date_to:
+        yield week
+        week += timedelta(days=7)
+
+
+def _load_weeks(branch_ids, weeks):
+    """
+    Occupancy of the given branches over the given weeks in one query.
+    Returns {(branch_id, week): {day: [headcount per TIME_SLOTS entry]}}.
+    """
+    result = {(branch_id, week): {} for branch_id in branch_ids for week in weeks}
+    rows = db.session.query(SlotOccupancy.branch_id, SlotOccupancy.day,
+                            SlotOccupancy.time_slot, SlotOccupancy.headcount)\
+        .filter(SlotOccupancy.branch_id.in_(branch_ids),
+                SlotOccupancy.day >= min(weeks),
+                SlotOccupancy.day < max(weeks) + timedelta(days=7))
+    for branch_id, day, time_slot, headcount in rows:
+        index = SLOT_INDEX.get(time_slot)
+        entry = result.get((branch_id, week_start(day)))
+        if index is None or entry is None:
+            continue
+        entry.setdefault(day, [0] * len(TIME_SLOTS))[index] = headcount
+    return result
+
+
+def occupancy(branch_ids, date_from, date_to):
+    """{(branch_id, week): {day: [headcount per slot]}} covering the range, cached per week."""
+    weeks = list(_weeks(date_from, date_to))
+    availability_version.check()
+    result, missing_branches, missing_weeks = {}, set(), set()
+    for branch_id in branch_ids:
+        for week in weeks:
+            value = availability_cache.get((branch_id, week))
+            if value is MISSING:
+                missing_branches.add(branch_id)
+                missing_weeks.add(week)
+            else:
+                result[(branch_id, week)] = value
+    if missing_branches:
+        for key, value in _load_weeks(sorted(missing_branches), sorted(missing_weeks)).items():
+            if key not in result:
+                availability_cache.set(key, value)
+                result[key] = value
+    return result
+
+
+def availability(date_from, date_to, branch_id=None):
+    """
+    Return the availability matrix for a date range (inclusive), for one
+    branch or all of them. `headcount` and `free` are aligned with `slots`;
+    `free` is None for branches without a capacity.
+    """
+    branches = reference_data().branches_sorted_by_name()
+    if branch_id:
+        branches = [b for b in branches if b.id == branch_id]
+    weeks = occupancy([b.id for b in branches], date_from, date_to) if branches else {}
+
+    empty = [0] * len(TIME_SLOTS)
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    result = []
+    for branch in branches:
+        rows = []
+        for day in days:
+            headcount = weeks[(branch.id, week_start(day))].get(day, empty)
+            free = None if branch.capacity is None else [max(branch.capacity - h, 0) for h in headcount]
+            rows.append({'date': day.isoformat(), 'headcount': headcount, 'free': free})
+        result.append({'id': branch.id, 'name': branch.name, 'capacity': branch.capacity, 'days': rows})
+    return {
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'slots': list(TIME_SLOTS),
+        'branches': result,
+    }
+
+
+# --------------------------------------------------------------------------------
+# Invalidation
+# --------------------------------------------------------------------------------
+# Marker for "a booking whose branch we could not determine": clears everything
+_UNKNOWN = object()
+
+
+def _touched_weeks(booking):
+    """(branch_id, week) pairs a booking occupied before and after this flush."""
+    state = inspect(booking)
+    if 'branch_id' not in state.dict or 'booking_date' not in state.dict:
+        return {_UNKNOWN}
+    branch_ids = {state.dict['branch_id'], *state.attrs.branch_id.history.deleted}
+    days = {state.dict['booking_date'], *state.attrs.booking_date.history.deleted}
+    return {(branch_id, week_start(day)) for branch_id in branch_ids for day in days
+            if branch_id is not None and day is not None}
+
+
+def after_flush(session, flush_context):
+    touched = session.info.setdefault('availability_touched_weeks', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Booking):
+            touched.update(_touched_weeks(obj))
+
+
+def invalidate_weeks(touched):
+    """Drop the cached (branch_id, week) entries; for booking writes that bypass the flush hooks."""
+    if _UNKNOWN in touched:
+        availability_cache.clear()
+    elif touched:
+        availability_cache.invalidate(lambda key: key in touched)
+
+
+def after_commit(session):
+    touched = session.info.pop('availability_touched_weeks', None)
+    if touched:
+        invalidate_weeks(touched)
+
+
+def after_soft_rollback(session, previous_transaction):
+    session.info.pop('availability_touched_weeks', None)
+
+
+def init_availability(app):
+    """Configure the cache from the app config and register the invalidation hooks."""
+    availability_cache.configure(maxsize=app.config.get('AVAILABILITY_CACHE_SIZE'),
+                                 ttl=app.config.get('AVAILABILITY_CACHE_TTL'))
+    if not event.contains(Session, 'after_commit', after_commit):
+        event.listen(Session, 'after_flush', after_flush)
+        event.listen(Session, 'after_commit', after_commit)
+        event.listen(Session, 'after_soft_rollback', after_soft_rollback)
@@ -0,0 +1,208 @@
+# utils/commission.py
+"""
+B2BC commission rules compiled into a sorted interval table.
+
+Rules are closed price ranges [min_amount, max_amount] with a rate. The
+table splits the price axis at every rule boundary and stores the winning
+rule of each boundary point and of each open gap between two points, so a
+lookup is one bisect. Where rules overlap the oldest rule (lowest id) wins,
+which is what the former unordered range query returned on SQLite; prices
+outside every rule earn no commission. `flask commissions check` reports
+overlaps, gaps and invalid rules.
+
+The compiled table is cached per process behind the 'commission_rules'
+version counter (see utils/reference_data.py), so any commit that writes a
+CommissionRule reloads it here and, within the check interval, in every
+other worker.
+
+recompute_b2bc_commissions() applies the current rules to existing sales in
+chunked bulk UPDATEs and keeps daily_sales_rollup and the dashboard cache in
+step, since bulk statements bypass the session hooks.
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import update
+from models import db, CommissionRule, SalesB2BC
+from utils.reference_data import VersionedCache, watch
+from utils.rollups import adjust_sales_rollups, SALES_MEASURES
+from utils.dashboard_cache import invalidate_branches
+
+VERSION_NAME = 'commission_rules'
+
+# Sales per SELECT / bulk UPDATE when recomputing commissions
+RECOMPUTE_CHUNK_SIZE = 1000
+
+
+# --------------------------------------------------------------------------------
+# Compiled rule table
+# --------------------------------------------------------------------------------
+class CommissionTable:
+    """An immutable interval table built from the rules at one version."""
+
+    def __init__(self, version, rules):
+        self.version = version
+        self.rules = rules  # ordered by id, i.e. by precedence
+        valid = [r for r in rules if r.min_amount <= r.max_amount]
+        self.points = sorted({r.min_amount for r in valid} | {r.max_amount for r in valid})
+        # point_rules[i]: rule covering points[i]; gap_rules[i]: rule covering (points[i], points[i + 1])
+        self.point_rules = [self._first(valid, lambda r, p=p: r.min_amount <= p <= r.max_amount)
+                            for p in self.points]
+        self.gap_rules = [self._first(valid, lambda r, lo=lo, hi=hi: r.min_amount <= lo and hi <= r.max_amount)
+                          for lo, hi in zip(self.points, self.points[1:])]
+
+    @staticmethod
+    def _first(rules, covers):
+        return next((r for r in rules if covers(r)), None)
+
+    def rule_for(self, price):
+        """The rule that applies to a price, or None."""
+        i = bisect_left(self.points, price)
+        if i < len(self.points) and self.points[i] == price:
+            return self.point_rules[i]
+        if 0 < i < len(self.points):
+            return self.gap_rules[i - 1]
+        return None
+
+    def rate_for(self, price):
+        rule = self.rule_for(price or 0)
+        return rule.rate if rule is not None else 0.0
+
+    def commission(self, price):
+        """(commission_rate, commission_amount) for a sale price."""
+        price = price or 0
+        rate = self.rate_for(price)
+        return rate, price * rate
+
+    def validate(self, tolerance=0.01):
+        """Human readable problems with the rule set (empty when it is clean)."""
+        problems = []
+        for r in self.rules:
+            if r.min_amount > r.max_amount:
+                problems.append(f"rule {r.id}: min_amount {r.min_amount} is above max_amount {r.max_amount}")
+            if not 0 <= r.rate <= 1:
+                problems.append(f"rule {r.id}: rate {r.rate} is outside 0-1")
+        valid = sorted((r for r in self.rules if r.min_amount <= r.max_amount),
+                       key=lambda r: (r.min_amount, r.id))
+        covered_to, covered_by = None, None
+        for r in valid:
+            if covered_to is not None and r.min_amount <= covered_to:
+                problems.append(f"rules {covered_by.id} and {r.id} overlap on "
+                                f"{r.min_amount}-{min(r.max_amount, covered_to)}; "
+                                f"rule {min(covered_by.id, r.id)} wins")
+            elif covered_to is not None and r.min_amount - covered_to > tolerance:
+                problems.append(f"no rule covers prices between {covered_to} and {r.min_amount}")
+            if covered_to is None or r.max_amount > covered_to:
+                covered_to, covered_by = r.max_amount, r
+        return problems
+
+
+def _load(version):
+    rules = db.session.query(CommissionRule.id, CommissionRule.min_amount,
+                             CommissionRule.max_amount, CommissionRule.rate).order_by(CommissionRule.id).all()
+    return CommissionTable(version, rules)
+
+
+commission_cache = VersionedCache(VERSION_NAME, _load)
+watch((CommissionRule,), commission_cache)
+
+
+def commission_table():
+    """The current CommissionTable."""
+    return commission_cache.get()
+
+
+# --------------------------------------------------------------------------------
+# Bulk recomputation
+# --------------------------------------------------------------------------------
+def _rollup_key(row):
+    day = row.sale_date.date() if isinstance(row.sale_date, datetime) else row.sale_date
+    return (row.branch_id, day, 'b2bc', row.course_name or '')
+
+
+def recompute_b2bc_commissions(date_from=None, date_to=None, chunk_size=RECOMPUTE_CHUNK_SIZE, dry_run=False):
+    """
+    Recompute commission_rate/commission_amount of the B2BC sales dated within
+    [date_from, date_to] (either bound optional) with the current rules.
+
+    Sales are read in id order, chunk_size at a time. Only rows whose values
+    change are written, with one executemany UPDATE per chunk; the matching
+    daily_sales_rollup commission deltas are applied and the chunk committed.
+    Returns a report dict.
+    """
+    table = commission_table()
+    report = {'rows': 0, 'changed': 0, 'commission_delta': 0.0}
+    filters = []
+    if date_from is not None:
+        filters.append(SalesB2BC.sale_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        filters.append(SalesB2BC.sale_date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    last_id = 0
+    while True:
+        rows = db.session.query(SalesB2BC.id, SalesB2BC.price, SalesB2BC.commission_rate,
+                                SalesB2BC.commission_amount, SalesB2BC.branch_id,
+                                SalesB2BC.sale_date, SalesB2BC.course_name)\
+            .filter(SalesB2BC.id > last_id, *filters)\
+            .order_by(SalesB2BC.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        report['rows'] += len(rows)
+
+        changes, deltas = [], {}
+        for row in rows:
+            rate, amount = table.commission(row.price)
+            old_amount = row.commission_amount or 0
+            if rate == row.commission_rate and abs(amount - old_amount) < 1e-9:
+                continue
+            changes.append({'id': row.id, 'commission_rate': rate, 'commission_amount': amount})
+            if amount != old_amount:
+                measures = deltas.setdefault(_rollup_key(row), [0] * len(SALES_MEASURES))
+                measures[SALES_MEASURES.index('commission')] += amount - old_amount
+                report['commission_delta'] += amount - old_amount
+        report['changed'] += len(changes)
+        if dry_run or not changes:
+            db.session.rollback()
+            continue
+        db.session.execute(update(SalesB2BC), changes)
+        adjust_sales_rollups(db.session.connection(), deltas)
+        db.session.commit()
+        # The bulk UPDATE did not go through the dashboard cache's flush hook
+        invalidate_branches({key[0] for key in deltas})
+    return report
+
+
+# --------------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------------
+commissions_cli = AppGroup('commissions', help='Check and apply the B2BC commission rules.')
+
+@commissions_cli.command('check')
+def check_command():
+    """Report overlapping, missing and invalid commission rules."""
+    problems = commission_table().validate()
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise click.ClickException(f"{len(problems)} commission rule problems found.")
+    click.echo("Commission rules are consistent.")
+
+@commissions_cli.command('recompute')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='First sale date (inclusive).')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Last sale date (inclusive).')
+@click.option('--chunk-size', default=RECOMPUTE_CHUNK_SIZE, show_default=True, help='Sales per bulk UPDATE.')
+@click.option('--dry-run', is_flag=True, help='Report what would change without writing.')
+def recompute_command(date_from, date_to, chunk_size, dry_run):
+    """Recompute B2BC sale commissions from the current rules."""
+    report = recompute_b2bc_commissions(date_from.date() if date_from else None,
+                                        date_to.date() if date_to else None,
+                                        chunk_size, dry_run)
+    verb = 'would change' if dry_run else 'changed'
+    click.echo(f"{report['rows']} sales checked, {report['changed']} {verb}, "
+               f"commission total {verb} by {report['commission_delta']:+.2f}.")
+
+
+def init_commissions(app):
+    """Register the `flask commissions` command group."""
+    app.cli.add_command(commissions_cli)
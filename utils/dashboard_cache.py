@@ -0,0 +1,103 @@
+# utils/dashboard_cache.py
+"""
+Result cache in front of the dashboard widgets of utils/dashboard_stats.py.
+
+Entries are keyed by (scope, day, use_rollups, widget) where scope is ALL_BRANCHES
+for admins or a branch_id for branch staff. A commit that writes a sale,
+B2BC sale, booking or branch drops the entries of the branches it touched
+plus every admin entry; the TTL bounds staleness for such writes made by
+other worker processes. Bulk writes that bypass the flush hooks (sheet
+imports, `flask rollups rebuild`) bump the shared BULK_WRITES version
+instead, which clears the cache of every process, CLI writers included,
+within REFERENCE_DATA_CHECK_INTERVAL seconds.
+"""
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import SalesVoucherGroup, SalesB2BC, Booking, Branch
+from utils.cache import TTLCache, MISSING
+from utils.dashboard_stats import ALL_BRANCHES, compute_widget, compute_widgets
+from utils.reference_data import CacheVersion, BULK_WRITES
+
+dashboard_cache = TTLCache(maxsize=256, ttl=300)
+dashboard_version = CacheVersion(BULK_WRITES, dashboard_cache)
+
+WATCHED_MODELS = (SalesVoucherGroup, SalesB2BC, Booking, Branch)
+
+
+def get_widget(name, branch_id=ALL_BRANCHES, today=None, use_rollups=False):
+    """Return the JSON payload of one widget, computing it on a miss."""
+    today = today or datetime.utcnow().date()
+    dashboard_version.check()
+    key = (branch_id, today, use_rollups, name)
+    return dashboard_cache.get_or_set(key, lambda: compute_widget(name, branch_id, today, use_rollups))
+
+
+def get_widgets(names, branch_id=ALL_BRANCHES, today=None, use_rollups=False, max_workers=1, timings=None):
+    """Return several widget payloads; cache misses are computed concurrently."""
+    today = today or datetime.utcnow().date()
+    dashboard_version.check()
+    results, missing = {}, []
+    for name in names:
+        value = dashboard_cache.get((branch_id, today, use_rollups, name))
+        if value is MISSING:
+            missing.append(name)
+        else:
+            results[name] = value
+    computed = compute_widgets(missing, branch_id, today, use_rollups, max_workers, timings)
+    for name, value in computed.items():
+        dashboard_cache.set((branch_id, today, use_rollups, name), value)
+    results.update(computed)
+    return results
+
+
+# Marker for "a branch we could not determine": invalidates everything
+_UNKNOWN = object()
+
+
+def invalidate_branches(branch_ids):
+    """Drop the cached entries of the given branches and of the admin scope."""
+    if _UNKNOWN in branch_ids:
+        dashboard_cache.clear()
+        return
+    affected = set(branch_ids) | {ALL_BRANCHES}
+    dashboard_cache.invalidate(lambda key: key[0] in affected)
+
+
+def _branch_ids(obj):
+    """Current and pre-flush branch ids of a watched object, without loading anything."""
+    state = inspect(obj)
+    if isinstance(obj, Branch):
+        return {state.identity[0] if state.identity else obj.id}
+    if 'branch_id' not in state.dict:
+        return {_UNKNOWN}
+    ids = {state.dict['branch_id']}
+    ids.update(state.attrs.branch_id.history.deleted)
+    return ids
+
+
+def after_flush(session, flush_context):
+    touched = session.info.setdefault('dashboard_touched_branches', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, WATCHED_MODELS):
+            touched.update(_branch_ids(obj))
+
+
+def after_commit(session):
+    touched = session.info.pop('dashboard_touched_branches', None)
+    if touched:
+        invalidate_branches(touched)
+
+
+def after_soft_rollback(session, previous_transaction):
+    session.info.pop('dashboard_touched_branches', None)
+
+
+def init_dashboard_cache(app):
+    """Configure the cache from the app config and register the invalidation hooks."""
+    dashboard_cache.configure(maxsize=app.config.get('DASHBOARD_CACHE_SIZE'),
+                              ttl=app.config.get('DASHBOARD_CACHE_TTL'))
+    if not event.contains(Session, 'after_commit', after_commit):
+        event.listen(Session, 'after_flush', after_flush)
+        event.listen(Session, 'after_commit', after_commit)
+        event.listen(Session, 'after_soft_rollback', after_soft_rollback)
@@ -0,0 +1,404 @@
+# utils/dashboard_stats.py
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from flask import current_app
+from sqlalchemy import func, case, and_
+from models import (db, SalesVoucherGroup, SalesB2BC, Booking, Branch,
+                    DailySalesRollup, DailyBookingRollup)
+from utils.rollups import NO_BRANCH
+
+# Sentinel scope meaning "every branch" (admin view). Any other value,
+# including None, restricts the queries to that branch_id.
+ALL_BRANCHES = 'all'
+
+
+def scope_for(user):
+    """Return the branch scope a user is allowed to see on the dashboard."""
+    if user.role == 'admin':
+        return ALL_BRANCHES
+    return user.branch_id
+
+
+def _scoped(query, column, branch_id):
+    """Apply the branch filter to a query unless the scope is ALL_BRANCHES."""
+    if branch_id == ALL_BRANCHES:
+        return query
+    return query.filter(column == branch_id)
+
+
+def _scoped_rollup(query, column, branch_id):
+    """_scoped() for a rollup table, where a missing branch is stored as NO_BRANCH."""
+    return _scoped(query, column, NO_BRANCH if branch_id is None else branch_id)
+
+
+def _sum_between(column, amount, start, end):
+    """SUM(CASE WHEN start <= column < end THEN amount ELSE 0 END)"""
+    return func.sum(case((and_(column >= start, column < end), amount), else_=0))
+
+
+def _count_between(column, start, end=None):
+    """COUNT of rows where start <= column (< end), as a conditional SUM."""
+    condition = column >= start if end is None else and_(column >= start, column < end)
+    return func.sum(case((condition, 1), else_=0))
+
+
+def period_bounds(today=None):
+    """Return the date boundaries used by the dashboard for a given day."""
+    today = today or datetime.utcnow().date()
+    return {
+        'today': today,
+        'start_today': datetime.combine(today, datetime.min.time()),
+        'end_today': datetime.combine(today + timedelta(days=1), datetime.min.time()),
+        'start_month': datetime.combine(today.replace(day=1), datetime.min.time()),
+        'start_year': datetime.combine(today.replace(month=1, day=1), datetime.min.time()),
+        'start_week': today - timedelta(days=today.weekday()),
+        'last_30_days': today - timedelta(days=30),
+    }
+
+
+# --------------------------------------------------------------------------------
+# KPI cards: one conditional-aggregate statement per source table
+# --------------------------------------------------------------------------------
+def revenue_kpis(branch_id=ALL_BRANCHES, today=None):
+    """
+    Revenue for today / this month / this year / all time plus commission,
+    computed with a single scan of sales_voucher_group and of sales_b2bc.
+    """
+    p = period_bounds(today)
+    end = p['end_today']
+
+    v = SalesVoucherGroup
+    voucher = _scoped(db.session.query(
+        _sum_between(v.sale_date, v.total_sale, p['start_today'], end),
+        _sum_between(v.sale_date, v.total_sale, p['start_month'], end),
+        _sum_between(v.sale_date, v.total_sale, p['start_year'], end),
+        func.sum(v.total_sale),
+    ), v.branch_id, branch_id).one()
+
+    b = SalesB2BC
+    b2bc = _scoped(db.session.query(
+        _sum_between(b.sale_date, b.price, p['start_today'], end),
+        _sum_between(b.sale_date, b.price, p['start_month'], end),
+        _sum_between(b.sale_date, b.price, p['start_year'], end),
+        func.sum(b.price),
+        _sum_between(b.sale_date, b.commission_amount, p['start_month'], end),
+        func.sum(b.commission_amount),
+    ), b.branch_id, branch_id).one()
+
+    voucher = [x or 0 for x in voucher]
+    b2bc = [x or 0 for x in b2bc]
+
+    gross_revenue = voucher[3] + b2bc[3]
+    total_commission = b2bc[5]
+    return {
+        'total_revenue_today': voucher[0] + b2bc[0],
+        'total_revenue_month': voucher[1] + b2bc[1],
+        'total_revenue_year': voucher[2] + b2bc[2],
+        'commission_month': b2bc[4],
+        'gross_revenue': gross_revenue,
+        'total_commission': total_commission,
+        'net_revenue': gross_revenue - total_commission,
+    }
+
+
+def booking_kpis(branch_id=ALL_BRANCHES, today=None):
+    """Bookings today / this week and the utilization rate against capacity."""
+    p = period_bounds(today)
+    counts = _scoped(db.session.query(
+        _count_between(Booking.booking_date, p['today'], p['today'] + timedelta(days=1)),
+        _count_between(Booking.booking_date, p['start_week']),
+    ), Booking.branch_id, branch_id).one()
+    bookings_today, bookings_week = [x or 0 for x in counts]
+
+    capacity = _scoped(db.session.query(func.sum(Branch.capacity)),
+                       Branch.id, branch_id).scalar() or 0
+    utilization_rate = (bookings_today / capacity) * 100 if capacity > 0 else 0
+
+    return {
+        'bookings_today': bookings_today,
+        'bookings_week': bookings_week,
+        'utilization_rate': utilization_rate,
+    }
+
+
+# --------------------------------------------------------------------------------
+# Breakdowns & rankings
+# --------------------------------------------------------------------------------
+def sales_breakdown(branch_id=ALL_BRANCHES):
+    """Number of voucher vs. group sales."""
+    q = db.session.query(SalesVoucherGroup.sale_type, func.count(SalesVoucherGroup.id))
+    return _scoped(q, SalesVoucherGroup.branch_id, branch_id)\
+        .group_by(SalesVoucherGroup.sale_type).all()
+
+
+def top_products(branch_id=ALL_BRANCHES, limit=5):
+    """Best selling products by number of sales."""
+    count = func.count(SalesVoucherGroup.id)
+    q = db.session.query(SalesVoucherGroup.product_name, count.label('count'))
+    return _scoped(q, SalesVoucherGroup.branch_id, branch_id)\
+        .group_by(SalesVoucherGroup.product_name)\
+        .order_by(count.desc()).limit(limit).all()
+
+
+def top_partners(branch_id=ALL_BRANCHES, limit=5):
+    """Partners bringing in the most voucher/group revenue."""
+    total = func.sum(SalesVoucherGroup.total_sale)
+    q = db.session.query(SalesVoucherGroup.partner_name, total.label('total'))
+    return _scoped(q, SalesVoucherGroup.branch_id, branch_id)\
+        .group_by(SalesVoucherGroup.partner_name)\
+        .order_by(total.desc()).limit(limit).all()
+
+
+# --------------------------------------------------------------------------------
+# Trends (last 30 days)
+# --------------------------------------------------------------------------------
+def sales_trend(branch_id=ALL_BRANCHES, today=None):
+    """Daily voucher + B2BC revenue over the last 30 days, sorted by date."""
+    start = datetime.combine(period_bounds(today)['last_30_days'], datetime.min.time())
+
+    vday = func.date(SalesVoucherGroup.sale_date)
+    vtrend = _scoped(db.session.query(vday.label('d'), func.sum(SalesVoucherGroup.total_sale).label('amt')),
+                     SalesVoucherGroup.branch_id, branch_id)\
+        .filter(SalesVoucherGroup.sale_date >= start).group_by(vday).all()
+
+    bday = func.date(SalesB2BC.sale_date)
+    btrend = _scoped(db.session.query(bday.label('d'), func.sum(SalesB2BC.price).label('amt')),
+                     SalesB2BC.branch_id, branch_id)\
+        .filter(SalesB2BC.sale_date >= start).group_by(bday).all()
+
+    trend_dict = {}
+    for row in list(vtrend) + list(btrend):
+        trend_dict[row.d] = trend_dict.get(row.d, 0) + (row.amt or 0)
+    return sorted(trend_dict.items(), key=lambda x: x[0])
+
+
+def upcoming_bookings(branch_id=ALL_BRANCHES, today=None):
+    """
+    Bookings from today onward, in date/slot order. Returned as plain dicts
+    so the result can be cached and serialized independently of the session.
+    """
+    today = today or datetime.utcnow().date()
+    rows = _scoped(db.session.query(Booking.id, Booking.voucher_group_sale_id, Booking.booking_name,
+                                    Booking.booking_date, Booking.time_slot, Booking.status,
+                                    Booking.actual_quantity, Booking.branch_id),
+                   Booking.branch_id, branch_id)\
+        .filter(Booking.booking_date >= today)\
+        .order_by(Booking.booking_date, Booking.time_slot).all()
+    return [row._asdict() for row in rows]
+
+
+# --------------------------------------------------------------------------------
+# Branch comparisons
+# --------------------------------------------------------------------------------
+def branch_comparison(branch_id=ALL_BRANCHES):
+    """Revenue (voucher + B2BC) and booking count per branch name."""
+    br_voucher = _scoped(db.session.query(Branch.name, func.sum(SalesVoucherGroup.total_sale))
+                         .join(SalesVoucherGroup, SalesVoucherGroup.branch_id == Branch.id),
+                         Branch.id, branch_id).group_by(Branch.name).all()
+    br_b2bc = _scoped(db.session.query(Branch.name, func.sum(SalesB2BC.price))
+                      .join(SalesB2BC, SalesB2BC.branch_id == Branch.id),
+                      Branch.id, branch_id).group_by(Branch.name).all()
+    br_bookings = _scoped(db.session.query(Branch.name, func.count(Booking.id))
+                          .join(Booking, Booking.branch_id == Branch.id),
+                          Branch.id, branch_id).group_by(Branch.name).all()
+
+    merged = {}
+    for name, revenue in list(br_voucher) + list(br_b2bc):
+        merged[name] = merged.get(name, 0) + (revenue or 0)
+
+    return {
+        'branch_revenue': [(bn, merged[bn]) for bn in sorted(merged.keys())],
+        'branch_bookings': [(row[0], row[1]) for row in br_bookings],
+    }
+
+
+# --------------------------------------------------------------------------------
+# Rollup-backed variants (see utils/rollups.py)
+# --------------------------------------------------------------------------------
+def revenue_kpis_from_rollups(branch_id=ALL_BRANCHES, today=None):
+    """Same result as revenue_kpis(), read from daily_sales_rollup."""
+    p = period_bounds(today)
+    r = DailySalesRollup
+    revenue = r.voucher_revenue + r.b2bc_revenue
+    tomorrow = p['today'] + timedelta(days=1)
+    row = _scoped_rollup(db.session.query(
+        _sum_between(r.day, revenue, p['today'], tomorrow),
+        _sum_between(r.day, revenue, p['start_month'].date(), tomorrow),
+        _sum_between(r.day, revenue, p['start_year'].date(), tomorrow),
+        func.sum(revenue),
+        _sum_between(r.day, r.commission, p['start_month'].date(), tomorrow),
+        func.sum(r.commission),
+    ), r.branch_id, branch_id).one()
+    row = [x or 0 for x in row]
+
+    return {
+        'total_revenue_today': row[0],
+        'total_revenue_month': row[1],
+        'total_revenue_year': row[2],
+        'commission_month': row[4],
+        'gross_revenue': row[3],
+        'total_commission': row[5],
+        'net_revenue': row[3] - row[5],
+    }
+
+
+def booking_kpis_from_rollups(branch_id=ALL_BRANCHES, today=None):
+    """Same result as booking_kpis(), read from daily_booking_rollup."""
+    p = period_bounds(today)
+    r = DailyBookingRollup
+    counts = _scoped_rollup(db.session.query(
+        func.sum(case((r.day == p['today'], r.booking_count), else_=0)),
+        func.sum(case((r.day >= p['start_week'], r.booking_count), else_=0)),
+    ), r.branch_id, branch_id).one()
+    bookings_today, bookings_week = [x or 0 for x in counts]
+
+    capacity = _scoped(db.session.query(func.sum(Branch.capacity)),
+                       Branch.id, branch_id).scalar() or 0
+    utilization_rate = (bookings_today / capacity) * 100 if capacity > 0 else 0
+
+    return {
+        'bookings_today': bookings_today,
+        'bookings_week': bookings_week,
+        'utilization_rate': utilization_rate,
+    }
+
+
+def sales_breakdown_from_rollups(branch_id=ALL_BRANCHES):
+    """Same result as sales_breakdown(), read from daily_sales_rollup."""
+    r = DailySalesRollup
+    q = db.session.query(r.sale_type, func.sum(r.sale_count)).filter(r.sale_type != 'b2bc')
+    return _scoped_rollup(q, r.branch_id, branch_id).group_by(r.sale_type).all()
+
+
+def top_products_from_rollups(branch_id=ALL_BRANCHES, limit=5):
+    """Same result as top_products(), read from daily_sales_rollup."""
+    r = DailySalesRollup
+    count = func.sum(r.sale_count)
+    product = func.nullif(r.product_name, '')
+    q = db.session.query(product, count.label('count')).filter(r.sale_type != 'b2bc')
+    return _scoped_rollup(q, r.branch_id, branch_id)\
+        .group_by(product).order_by(count.desc()).limit(limit).all()
+
+
+def sales_trend_from_rollups(branch_id=ALL_BRANCHES, today=None):
+    """Same result as sales_trend(), read from daily_sales_rollup."""
+    r = DailySalesRollup
+    start = period_bounds(today)['last_30_days']
+    rows = _scoped_rollup(db.session.query(r.day, func.sum(r.voucher_revenue + r.b2bc_revenue)),
+                          r.branch_id, branch_id)\
+        .filter(r.day >= start).group_by(r.day).order_by(r.day).all()
+    return [(str(day), amount or 0) for day, amount in rows]
+
+
+def branch_comparison_from_rollups(branch_id=ALL_BRANCHES):
+    """Same result as branch_comparison(), read from both rollup tables."""
+    s, b = DailySalesRollup, DailyBookingRollup
+    revenue = _scoped(db.session.query(Branch.name, func.sum(s.voucher_revenue + s.b2bc_revenue))
+                      .join(s, s.branch_id == Branch.id),
+                      Branch.id, branch_id).group_by(Branch.name).order_by(Branch.name).all()
+    bookings = _scoped(db.session.query(Branch.name, func.sum(b.booking_count))
+                       .join(b, b.branch_id == Branch.id),
+                       Branch.id, branch_id).group_by(Branch.name).all()
+    return {
+        'branch_revenue': [(name, total or 0) for name, total in revenue],
+        'branch_bookings': [(name, count) for name, count in bookings],
+    }
+
+
+def run_sections(sections, max_workers=1, timings=None):
+    """
+    Run independent zero-argument callables and return {name: result}.
+
+    With max_workers > 1 they run on a thread pool bounded by max_workers,
+    each inside its own app context and therefore with its own session and
+    pooled connection. The elapsed milliseconds of every section are written
+    into `timings` when a dict is given.
+    """
+    timings = timings if timings is not None else {}
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            timings[name] = (time.perf_counter() - start) * 1000
+
+    if max_workers <= 1 or len(sections) <= 1:
+        return {name: timed(name, fn) for name, fn in sections.items()}
+
+    app = current_app._get_current_object()
+
+    def task(name, fn):
+        with app.app_context():
+            return timed(name, fn)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sections))) as pool:
+        # Each task runs in a copy of this context, so per-request instrumentation sees its queries
+        futures = {name: pool.submit(contextvars.copy_context().run, task, name, fn)
+                   for name, fn in sections.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# --------------------------------------------------------------------------------
+# JSON widgets (served by /dashboard/api/<widget>)
+# --------------------------------------------------------------------------------
+def _chart(rows):
+    """Turn (label, value) rows into Chart.js-friendly labels/data lists."""
+    return {
+        'labels': [str(label) if label is not None else '' for label, _ in rows],
+        'data': [value or 0 for _, value in rows],
+    }
+
+
+def _kpis_widget(branch_id, today, use_rollups):
+    if use_rollups:
+        data = revenue_kpis_from_rollups(branch_id, today)
+        data.update(booking_kpis_from_rollups(branch_id, today))
+    else:
+        data = revenue_kpis(branch_id, today)
+        data.update(booking_kpis(branch_id, today))
+    return data
+
+
+def _chart_widget(raw, rolled=None, dated=False):
+    """Build a chart widget from a raw query function and its rollup variant."""
+    def widget(branch_id, today, use_rollups):
+        fn = rolled if (use_rollups and rolled) else raw
+        rows = fn(branch_id, today) if dated else fn(branch_id)
+        return _chart(rows)
+    return widget
+
+
+def _branch_widget(field):
+    def widget(branch_id, today, use_rollups):
+        compare = branch_comparison_from_rollups if use_rollups else branch_comparison
+        return _chart(compare(branch_id)[field])
+    return widget
+
+
+WIDGETS = {
+    'kpis': _kpis_widget,
+    'sales_breakdown': _chart_widget(sales_breakdown, sales_breakdown_from_rollups),
+    'sales_trend': _chart_widget(sales_trend, sales_trend_from_rollups, dated=True),
+    'top_products': _chart_widget(top_products, top_products_from_rollups),
+    'top_partners': _chart_widget(top_partners),
+    'branch_revenue': _branch_widget('branch_revenue'),
+    'branch_bookings': _branch_widget('branch_bookings'),
+}
+
+
+def compute_widget(name, branch_id=ALL_BRANCHES, today=None, use_rollups=False):
+    """Compute the JSON payload of a single dashboard widget."""
+    today = today or datetime.utcnow().date()
+    return WIDGETS[name](branch_id, today, use_rollups)
+
+
+def compute_widgets(names, branch_id=ALL_BRANCHES, today=None, use_rollups=False,
+                    max_workers=1, timings=None):
+    """Compute several widgets, concurrently when max_workers > 1."""
+    today = today or datetime.utcnow().date()
+    sections = {name: partial(compute_widget, name, branch_id, today, use_rollups) for name in names}
+    return run_sections(sections, max_workers, timings)
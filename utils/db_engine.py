@@ -0,0 +1,119 @@
+# utils/db_engine.py
+"""
+Per-backend database engine profiles and retries on lock errors.
+
+init_db_engine(app) runs before db.init_app() and fills
+SQLALCHEMY_ENGINE_OPTIONS for the configured backend:
+
+- SQLite: the SQLITE_PRAGMAS are applied to every new connection. WAL lets
+  readers run while one writer commits, busy_timeout makes a writer wait for
+  the lock instead of failing with "database is locked" at once, and
+  synchronous=NORMAL is durable enough under WAL at a fraction of the fsyncs.
+- PostgreSQL: pool size, overflow, recycling and pre-ping, and server-side
+  statement and lock timeouts sent as connect-time options, so a runaway
+  query or a lock wait is cancelled by the server.
+
+Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS win over the profile.
+
+Even so a write can lose a lock race (SQLite's single writer, PostgreSQL
+deadlocks and lock timeouts). retry_on_lock() reruns such a write transaction
+a few times after a rollback, with a jittered backoff.
+"""
+import random
+import sqlite3
+import time
+from functools import wraps
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError, DBAPIError
+from models import db
+
+# Set by init_db_engine(); applied to each new SQLite connection
+_sqlite_pragmas = {}
+
+# SQLSTATEs of lock failures worth retrying: deadlock, serialization failure, lock_timeout
+RETRYABLE_SQLSTATES = ('40P01', '40001', '55P03')
+
+
+def postgres_options(config):
+    options = {
+        'pool_size': config.get('POSTGRES_POOL_SIZE', 5),
+        'max_overflow': config.get('POSTGRES_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('POSTGRES_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('POSTGRES_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('POSTGRES_POOL_PRE_PING', True),
+    }
+    settings = {'statement_timeout': config.get('POSTGRES_STATEMENT_TIMEOUT_MS'),
+                'lock_timeout': config.get('POSTGRES_LOCK_TIMEOUT_MS')}
+    server_options = ' '.join(f'-c {name}={value}' for name, value in settings.items() if value)
+    if server_options:
+        options['connect_args'] = {'options': server_options}
+    return options
+
+
+def engine_options(config):
+    """The engine options profile for the configured database URI."""
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend == 'postgresql':
+        return postgres_options(config)
+    return {}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not _sqlite_pragmas or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in _sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def init_db_engine(app):
+    """Merge the backend profile into SQLALCHEMY_ENGINE_OPTIONS; call before db.init_app(app)."""
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    _sqlite_pragmas.clear()
+    _sqlite_pragmas.update(app.config.get('SQLITE_PRAGMAS') or {})
+    if not event.contains(Engine, 'connect', _apply_sqlite_pragmas):
+        event.listen(Engine, 'connect', _apply_sqlite_pragmas)
+
+
+# --------------------------------------------------------------------------------
+# Retries
+# --------------------------------------------------------------------------------
+def is_lock_error(exc):
+    """True for errors that a rerun of the same transaction may not hit again."""
+    if not isinstance(exc, DBAPIError):
+        return False
+    if isinstance(exc, OperationalError) and 'database is locked' in str(exc.orig):
+        return True
+    return getattr(exc.orig, 'pgcode', None) in RETRYABLE_SQLSTATES
+
+
+def retry_on_lock(f):
+    """Rerun a write transaction after a lock error, up to DB_LOCK_RETRIES times.
+
+    The wrapped function must do the whole transaction, commit included, and
+    have no side effects before its commit: a failed attempt is rolled back
+    and the function called again from the start.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        config = current_app.config if has_app_context() else {}
+        retries = config.get('DB_LOCK_RETRIES', 3)
+        delay = config.get('DB_LOCK_RETRY_DELAY_MS', 50) / 1000
+        for attempt in range(retries + 1):
+            try:
+                return f(*args, **kwargs)
+            except DBAPIError as e:
+                if attempt == retries or not is_lock_error(e):
+                    raise
+                db.session.rollback()
+                if has_app_context():
+                    current_app.logger.warning(f"{f.__name__}: lock error, retry {attempt + 1} of {retries}")
+                time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+    return decorated_function
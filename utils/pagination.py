@@ -0,0 +1,129 @@
+# utils/pagination.py
+"""
+Keyset (seek) pagination helpers.
+
+Instead of OFFSET, a page is selected with a WHERE clause on the ordering
+columns relative to the last/first row of the previous page, so every page
+costs the same regardless of how deep the user navigates. Cursors are the
+ordering values of a boundary row, encoded as an opaque url-safe string.
+"""
+import base64
+import json
+from datetime import date, datetime
+from flask import current_app, request
+from sqlalchemy import and_, or_
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None, page_size=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the list of values in a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return [_decode_value(v) for v in json.loads(raw)]
+    except (ValueError, TypeError):
+        return None
+
+
+def _seek_clause(columns, values, descending):
+    """(c1, c2, ...) < (v1, v2, ...) (or >), expanded for portability."""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+def page_size_arg(default=None):
+    """Read ?per_page= bounded by the LIST_MAX_PAGE_SIZE config."""
+    default = default or current_app.config.get('LIST_PAGE_SIZE', 50)
+    maximum = current_app.config.get('LIST_MAX_PAGE_SIZE', 500)
+    size = request.args.get('per_page', default, type=int)
+    return max(1, min(size or default, maximum))
+
+
+def paginate_keyset(query, columns, cursor=None, direction='next', page_size=50, descending=True,
+                    row_key=None):
+    """
+    Return one KeysetPage of `query` ordered by `columns` (which must end
+    with a unique column such as the primary key).
+
+    `cursor` is the next_cursor/prev_cursor of the page the user came from
+    and `direction` is 'next' or 'prev' accordingly. When `columns` contains
+    expressions rather than plain mapped columns, `row_key(row)` must return
+    the value of each of them for a row.
+    """
+    values = decode_cursor(cursor)
+    if values is not None and len(values) != len(columns):
+        values = None
+    backwards = values is not None and direction == 'prev'
+    # Walking backwards means scanning in the opposite order, then flipping
+    scan_descending = descending != backwards
+
+    if values is not None:
+        query = query.filter(_seek_clause(columns, values, scan_descending))
+    order = [c.desc() if scan_descending else c.asc() for c in columns]
+    rows = query.order_by(*order).limit(page_size + 1).all()
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    def key(row):
+        if row_key is not None:
+            return encode_cursor(row_key(row))
+        return encode_cursor([getattr(row, c.key) for c in columns])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backwards:
+            next_cursor = key(rows[-1])
+        if values is not None and (not backwards or more):
+            prev_cursor = key(rows[0])
+    return KeysetPage(rows, next_cursor, prev_cursor, page_size)
@@ -0,0 +1,232 @@
+# utils/pricing.py
+"""
+Product pricing from the pricing_tiers table.
+
+A tier gives the unit price for quantities up to its max_quantity. The
+first tier whose max_quantity is >= the quantity applies, and quantities
+above the largest tier get the largest tier's price. Products without tiers
+sell at their default_price.
+
+The tiers of every product are compiled into sorted threshold/price tuples,
+so pricing a line is one bisect. The compiled PriceList is cached per process
+behind the 'pricing' version counter (see utils/reference_data.py), which
+any commit that writes a Product or PricingTier bumps.
+
+reprice_voucher_group_sales() applies the current tiers to existing sales
+in chunked bulk UPDATEs and keeps daily_sales_rollup and the dashboard cache
+in step.
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import update
+from models import db, Product, PricingTier, SalesVoucherGroup
+from utils.reference_data import VersionedCache, watch
+from utils.rollups import adjust_sales_rollups, SALES_MEASURES
+from utils.dashboard_cache import invalidate_branches
+
+VERSION_NAME = 'pricing'
+
+VAT_RATE = 0.07
+
+# Sales per SELECT / bulk UPDATE when repricing
+REPRICE_CHUNK_SIZE = 1000
+
+
+# --------------------------------------------------------------------------------
+# Compiled price list
+# --------------------------------------------------------------------------------
+class PriceList:
+    """An immutable snapshot of the products and their tiers at one version."""
+
+    def __init__(self, version, products, tiers):
+        self.version = version
+        self.products_by_id = {p.id: p for p in products}
+        self.products_by_name = {p.name: p for p in products}
+        grouped = {}
+        for tier in tiers:  # ordered by product_id, max_quantity
+            grouped.setdefault(tier.product_id, []).append(tier)
+        # product_id -> ((max_quantity, ...), (unit_price, ...))
+        self.tiers = {product_id: (tuple(t.max_quantity for t in rows), tuple(t.unit_price for t in rows))
+                      for product_id, rows in grouped.items()}
+
+    def tier_price(self, product_id, quantity):
+        """Unit price from the product's tiers, or None when it has none."""
+        compiled = self.tiers.get(product_id)
+        if compiled is None:
+            return None
+        thresholds, prices = compiled
+        return prices[min(bisect_left(thresholds, quantity), len(prices) - 1)]
+
+    def tier_price_by_name(self, product_name, quantity):
+        product = self.products_by_name.get(product_name)
+        return self.tier_price(product.id, quantity) if product is not None else None
+
+    def unit_price(self, product_id, quantity):
+        price = self.tier_price(product_id, quantity)
+        return price if price is not None else self.products_by_id[product_id].default_price or 0
+
+    def quote_line(self, product_id, quantity):
+        """Price one (product, quantity) line the way a sale stores it."""
+        unit_price = self.unit_price(product_id, quantity)
+        total_price = quantity * unit_price
+        vat_7 = total_price * VAT_RATE
+        return {
+            'product_id': product_id,
+            'product': self.products_by_id[product_id].name,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'tiered': product_id in self.tiers,
+            'total_price': total_price,
+            'vat_7': vat_7,
+            'total_sale': total_price + vat_7,
+        }
+
+    def quote(self, lines):
+        """Price many (product_id, quantity) lines; returns the lines and their totals."""
+        priced = [self.quote_line(product_id, quantity) for product_id, quantity in lines]
+        totals = {name: sum(line[name] for line in priced) for name in ('total_price', 'vat_7', 'total_sale')}
+        return {'lines': priced, 'totals': totals, 'version': self.version}
+
+
+def _load(version):
+    products = db.session.query(Product.id, Product.name, Product.category, Product.default_price).all()
+    tiers = db.session.query(PricingTier.product_id, PricingTier.max_quantity, PricingTier.unit_price)\
+        .order_by(PricingTier.product_id, PricingTier.max_quantity).all()
+    return PriceList(version, products, tiers)
+
+
+price_cache = VersionedCache(VERSION_NAME, _load)
+watch((Product, PricingTier), price_cache)
+
+
+def price_list():
+    """The current PriceList."""
+    return price_cache.get()
+
+
+def parse_tiers(text):
+    """
+    Parse 'max quantity:unit price' pairs separated by commas or newlines,
+    e.g. '10:900, 20:800'. Returns [(max_quantity, unit_price)] sorted by
+    quantity; raises ValueError on malformed or duplicate entries.
+    """
+    tiers = {}
+    for part in (text or '').replace('\n', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            max_quantity, unit_price = (value.strip() for value in part.split(':'))
+            max_quantity, unit_price = int(max_quantity), float(unit_price)
+        except ValueError:
+            raise ValueError(f"'{part}' is not a 'max quantity:unit price' pair.")
+        if max_quantity <= 0 or unit_price < 0:
+            raise ValueError(f"'{part}': quantity must be positive and price not negative.")
+        if max_quantity in tiers:
+            raise ValueError(f"Quantity {max_quantity} is listed twice.")
+        tiers[max_quantity] = unit_price
+    return sorted(tiers.items())
+
+
+def format_tiers(tiers):
+    return ', '.join(f"{t.max_quantity}:{t.unit_price:g}" for t in tiers)
+
+
+# --------------------------------------------------------------------------------
+# Bulk repricing
+# --------------------------------------------------------------------------------
+def reprice_voucher_group_sales(date_from=None, date_to=None, statuses=('waiting',),
+                                chunk_size=REPRICE_CHUNK_SIZE, dry_run=False):
+    """
+    Recompute price_per_unit and the totals of the sales of tiered products
+    dated within [date_from, date_to] (either bound optional) whose status is
+    in `statuses` (all statuses when empty).
+
+    Sales are read in id order, chunk_size at a time. Only rows whose values
+    change are written, with one executemany UPDATE per chunk; the matching
+    daily_sales_rollup revenue deltas are applied and the chunk committed.
+    Returns a report dict.
+    """
+    prices = price_list()
+    report = {'rows': 0, 'changed': 0, 'revenue_delta': 0.0}
+    tiered_names = [p.name for p in prices.products_by_id.values() if p.id in prices.tiers]
+    if not tiered_names:
+        return report
+    filters = [SalesVoucherGroup.product_name.in_(tiered_names)]
+    if statuses:
+        filters.append(SalesVoucherGroup.status.in_(statuses))
+    if date_from is not None:
+        filters.append(SalesVoucherGroup.sale_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        filters.append(SalesVoucherGroup.sale_date <
+                       datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    revenue = SALES_MEASURES.index('voucher_revenue')
+    last_id = 0
+    while True:
+        rows = db.session.query(SalesVoucherGroup.id, SalesVoucherGroup.product_name,
+                                SalesVoucherGroup.quantity, SalesVoucherGroup.price_per_unit,
+                                SalesVoucherGroup.total_sale, SalesVoucherGroup.branch_id,
+                                SalesVoucherGroup.sale_date, SalesVoucherGroup.sale_type)\
+            .filter(SalesVoucherGroup.id > last_id, *filters)\
+            .order_by(SalesVoucherGroup.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        report['rows'] += len(rows)
+
+        changes, deltas = [], {}
+        for row in rows:
+            product = prices.products_by_name[row.product_name]
+            line = prices.quote_line(product.id, row.quantity or 0)
+            old_total = row.total_sale or 0
+            if line['unit_price'] == row.price_per_unit and abs(line['total_sale'] - old_total) < 1e-9:
+                continue
+            changes.append({'id': row.id, 'price_per_unit': line['unit_price'],
+                            'total_price': line['total_price'], 'vat_7': line['vat_7'],
+                            'total_sale': line['total_sale']})
+            if line['total_sale'] != old_total:
+                day = row.sale_date.date() if isinstance(row.sale_date, datetime) else row.sale_date
+                measures = deltas.setdefault((row.branch_id, day, row.sale_type, row.product_name),
+                                             [0] * len(SALES_MEASURES))
+                measures[revenue] += line['total_sale'] - old_total
+                report['revenue_delta'] += line['total_sale'] - old_total
+        report['changed'] += len(changes)
+        if dry_run or not changes:
+            db.session.rollback()
+            continue
+        db.session.execute(update(SalesVoucherGroup), changes)
+        adjust_sales_rollups(db.session.connection(), deltas)
+        db.session.commit()
+        # The bulk UPDATE did not go through the dashboard cache's flush hook
+        invalidate_branches({key[0] for key in deltas})
+    return report
+
+
+# --------------------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------------------
+pricing_cli = AppGroup('pricing', help='Apply the product pricing tiers.')
+
+@pricing_cli.command('reprice')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), help='First sale date (inclusive).')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), help='Last sale date (inclusive).')
+@click.option('--status', 'statuses', multiple=True, default=('waiting',), show_default=True,
+              help='Sale status to reprice; repeat for several.')
+@click.option('--all-statuses', is_flag=True, help='Reprice sales of every status.')
+@click.option('--chunk-size', default=REPRICE_CHUNK_SIZE, show_default=True, help='Sales per bulk UPDATE.')
+@click.option('--dry-run', is_flag=True, help='Report what would change without writing.')
+def reprice_command(date_from, date_to, statuses, all_statuses, chunk_size, dry_run):
+    """Reprice sales of tiered products from the current tiers."""
+    report = reprice_voucher_group_sales(date_from.date() if date_from else None,
+                                         date_to.date() if date_to else None,
+                                         () if all_statuses else statuses, chunk_size, dry_run)
+    verb = 'would change' if dry_run else 'changed'
+    click.echo(f"{report['rows']} sales checked, {report['changed']} {verb}, "
+               f"revenue {verb} by {report['revenue_delta']:+.2f}.")
+
+
+def init_pricing(app):
+    """Register the `flask pricing` command group."""
+    app.cli.add_command(pricing_cli)
@@ -0,0 +1,241 @@
+# utils/reference_data.py
+"""
+In-process cache of the product catalog and the branch list, used for form
+choices and id/name lookups.
+
+Every commit that inserts, updates or deletes a Product or Branch bumps the
+'catalog' row of reference_data_version in the same transaction. Commits made
+in this process drop the snapshot right away. Changes made by other worker
+processes are noticed by comparing the version counter, which is read at
+most once every REFERENCE_DATA_CHECK_INTERVAL seconds. Rendering a form
+between checks therefore runs no catalog query.
+
+Entries are plain rows (id, name, ...), not ORM objects, so they can be
+shared between requests and threads. Other rarely-changing tables can use
+the same mechanism: wrap their loader in a VersionedCache under their own
+version name and watch() their models (see utils/commission.py). Key/value
+caches (TTLCache) get the same cross-process check from a CacheVersion.
+"""
+import threading
+import time
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import db, Product, Branch, ReferenceDataVersion
+
+VERSION_NAME = 'catalog'
+# Version bumped by bulk writes to sales and bookings (see bump_bulk_writes())
+BULK_WRITES = 'bulk_writes'
+
+
+class ReferenceData:
+    """An immutable snapshot of the catalog at one version."""
+
+    def __init__(self, version, products, branches):
+        self.version = version
+        self.products = products  # ordered by name
+        self.products_by_id = {p.id: p for p in products}
+        self.products_by_name = {p.name: p for p in products}
+        self.branches = branches  # ordered by id
+        self.branches_by_id = {b.id: b for b in branches}
+        self.branches_by_name = {b.name: b for b in branches}
+
+    def product_choices(self):
+        return [(p.id, p.name) for p in self.products]
+
+    def branch_choices(self):
+        return [(b.id, b.name) for b in self.branches]
+
+    def branches_sorted_by_name(self):
+        return sorted(self.branches, key=lambda b: b.name)
+
+
+def _current_version(name):
+    table = ReferenceDataVersion.__table__
+    return db.session.execute(select(table.c.version).where(table.c.name == name)).scalar() or 0
+
+
+def _load(version):
+    products = db.session.query(Product.id, Product.name, Product.category,
+                                Product.default_price, Product.description).order_by(Product.name).all()
+    branches = db.session.query(Branch.id, Branch.name, Branch.location,
+                                Branch.capacity).order_by(Branch.id).all()
+    return ReferenceData(version, products, branches)
+
+
+class VersionedCache:
+    """
+    Holds the result of loader(version) and reloads it when the named version
+    counter has moved, checking the counter at most every check_interval seconds.
+    """
+
+    def __init__(self, version_name, loader, check_interval=5):
+        self.version_name = version_name
+        self.loader = loader
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.version_checks = 0
+        self.refreshes = 0
+        self.invalidations = 0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            version = _current_version(self.version_name)
+            self.version_checks += 1
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self.loader(version)
+                self.refreshes += 1
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self.invalidations += 1
+
+    def stats(self):
+        return {
+            'version': self._snapshot.version if self._snapshot is not None else None,
+            'check_interval': self.check_interval,
+            'hits': self.hits,
+            'version_checks': self.version_checks,
+            'refreshes': self.refreshes,
+            'invalidations': self.invalidations,
+        }
+
+
+class CacheVersion:
+    """
+    Shared version counter of a per-process TTLCache whose entries can be made
+    stale by other processes. check() clears the cache when the counter has
+    moved, reading it at most every check_interval seconds; call it before
+    reading the cache.
+    """
+
+    def __init__(self, version_name, cache, check_interval=5):
+        self.version_name = version_name
+        self.cache = cache
+        self.check_interval = check_interval
+        self._seen = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.version_checks = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        _cache_versions.append(self)
+
+    def check(self):
+        if self._seen is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            version = _current_version(self.version_name)
+            self.version_checks += 1
+            if self._seen is not None and version != self._seen:
+                self.cache.clear()
+                self.refreshes += 1
+            self._seen = version
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Clear the cache after a write of this process; the next check() reads the counter again."""
+        with self._lock:
+            self.cache.clear()
+            self._seen = None
+            self.invalidations += 1
+
+    def stats(self):
+        return {
+            'version': self._seen,
+            'check_interval': self.check_interval,
+            'version_checks': self.version_checks,
+            'refreshes': self.refreshes,
+            'invalidations': self.invalidations,
+        }
+
+
+# Every CacheVersion, by construction order
+_cache_versions = []
+
+reference_cache = VersionedCache(VERSION_NAME, _load)
+
+
+def reference_data():
+    """The current ReferenceData snapshot."""
+    return reference_cache.get()
+
+
+# --------------------------------------------------------------------------------
+# Version bump & invalidation
+# --------------------------------------------------------------------------------
+# (models, VersionedCache) pairs: writing any of the models bumps the cache's version
+_watched = []
+
+
+def watch(models, cache):
+    """Bump cache.version_name on every commit that writes one of `models`."""
+    _watched.append((tuple(models), cache))
+
+
+def bump_version(connection, name):
+    table = ReferenceDataVersion.__table__
+    result = connection.execute(table.update().where(table.c.name == name)
+                                .values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(name=name, version=1))
+
+
+def bump_bulk_writes(session):
+    """
+    For writes that bypass the flush hooks (Core bulk inserts/updates, rollup
+    rebuilds), inside their transaction: every cache registered under
+    BULK_WRITES is cleared, in this process right after the commit and in the
+    others at their next version check.
+    """
+    bumped = session.info.setdefault('reference_data_bumped', set())
+    caches = [cache for cache in _cache_versions if cache.version_name == BULK_WRITES]
+    if not caches or not bumped.issuperset(caches):
+        bump_version(session.connection(), BULK_WRITES)
+        bumped.update(caches)
+
+
+def after_flush(session, flush_context):
+    bumped = session.info.setdefault('reference_data_bumped', set())
+    pending = [(models, cache) for models, cache in _watched if cache not in bumped]
+    if not pending:
+        return
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    for models, cache in pending:
+        if any(isinstance(obj, models) for obj in objects):
+            # Once per transaction is enough for other processes to notice
+            bump_version(session.connection(), cache.version_name)
+            bumped.add(cache)
+
+
+def after_commit(session):
+    for cache in session.info.pop('reference_data_bumped', ()):
+        cache.invalidate()
+
+
+def after_soft_rollback(session, previous_transaction):
+    session.info.pop('reference_data_bumped', None)
+
+
+watch((Product, Branch), reference_cache)
+
+
+def init_reference_data(app):
+    """Configure the version check interval and register the hooks."""
+    interval = app.config.get('REFERENCE_DATA_CHECK_INTERVAL')
+    if interval is not None:
+        for cache in [cache for _, cache in _watched] + _cache_versions:
+            cache.check_interval = interval
+    if not event.contains(Session, 'after_commit', after_commit):
+        event.listen(Session, 'after_flush', after_flush)
+        event.listen(Session, 'after_commit', after_commit)
+        event.listen(Session, 'after_soft_rollback', after_soft_rollback)
@@ -0,0 +1,150 @@
+# utils/request_timing.py
+"""
+Per-request performance instrumentation.
+
+For every request this records the number of SQL statements and the time
+spent executing them (SQLAlchemy cursor events), the time spent rendering
+templates (Flask's template signals) and the total wall time, and reports
+them in a Server-Timing header, e.g.
+
+    Server-Timing: sql;dur=4.2;desc="7 queries", render;dur=3.1, total;dur=11.8
+
+Requests issuing more than REQUEST_TIMING_QUERY_WARN statements log a
+warning naming the endpoint, which is how N+1 loops show up. With
+REQUEST_TIMING_LOG set, a JSON line per request is logged as well.
+
+The stats live in a context variable, so statements run by helper threads
+count towards the request only when the thread runs in a copy of the
+request's context (see run_sections() in utils/dashboard_stats.py).
+"""
+import json
+import threading
+import time
+from contextvars import ContextVar
+from flask import current_app, g, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_current = ContextVar('request_timing', default=None)
+
+
+class RequestTimings:
+    """Counters of one request; safe to update from several threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.render_ms = 0.0
+        self.extra = {}  # name -> ms, see add_timing()
+        self._lock = threading.Lock()
+
+    def add_query(self, ms):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_ms += ms
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self, total_ms):
+        parts = [f'sql;dur={self.sql_ms:.1f};desc="{self.sql_count} queries"',
+                 f'render;dur={self.render_ms:.1f}']
+        parts.extend(f'{name};dur={ms:.1f}' for name, ms in self.extra.items())
+        parts.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(parts)
+
+
+def current_timings():
+    """The RequestTimings of the request being handled, or None."""
+    return _current.get()
+
+
+def add_timing(name, ms):
+    """Report an extra Server-Timing metric (e.g. one dashboard section) for this request."""
+    timings = _current.get()
+    if timings is not None:
+        timings.extra[name] = ms
+
+
+# --------------------------------------------------------------------------------
+# SQLAlchemy & template hooks
+# --------------------------------------------------------------------------------
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('request_timing_started', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current.get()
+    started = conn.info.get('request_timing_started')
+    if timings is not None and started:
+        timings.add_query((time.perf_counter() - started.pop()) * 1000)
+
+def handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    started = connection.info.get('request_timing_started') if connection is not None else None
+    if _current.get() is not None and started:
+        started.pop()
+
+def _before_render(sender, template, context, **extra):
+    if _current.get() is not None:
+        g.setdefault('request_timing_render_started', []).append(time.perf_counter())
+
+def _rendered(sender, template, context, **extra):
+    timings = _current.get()
+    started = g.get('request_timing_render_started')
+    if timings is not None and started:
+        timings.render_ms += (time.perf_counter() - started.pop()) * 1000
+
+
+# --------------------------------------------------------------------------------
+# Request hooks
+# --------------------------------------------------------------------------------
+def _start_request():
+    g.request_timing_token = _current.set(RequestTimings())
+
+def _finish_request(response):
+    timings = _current.get()
+    if timings is None:
+        return response
+    total_ms = timings.total_ms()
+    response.headers['Server-Timing'] = timings.header(total_ms)
+
+    config = current_app.config
+    endpoint = request.endpoint or request.path
+    threshold = config.get('REQUEST_TIMING_QUERY_WARN') or 0
+    if threshold and timings.sql_count > threshold:
+        current_app.logger.warning(f"{endpoint} ran {timings.sql_count} SQL statements "
+                                   f"(threshold {threshold}); look for an N+1 query.")
+    if config.get('REQUEST_TIMING_LOG'):
+        current_app.logger.info(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'status': response.status_code,
+            'sql_count': timings.sql_count,
+            'sql_ms': round(timings.sql_ms, 1),
+            'render_ms': round(timings.render_ms, 1),
+            'total_ms': round(total_ms, 1),
+        }))
+    return response
+
+def _end_request(exc):
+    token = g.pop('request_timing_token', None)
+    if token is not None:
+        _current.reset(token)
+
+
+def init_request_timing(app):
+    """Register the hooks unless REQUEST_TIMING_ENABLED is off."""
+    if not app.config.get('REQUEST_TIMING_ENABLED', True):
+        return
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
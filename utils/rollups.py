@@ -0,0 +1,428 @@
+# utils/rollups.py
+"""
+Incrementally maintained daily rollups of sales and bookings.
+
+Every flush that inserts, updates or deletes a SalesVoucherGroup, SalesB2BC
+or Booking row adds the matching +/- deltas to daily_sales_rollup,
+daily_booking_rollup and slot_occupancy inside the same transaction.
+Writes that push a time slot past its branch's capacity raise
+SlotCapacityError, which aborts the flush. Bulk statements
+(query.update(), bulk inserts, raw SQL) bypass the ORM and therefore the
+hooks: run `flask rollups rebuild` afterwards or, for targeted changes,
+pass the sales deltas to adjust_sales_rollups() and new bookings to
+add_booking_rollups(). `flask rollups check`
+reports any drift.
+
+Deltas are added with INSERT ... ON CONFLICT DO UPDATE on the tables' unique
+keys, so two transactions creating the same rollup row cannot race; other
+dialects fall back to UPDATE, then INSERT under a savepoint. The key
+columns are NOT NULL for that reason: a sale or booking without a branch or
+date is counted under NO_BRANCH / NO_DAY.
+"""
+from datetime import date, datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, func, literal, and_, or_, case, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import (db, SalesVoucherGroup, SalesB2BC, Booking, Branch,
+                    DailySalesRollup, DailyBookingRollup, SlotOccupancy)
+from utils.reference_data import bump_bulk_writes
+
+# Attributes whose old value is needed to compute the delta of an update.
+TRACKED_ATTRS = {
+    SalesVoucherGroup: ('branch_id', 'sale_date', 'sale_type', 'product_name', 'total_sale'),
+    SalesB2BC: ('branch_id', 'sale_date', 'course_name', 'price', 'commission_amount'),
+    Booking: ('branch_id', 'booking_date', 'time_slot', 'status', 'actual_quantity'),
+}
+
+SALES_MEASURES = ('sale_count', 'voucher_revenue', 'b2bc_revenue', 'commission')
+BOOKING_MEASURES = ('booking_count', 'headcount')
+SLOT_MEASURES = ('booking_count', 'headcount')
+
+# Keys per statement when one flush touches many rollup rows
+APPLY_BATCH_SIZE = 200
+
+# Stored in the rollup key columns in place of a missing branch / date
+NO_BRANCH = 0
+NO_DAY = date(1900, 1, 1)
+
+
+class SlotCapacityError(Exception):
+    """A booking write would put more people in a time slot than the branch holds."""
+    def __init__(self, branch_id, day, time_slot, headcount, capacity):
+        self.branch_id = branch_id
+        self.day = day
+        self.time_slot = time_slot
+        self.headcount = headcount
+        self.capacity = capacity
+        super().__init__(f"The {time_slot} slot on {day} would hold {headcount} people, "
+                         f"over the branch capacity of {capacity}.")
+
+
+# --------------------------------------------------------------------------------
+# Contribution of a single row to the rollups
+# --------------------------------------------------------------------------------
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def _sales_contribution(obj, get):
+    """Return (key, measures) for a sale given an attribute getter."""
+    if isinstance(obj, SalesVoucherGroup):
+        key = (get('branch_id'), _day(get('sale_date')), get('sale_type'), get('product_name') or '')
+        return key, (1, get('total_sale') or 0, 0, 0)
+    key = (get('branch_id'), _day(get('sale_date')), 'b2bc', get('course_name') or '')
+    return key, (1, 0, get('price') or 0, get('commission_amount') or 0)
+
+def _booking_contribution(obj, get):
+    key = (get('branch_id'), get('booking_date'))
+    return key, (1, get('actual_quantity') or 0)
+
+def _slot_contribution(obj, get):
+    """
+    Return (key, measures) of a booking in slot_occupancy, or None when it
+    does not hold a place (no branch/date/slot yet, or canceled). A booking
+    whose actual quantity is not recorded yet holds one place.
+    """
+    if not (get('branch_id') and get('booking_date') and get('time_slot')) or get('status') == 'canceled':
+        return None
+    quantity = get('actual_quantity') or 0
+    return (get('branch_id'), get('booking_date'), get('time_slot')), (1, quantity if quantity > 0 else 1)
+
+def _current_getter(obj):
+    return lambda attr: getattr(obj, attr)
+
+def _previous_getter(obj):
+    """Getter returning the value each attribute had before this flush."""
+    state = inspect(obj)
+    def get(attr):
+        history = state.attrs[attr].history
+        if history.deleted:
+            return history.deleted[0]
+        if history.added:
+            return None
+        return getattr(obj, attr)
+    return get
+
+def _has_tracked_changes(obj):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in TRACKED_ATTRS[type(obj)])
+
+
+# --------------------------------------------------------------------------------
+# Session hooks
+# --------------------------------------------------------------------------------
+def _add(deltas, key, measures, sign):
+    current = deltas.get(key)
+    if current is None:
+        current = deltas[key] = [0] * len(measures)
+    for i, value in enumerate(measures):
+        current[i] += sign * value
+
+def _collect(obj, sign, get, sales, bookings, slots):
+    if isinstance(obj, Booking):
+        key, measures = _booking_contribution(obj, get)
+        _add(bookings, key, measures, sign)
+        slot = _slot_contribution(obj, get)
+        if slot is not None:
+            _add(slots, slot[0], slot[1], sign)
+    else:
+        key, measures = _sales_contribution(obj, get)
+        _add(sales, key, measures, sign)
+
+def before_flush(session, flush_context, instances):
+    tracked = tuple(TRACKED_ATTRS)
+    sales = session.info.setdefault('rollup_sales_deltas', {})
+    bookings = session.info.setdefault('rollup_booking_deltas', {})
+    slots = session.info.setdefault('rollup_slot_deltas', {})
+
+    # Deleting a sale deletes its bookings; do it through the ORM so that
+    # the booking rollup sees them regardless of the backend's FK handling.
+    for obj in list(session.deleted):
+        if isinstance(obj, SalesVoucherGroup):
+            for booking in obj.bookings:
+                session.delete(booking)
+
+    for obj in session.new:
+        if isinstance(obj, tracked):
+            if isinstance(obj, (SalesVoucherGroup, SalesB2BC)) and obj.sale_date is None:
+                # Same value the column default would assign, needed now for the day key.
+                obj.sale_date = datetime.utcnow()
+            _collect(obj, 1, _current_getter(obj), sales, bookings, slots)
+
+    for obj in session.dirty:
+        if isinstance(obj, tracked) and obj not in session.deleted and _has_tracked_changes(obj):
+            _collect(obj, -1, _previous_getter(obj), sales, bookings, slots)
+            _collect(obj, 1, _current_getter(obj), sales, bookings, slots)
+
+    for obj in session.deleted:
+        if isinstance(obj, tracked) and inspect(obj).has_identity:
+            _collect(obj, -1, _previous_getter(obj), sales, bookings, slots)
+
+def after_flush(session, flush_context):
+    sales = session.info.pop('rollup_sales_deltas', None)
+    bookings = session.info.pop('rollup_booking_deltas', None)
+    slots = session.info.pop('rollup_slot_deltas', None)
+    connection = session.connection()
+    if sales:
+        adjust_sales_rollups(connection, sales)
+    _apply_booking_deltas(connection, bookings, slots)
+
+def _apply_booking_deltas(connection, bookings, slots):
+    if bookings:
+        _apply(connection, DailyBookingRollup.__table__,
+               ('branch_id', 'day'), BOOKING_MEASURES, bookings)
+    if slots:
+        _apply(connection, SlotOccupancy.__table__,
+               ('branch_id', 'day', 'time_slot'), SLOT_MEASURES, slots)
+        _check_capacity(connection, [key for key, measures in slots.items() if measures[1] > 0])
+
+def after_soft_rollback(session, previous_transaction):
+    session.info.pop('rollup_sales_deltas', None)
+    session.info.pop('rollup_booking_deltas', None)
+    session.info.pop('rollup_slot_deltas', None)
+
+def _check_capacity(connection, keys):
+    """
+    Raise SlotCapacityError if a slot that just gained people is over capacity.
+    One query covers every slot of the flush. Runs after the slot rows were
+    upserted, so on PostgreSQL the row locks taken by those upserts serialise
+    concurrent bookings of the same slot.
+    """
+    if not keys:
+        return
+    table, branches = SlotOccupancy.__table__, Branch.__table__
+    key_columns = ('branch_id', 'day', 'time_slot')
+    over = connection.execute(
+        select(table.c.branch_id, table.c.day, table.c.time_slot, table.c.headcount, branches.c.capacity)
+        .join(branches, branches.c.id == table.c.branch_id)
+        .where(branches.c.capacity.isnot(None), table.c.headcount > branches.c.capacity,
+               or_(*[_key_clause(table, key_columns, key) for key in keys]))
+        .limit(1)).first()
+    if over is not None:
+        raise SlotCapacityError(*over)
+
+def _key_clause(table, key_columns, key):
+    return and_(*[table.c[name] == value for name, value in zip(key_columns, key)])
+
+def _stored_key(key):
+    """The key as stored: (branch_id, day, ...) with NULLs replaced by NO_BRANCH / NO_DAY."""
+    branch_id, day = key[0], key[1]
+    return (NO_BRANCH if branch_id is None else branch_id, NO_DAY if day is None else day) + tuple(key[2:])
+
+def _upsert(connection, table, key_columns, measure_columns):
+    """
+    INSERT of a rollup row that adds its measures to the existing row on a key
+    conflict, or None on a dialect without an upsert (see _add_rows()).
+    """
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table)
+        return insert.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={name: table.c[name] + insert.excluded[name] for name in measure_columns})
+    if dialect in ('mysql', 'mariadb'):
+        insert = mysql.insert(table)
+        return insert.on_duplicate_key_update(
+            {name: table.c[name] + insert.inserted[name] for name in measure_columns})
+    return None
+
+def _add_rows(connection, table, key_columns, measure_columns, rows):
+    """
+    Portable fallback of the upsert: add each row's measures with an UPDATE and
+    INSERT the row when none matched. An INSERT that loses the race against a
+    concurrent one for the same key is rolled back to its savepoint and
+    replayed as an UPDATE.
+    """
+    for row in rows:
+        where = _key_clause(table, key_columns, [row[name] for name in key_columns])
+        increment = table.update().where(where).values(
+            {name: table.c[name] + row[name] for name in measure_columns})
+        if connection.execute(increment).rowcount:
+            continue
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(row))
+        except IntegrityError:
+            connection.execute(increment)
+
+def _apply(connection, table, key_columns, measure_columns, deltas):
+    """
+    Add the deltas to the rollup row of each key, creating missing rows, with
+    one executemany upsert per APPLY_BATCH_SIZE keys (one UPDATE or INSERT per
+    key where the dialect has no upsert). Rows left counting nothing are deleted.
+    """
+    changes = [(_stored_key(key), measures) for key, measures in deltas.items() if any(measures)]
+    upsert = _upsert(connection, table, key_columns, measure_columns)
+    for start in range(0, len(changes), APPLY_BATCH_SIZE):
+        chunk = changes[start:start + APPLY_BATCH_SIZE]
+        rows = [dict(zip(key_columns + measure_columns, key + tuple(measures))) for key, measures in chunk]
+        if upsert is not None:
+            connection.execute(upsert, rows)
+        else:
+            _add_rows(connection, table, key_columns, measure_columns, rows)
+        drops = [_key_clause(table, key_columns, key) for key, measures in chunk if measures[0] < 0]
+        if drops:
+            connection.execute(table.delete().where(and_(or_(*drops), table.c[measure_columns[0]] <= 0)))
+
+def adjust_sales_rollups(connection, deltas):
+    """
+    Apply {(branch_id, day, sale_type, product_name): SALES_MEASURES deltas} to
+    daily_sales_rollup, for bulk statements that bypass the flush hooks.
+    """
+    _apply(connection, DailySalesRollup.__table__,
+           ('branch_id', 'day', 'sale_type', 'product_name'), SALES_MEASURES, deltas)
+
+def add_booking_rollups(connection, rows):
+    """
+    Count newly inserted bookings, given as dicts of Booking column values, in
+    daily_booking_rollup and slot_occupancy, for bulk INSERTs that bypass the
+    flush hooks. Raises SlotCapacityError like the flush would.
+    """
+    bookings, slots = {}, {}
+    for row in rows:
+        key, measures = _booking_contribution(row, row.get)
+        _add(bookings, key, measures, 1)
+        slot = _slot_contribution(row, row.get)
+        if slot is not None:
+            _add(slots, slot[0], slot[1], 1)
+    _apply_booking_deltas(connection, bookings, slots)
+
+def init_rollups(app):
+    """Register the rollup hooks and the `flask rollups` command group."""
+    if not event.contains(Session, 'before_flush', before_flush):
+        event.listen(Session, 'before_flush', before_flush)
+        event.listen(Session, 'after_flush', after_flush)
+        event.listen(Session, 'after_soft_rollback', after_soft_rollback)
+        # Make sure the pre-update value of every tracked attribute is loaded.
+        for model, attrs in TRACKED_ATTRS.items():
+            for attr in attrs:
+                event.listen(getattr(model, attr), 'set', _noop_set, active_history=True)
+    app.cli.add_command(rollups_cli)
+
+def _noop_set(target, value, oldvalue, initiator):
+    return value
+
+
+# --------------------------------------------------------------------------------
+# Rebuild & consistency check
+# --------------------------------------------------------------------------------
+def _expected_sales_query():
+    v, b = SalesVoucherGroup, SalesB2BC
+    voucher = db.session.query(
+        func.coalesce(v.branch_id, NO_BRANCH).label('branch_id'),
+        func.coalesce(func.date(v.sale_date), NO_DAY).label('day'),
+        v.sale_type.label('sale_type'),
+        func.coalesce(v.product_name, '').label('product_name'),
+        func.count(v.id).label('sale_count'),
+        func.coalesce(func.sum(v.total_sale), 0).label('voucher_revenue'),
+        literal(0.0).label('b2bc_revenue'),
+        literal(0.0).label('commission'),
+    ).group_by(v.branch_id, func.date(v.sale_date), v.sale_type, func.coalesce(v.product_name, ''))
+    b2bc = db.session.query(
+        func.coalesce(b.branch_id, NO_BRANCH),
+        func.coalesce(func.date(b.sale_date), NO_DAY),
+        literal('b2bc'),
+        func.coalesce(b.course_name, ''),
+        func.count(b.id),
+        literal(0.0),
+        func.coalesce(func.sum(b.price), 0),
+        func.coalesce(func.sum(b.commission_amount), 0),
+    ).group_by(b.branch_id, func.date(b.sale_date), func.coalesce(b.course_name, ''))
+    return voucher.union_all(b2bc)
+
+def _expected_bookings_query():
+    return db.session.query(
+        func.coalesce(Booking.branch_id, NO_BRANCH).label('branch_id'),
+        func.coalesce(Booking.booking_date, NO_DAY).label('day'),
+        func.count(Booking.id).label('booking_count'),
+        func.coalesce(func.sum(Booking.actual_quantity), 0).label('headcount'),
+    ).group_by(Booking.branch_id, Booking.booking_date)
+
+def _expected_slots_query():
+    b = Booking
+    return db.session.query(
+        b.branch_id.label('branch_id'),
+        b.booking_date.label('day'),
+        b.time_slot.label('time_slot'),
+        func.count(b.id).label('booking_count'),
+        func.sum(case((b.actual_quantity > 0, b.actual_quantity), else_=1)).label('headcount'),
+    ).filter(b.branch_id.isnot(None), b.booking_date.isnot(None),
+             b.time_slot.isnot(None), b.time_slot != '',
+             or_(b.status.is_(None), b.status != 'canceled'))\
+     .group_by(b.branch_id, b.booking_date, b.time_slot)
+
+def rebuild_rollups():
+    """Recompute the rollup tables from the raw sales and booking tables."""
+    sales_columns = ('branch_id', 'day', 'sale_type', 'product_name') + SALES_MEASURES
+    booking_columns = ('branch_id', 'day') + BOOKING_MEASURES
+    slot_columns = ('branch_id', 'day', 'time_slot') + SLOT_MEASURES
+
+    db.session.execute(DailySalesRollup.__table__.delete())
+    db.session.execute(DailyBookingRollup.__table__.delete())
+    db.session.execute(SlotOccupancy.__table__.delete())
+    db.session.execute(DailySalesRollup.__table__.insert().from_select(
+        sales_columns, _expected_sales_query().subquery().select()))
+    db.session.execute(DailyBookingRollup.__table__.insert().from_select(
+        booking_columns, _expected_bookings_query().subquery().select()))
+    db.session.execute(SlotOccupancy.__table__.insert().from_select(
+        slot_columns, _expected_slots_query().subquery().select()))
+    # Cached dashboard figures and availability were read from the old rows
+    bump_bulk_writes(db.session)
+    db.session.commit()
+
+def _normalize_day(value):
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return _day(value)
+
+def check_rollups(tolerance=0.01):
+    """
+    Compare the rollup tables with a fresh aggregation of the raw tables.
+    Returns a list of human readable mismatch descriptions (empty when consistent).
+    """
+    problems = []
+    checks = (
+        ('daily_sales_rollup', DailySalesRollup, 4, _expected_sales_query()),
+        ('daily_booking_rollup', DailyBookingRollup, 2, _expected_bookings_query()),
+        ('slot_occupancy', SlotOccupancy, 3, _expected_slots_query()),
+    )
+    for name, model, key_len, expected_query in checks:
+        expected = {}
+        for row in expected_query.all():
+            key = (row[0], _normalize_day(row[1])) + tuple(row[2:key_len])
+            expected[key] = tuple(row[key_len:])
+        actual = {}
+        columns = [c.name for c in model.__table__.columns if c.name != 'id']
+        for row in db.session.query(*[getattr(model, c) for c in columns]).all():
+            key = (row[0], _normalize_day(row[1])) + tuple(row[2:key_len])
+            actual[key] = tuple(row[key_len:])
+
+        for key in sorted(set(expected) | set(actual), key=repr):
+            want = expected.get(key, (0,) * (len(columns) - key_len))
+            got = actual.get(key, (0,) * (len(columns) - key_len))
+            if any(abs((w or 0) - (g or 0)) > tolerance for w, g in zip(want, got)):
+                problems.append(f"{name} {key}: expected {want}, found {got}")
+    return problems
+
+
+rollups_cli = AppGroup('rollups', help='Maintain the daily dashboard rollup tables.')
+
+@rollups_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the rollup tables from scratch."""
+    rebuild_rollups()
+    click.echo("Rollups rebuilt successfully.")
+
+@rollups_cli.command('check')
+def check_command():
+    """Report rows where the rollups disagree with the raw tables."""
+    problems = check_rollups()
+    for problem in problems:
+        click.echo(problem)
+    if problems:
+        raise click.ClickException(f"{len(problems)} inconsistent rollup rows found.")
+    click.echo("Rollups are consistent.")
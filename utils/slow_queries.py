@@ -0,0 +1,192 @@
+# utils/slow_queries.py
+"""
+Opt-in slow query log.
+
+With SLOW_QUERY_LOG_ENABLED on, every statement that takes longer than
+SLOW_QUERY_THRESHOLD_MS is recorded together with its parameters (strings
+redacted), the endpoint, blueprint and user that issued it, and the
+database's query plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL
+and MySQL). Entries go into an in-process ring buffer of
+SLOW_QUERY_LOG_SIZE entries, shown at /dashboard/slow_queries (admins only)
+and dumpable as JSON, so an intermittent slowdown can be examined after it
+happened.
+
+The plan is taken on a separate cursor of the same DBAPI connection, right
+after the slow statement ran and within its transaction, so it reflects the
+data the statement saw. Plain EXPLAIN does not execute the statement. On
+PostgreSQL it runs inside a savepoint, so a failing EXPLAIN does not abort
+the caller's transaction.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+    'mariadb': 'EXPLAIN ',
+}
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+
+class SlowQueryLog:
+    """Bounded, thread-safe buffer of slow statements, newest last."""
+
+    def __init__(self, maxsize=200, threshold_ms=200, explain=True):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._entries = deque(maxlen=maxsize)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, threshold_ms=None, explain=None):
+        with self._lock:
+            if maxsize is not None and maxsize != self._entries.maxlen:
+                self._entries = deque(self._entries, maxlen=maxsize)
+            if threshold_ms is not None:
+                self.threshold_ms = threshold_ms
+            if explain is not None:
+                self.explain = explain
+
+    def add(self, entry):
+        with self._lock:
+            entry['id'] = next(self._ids)
+            self._entries.append(entry)
+
+    def entries(self):
+        """Recorded statements, newest first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def maxsize(self):
+        return self._entries.maxlen
+
+
+slow_query_log = SlowQueryLog()
+
+
+# --------------------------------------------------------------------------------
+# Capture
+# --------------------------------------------------------------------------------
+def _redact(value):
+    """Keep numbers, dates and NULLs (ids, amounts, ranges); hide text and blobs."""
+    if value is None or isinstance(value, (bool, int, float, date, datetime)):
+        return value.isoformat() if isinstance(value, (date, datetime)) else value
+    if isinstance(value, str):
+        return f"<str len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters, executemany=False):
+    if executemany:
+        rows = list(parameters or ())
+        first = redact_parameters(rows[0]) if rows else None
+        return {'rows': len(rows), 'first': first}
+    if isinstance(parameters, dict):
+        return {key: _redact(value) for key, value in parameters.items()}
+    return [_redact(value) for value in parameters or ()]
+
+
+def _explain(conn, cursor, statement, parameters):
+    prefix = EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return None, f"EXPLAIN is not supported for {conn.dialect.name}"
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None, None
+    # A failed statement aborts the whole transaction on PostgreSQL; the savepoint
+    # keeps a failed EXPLAIN from breaking the caller's next statement
+    savepoint = conn.dialect.name == 'postgresql'
+    explain_cursor = cursor.connection.cursor()
+    try:
+        if savepoint:
+            explain_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            plan = [' | '.join(str(column) for column in row) for row in explain_cursor.fetchall()]
+        except Exception as e:
+            if savepoint:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return None, str(e)
+        if savepoint:
+            explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan, None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        explain_cursor.close()
+
+
+def _request_info():
+    if not has_request_context():
+        return {'endpoint': None, 'blueprint': None, 'method': None, 'path': None,
+                'user_id': None, 'branch_id': None}
+    # Only a user Flask-Login already loaded; never trigger a load from here
+    user = g.get('_login_user')
+    authenticated = user is not None and getattr(user, 'is_authenticated', False)
+    return {
+        'endpoint': request.endpoint,
+        'blueprint': request.blueprint,
+        'method': request.method,
+        'path': request.path,
+        'user_id': user.get_id() if authenticated else None,
+        'branch_id': getattr(user, 'branch_id', None) if authenticated else None,
+    }
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('slow_query_started')
+    if not started:
+        return
+    duration_ms = (time.perf_counter() - started.pop()) * 1000
+    if duration_ms < slow_query_log.threshold_ms:
+        return
+    plan, explain_error = None, None
+    if slow_query_log.explain and not executemany:
+        plan, explain_error = _explain(conn, cursor, statement, parameters)
+    entry = {
+        'at': datetime.utcnow().isoformat(timespec='seconds'),
+        'duration_ms': round(duration_ms, 1),
+        'statement': statement,
+        'parameters': redact_parameters(parameters, executemany),
+        'executemany': executemany,
+        'plan': plan,
+        'explain_error': explain_error,
+    }
+    entry.update(_request_info())
+    slow_query_log.add(entry)
+
+def handle_error(exception_context):
+    connection = exception_context.connection
+    started = connection.info.get('slow_query_started') if connection is not None else None
+    if started:
+        started.pop()
+
+
+def init_slow_query_log(app):
+    """Configure the log and register the hooks when SLOW_QUERY_LOG_ENABLED is on."""
+    slow_query_log.configure(maxsize=app.config.get('SLOW_QUERY_LOG_SIZE'),
+                             threshold_ms=app.config.get('SLOW_QUERY_THRESHOLD_MS'),
+                             explain=app.config.get('SLOW_QUERY_EXPLAIN'))
+    if app.config.get('SLOW_QUERY_LOG_ENABLED') and \
+            not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+
+
+def slow_query_log_enabled():
+    return event.contains(Engine, 'after_cursor_execute', after_cursor_execute)
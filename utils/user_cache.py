@@ -0,0 +1,66 @@
+# utils/user_cache.py
+"""
+Per-process cache behind Flask-Login's user_loader.
+
+The column values of the logged-in user and of their branch are cached by
+user id. On a hit they are merged into the request's session with
+load=False, so the session gets a normal persistent User (current_user.branch
+included) without running a query.
+
+The snapshot carries the user's role, so it must not outlive a role change,
+a deactivation or a password reset made anywhere. Every commit that writes a
+User or Branch bumps the shared 'users' version counter (see
+utils/reference_data.py): the writing process clears the cache right after
+the commit, every other process, CLI included, within
+REFERENCE_DATA_CHECK_INTERVAL seconds. USER_CACHE_TTL only bounds memory.
+"""
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, User, Branch
+from utils.cache import TTLCache, MISSING
+from utils.reference_data import CacheVersion, watch
+
+VERSION_NAME = 'users'
+
+user_cache = TTLCache(maxsize=1024, ttl=60)
+user_version = CacheVersion(VERSION_NAME, user_cache)
+watch((User, Branch), user_version)
+
+
+def _snapshot(obj):
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(type(obj)).column_attrs}
+
+
+def _attach(model, values):
+    """A persistent instance in the current session built from cached values, without a query."""
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+def load_user(user_id):
+    """Flask-Login user_loader: the User with this id, or None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    user_version.check()
+    entry = user_cache.get(user_id)
+    if entry is MISSING:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        branch = db.session.get(Branch, user.branch_id) if user.branch_id is not None else None
+        user_cache.set(user_id, (_snapshot(user), _snapshot(branch) if branch is not None else None))
+        return user
+    user_values, branch_values = entry
+    if branch_values is not None:
+        # In the identity map, so current_user.branch is resolved without a query
+        _attach(Branch, branch_values)
+    return _attach(User, user_values)
+
+
+def init_user_cache(app):
+    """Configure the cache from the app config; invalidation runs on the reference data hooks."""
+    user_cache.configure(maxsize=app.config.get('USER_CACHE_SIZE'),
+                         ttl=app.config.get('USER_CACHE_TTL'))
@@ -1,9 +1,10 @@
 # views/auth.py
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from models import db, User, Branch
+from models import db, User
 from forms import LoginForm, RegistrationForm
 from utils.decorators import admin_required
+from utils.reference_data import reference_data
 
 auth_bp = Blueprint('auth', __name__, template_folder='auth')
 
@@ -28,7 +29,7 @@ def login():
 @admin_required
 def register():
     form = RegistrationForm()
-    form.branch.choices = [(branch.id, branch.name) for branch in Branch.query.all()]
+    form.branch.choices = reference_data().branch_choices()
     if form.validate_on_submit():
         existing_user = User.query.filter(
             (User.username == form.username.data) | 
@@ -1,32 +1,28 @@
 # views/b2bc.py
 from flask import Blueprint, request, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
-from models import db, SalesB2BC, Branch, CommissionRule
+from models import db, SalesB2BC
 from forms import B2BCSaleForm
 from utils.decorators import roles_required
+from utils.db_engine import retry_on_lock
+from utils.reference_data import reference_data
+from utils.commission import commission_table
 
 b2bc_bp = Blueprint('b2bc', __name__, template_folder='b2bc')
 
 @b2bc_bp.route('/new_b2bc_sale', methods=['GET', 'POST'])
 @login_required
 @roles_required('admin', 'branch_staff')
+@retry_on_lock
 def new_b2bc_sale():
     form = B2BCSaleForm()
-    form.branch.choices = [(branch.id, branch.name) for branch in Branch.query.all()]
+    form.branch.choices = reference_data().branch_choices()
     if form.validate_on_submit():
         course_name = form.course_name.data
         price = float(form.price.data)
         
         # Determine commission rate based on rules
-        commission_rule = CommissionRule.query.filter(
-            price >= CommissionRule.min_amount,
-            price <= CommissionRule.max_amount
-        ).first()
-        if not commission_rule:
-            commission_rate = 0.0
-        else:
-            commission_rate = commission_rule.rate
-        commission_amount = price * commission_rate
+        commission_rate, commission_amount = commission_table().commission(price)
         
         branch_id = form.branch.data
         noted = form.noted.data
@@ -1,31 +1,115 @@
 # views/booking.py
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from datetime import date, datetime, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
-from models import db, Booking, Branch, SalesVoucherGroup
-from forms import UpdateBookingForm, NewBookingForm, InlineUpdateBookingForm
+from sqlalchemy import func, insert
+from sqlalchemy.orm import joinedload
+from models import db, Booking, SalesVoucherGroup
+from forms import (UpdateBookingForm, NewBookingForm, InlineUpdateBookingForm, BulkBookingForm,
+                   BOOKING_STATUSES, TIME_SLOTS)
 from utils.decorators import roles_required
+from utils.db_engine import retry_on_lock, is_lock_error
+from utils.pagination import paginate_keyset, page_size_arg
+from utils.rollups import SlotCapacityError, add_booking_rollups
+from utils.availability import availability, invalidate_weeks, week_start
+from utils.dashboard_cache import invalidate_branches
+from utils.reference_data import reference_data
 
 booking_bp = Blueprint('booking', __name__, template_folder='bookings')
 
+# Upper bound on the bookings created by one bulk request
+BULK_BOOKING_MAX_ROWS = 500
+
+def _date_arg(name, default=None):
+    """Parse a YYYY-MM-DD query argument; an empty value means 'no bound'."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
 @booking_bp.route('/bookings')
 @login_required
 def list_bookings():
+    # Filters: defaults to bookings from today onward
+    status = request.args.get('status') or None
+    undated = request.args.get('undated') == '1'
+    date_from = _date_arg('date_from', default=date.today())
+    date_to = _date_arg('date_to')
     if current_user.role == 'admin':
-        bookings = Booking.query.all()
+        branch_id = request.args.get('branch_id', type=int)
+    else:
+        branch_id = current_user.branch_id
+    
+    query = Booking.query.options(joinedload(Booking.branch),
+                                  joinedload(Booking.voucher_group_sale))
+    if current_user.role != 'admin' or branch_id:
+        query = query.filter(Booking.branch_id == branch_id)
+    if status:
+        query = query.filter(Booking.status == status)
+    
+    if undated:
+        # Bookings that have not been given a date yet
+        query = query.filter(Booking.booking_date.is_(None))
+        columns, row_key = [Booking.id], None
     else:
-        bookings = Booking.query.filter_by(branch_id=current_user.branch_id).all()
+        query = query.filter(Booking.booking_date.isnot(None))
+        if date_from:
+            query = query.filter(Booking.booking_date >= date_from)
+        if date_to:
+            query = query.filter(Booking.booking_date <= date_to)
+        slot = func.coalesce(Booking.time_slot, '')
+        columns = [Booking.booking_date, slot, Booking.id]
+        row_key = lambda b: [b.booking_date, b.time_slot or '', b.id]
+    
+    page = paginate_keyset(query, columns,
+                           cursor=request.args.get('cursor'),
+                           direction=request.args.get('dir', 'next'),
+                           page_size=page_size_arg(),
+                           descending=False,
+                           row_key=row_key)
     
-    return render_template('bookings/list_bookings.html', bookings=bookings)
+    branches = reference_data().branches_sorted_by_name() if current_user.role == 'admin' else []
+    filters = {
+        'status': status or '',
+        'branch_id': branch_id if current_user.role == 'admin' else None,
+        'date_from': date_from.isoformat() if date_from else '',
+        'date_to': date_to.isoformat() if date_to else '',
+        'undated': '1' if undated else None,
+        'per_page': request.args.get('per_page'),
+    }
+    return render_template('bookings/list_bookings.html',
+                           bookings=page.items,
+                           page=page,
+                           branches=branches,
+                           filters=filters)
+
+@booking_bp.route('/availability')
+@login_required
+def slot_availability():
+    """
+    JSON branch x date x slot matrix of booked and free places.
+    ?date_from= (default today) &date_to= (default four weeks on) &branch_id= (default all)
+    """
+    date_from = _date_arg('date_from') or date.today()
+    date_to = _date_arg('date_to') or date_from + timedelta(days=27)
+    max_days = current_app.config.get('AVAILABILITY_MAX_DAYS', 92)
+    if date_to < date_from or (date_to - date_from).days >= max_days:
+        return jsonify(error=f"date_to must be on or after date_from and at most {max_days} days later."), 400
+    return jsonify(availability(date_from, date_to, request.args.get('branch_id', type=int)))
 
 @booking_bp.route('/new', methods=['GET', 'POST'])
 @login_required
 @roles_required('admin','branch_staff')
+@retry_on_lock
 def new_booking():
     """Create a brand-new booking for any sale or possibly none."""
     form = NewBookingForm()
     # Fill branches
-    form.branch_id.choices = [(b.id, b.name) for b in Branch.query.all()]
+    form.branch_id.choices = reference_data().branch_choices()
     
     if form.validate_on_submit():
         booking = Booking(
@@ -38,7 +122,12 @@ def new_booking():
             branch_id=form.branch_id.data if form.branch_id.data else None
         )
         db.session.add(booking)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except SlotCapacityError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return render_template('bookings/new_booking.html', form=form)
         flash("Booking created successfully!", "success")
         return redirect(url_for('booking.list_bookings'))
     
@@ -47,13 +136,14 @@ def new_booking():
 @booking_bp.route('/new_for_sale/<int:sale_id>', methods=['GET','POST'])
 @login_required
 @roles_required('admin','branch_staff')
+@retry_on_lock
 def new_booking_for_sale(sale_id):
     """
     Create a booking specifically for an existing sale.
     """
     sale = SalesVoucherGroup.query.get_or_404(sale_id)
     form = NewBookingForm()
-    form.branch_id.choices = [(b.id, b.name) for b in Branch.query.all()]
+    form.branch_id.choices = reference_data().branch_choices()
     
     if form.validate_on_submit():
         booking = Booking(
@@ -67,21 +157,178 @@ def new_booking_for_sale(sale_id):
             branch_id=form.branch_id.data if form.branch_id.data else None
         )
         db.session.add(booking)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except SlotCapacityError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return render_template('bookings/new_booking.html', form=form)
         flash(f"Booking created for Sale #{sale.id}!", "success")
         return redirect(url_for('booking.list_bookings'))
     
     return render_template('bookings/new_booking.html', form=form)
 
+def _create_bookings_for_sale(sale, rows, booking_name=None, status='booked', noted=None):
+    """
+    Create one booking per row dict (booking_date, time_slot, branch_id, headcount)
+    for a sale, all or nothing, with one executemany INSERT ... RETURNING. The
+    INSERT bypasses the flush hooks, so the rollups, the slot capacity check
+    and the cache invalidation are done here for the whole batch. Returns the
+    new booking ids; raises SlotCapacityError (after rolling back) when a slot
+    would be overbooked.
+    """
+    values = [
+        {
+            'voucher_group_sale_id': sale.id,
+            'booking_name': booking_name,
+            'booking_date': row['booking_date'],
+            'time_slot': row.get('time_slot') or None,
+            'status': status,
+            'actual_quantity': row.get('headcount') or 0,
+            'noted': noted,
+            'branch_id': row.get('branch_id') or sale.branch_id,
+        }
+        for row in rows
+    ]
+    dialect = db.engine.dialect
+    if not dialect.insert_executemany_returning:
+        # No RETURNING for executemany on this backend: one flush, through the hooks
+        bookings = [Booking(**value) for value in values]
+        db.session.add_all(bookings)
+        try:
+            db.session.flush()
+            booking_ids = [b.id for b in bookings]
+            db.session.commit()
+        except SlotCapacityError:
+            db.session.rollback()
+            raise
+        return booking_ids
+
+    # On SQLite, sort_by_parameter_order would send one INSERT per row. A single
+    # multi-row INSERT there assigns consecutive rowids in VALUES order, so
+    # sorting the returned ids gives the same order.
+    ordered = dialect.name != 'sqlite'
+    try:
+        booking_ids = db.session.execute(
+            insert(Booking).returning(Booking.id, sort_by_parameter_order=ordered), values).scalars().all()
+        if not ordered:
+            booking_ids.sort()
+        add_booking_rollups(db.session.connection(), values)
+        db.session.commit()
+    except SlotCapacityError:
+        db.session.rollback()
+        raise
+    invalidate_branches({value['branch_id'] for value in values})
+    invalidate_weeks({(value['branch_id'], week_start(value['booking_date'])) for value in values
+                      if value['branch_id'] is not None and value['booking_date'] is not None})
+    return booking_ids
+
+@booking_bp.route('/new_for_sale/<int:sale_id>/bulk', methods=['GET', 'POST'])
+@login_required
+@roles_required('admin','branch_staff')
+@retry_on_lock
+def bulk_new_booking_for_sale(sale_id):
+    """Create several bookings (one per filled-in row) for a group sale in one go."""
+    sale = SalesVoucherGroup.query.get_or_404(sale_id)
+    rows = max(1, min(request.args.get('rows', 10, type=int), BULK_BOOKING_MAX_ROWS))
+    if request.method == 'POST':
+        form = BulkBookingForm()
+    else:
+        form = BulkBookingForm(data={'rows': [{'branch_id': sale.branch_id}] * rows})
+    branch_choices = reference_data().branch_choices()
+    for row_form in form.rows:
+        row_form.branch_id.choices = branch_choices
+    
+    if form.validate_on_submit():
+        rows = [row_form.data for row_form in form.rows if row_form.booking_date.data]
+        if not rows:
+            flash("Fill in at least one booking date.", "warning")
+            return render_template('bookings/bulk_new_booking.html', form=form, sale=sale)
+        try:
+            booking_ids = _create_bookings_for_sale(sale, rows, form.booking_name.data or None,
+                                                    form.status.data, form.noted.data)
+        except SlotCapacityError as e:
+            flash(f"No bookings were created: {e}", 'danger')
+            return render_template('bookings/bulk_new_booking.html', form=form, sale=sale)
+        flash(f"{len(booking_ids)} bookings created for Sale #{sale.id}!", "success")
+        return redirect(url_for('booking.list_bookings'))
+    
+    return render_template('bookings/bulk_new_booking.html', form=form, sale=sale)
+
+def _parse_bulk_booking(item, branch_ids):
+    """Validate one item of a bulk booking request; return (row, error)."""
+    if not isinstance(item, dict):
+        return None, "Each booking must be an object."
+    try:
+        booking_date = datetime.strptime(item.get('booking_date') or '', '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None, "booking_date must be a YYYY-MM-DD date."
+    if booking_date < date.today():
+        return None, "Booking date cannot be in the past."
+    time_slot = item.get('time_slot') or None
+    if time_slot is not None and time_slot not in TIME_SLOTS:
+        return None, f"Unknown time slot '{time_slot}'."
+    branch_id = item.get('branch_id')
+    if branch_id is not None and branch_id not in branch_ids:
+        return None, f"Unknown branch {branch_id}."
+    try:
+        headcount = int(item.get('headcount') or 0)
+    except (TypeError, ValueError):
+        return None, "headcount must be an integer."
+    if headcount < 0:
+        return None, "headcount cannot be negative."
+    return {'booking_date': booking_date, 'time_slot': time_slot,
+            'branch_id': branch_id, 'headcount': headcount}, None
+
+@booking_bp.route('/api/new_for_sale/<int:sale_id>/bulk', methods=['POST'])
+@login_required
+@roles_required('admin','branch_staff')
+@retry_on_lock
+def bulk_new_booking_for_sale_api(sale_id):
+    """
+    Create N bookings for a sale, all or nothing.
+    Body: {"bookings": [{"booking_date": "2026-11-02", "time_slot": "09:00",
+                         "branch_id": 1, "headcount": 20}, ...],
+           "booking_name": ..., "status": "booked", "noted": ...}
+    """
+    sale = SalesVoucherGroup.query.get_or_404(sale_id)
+    payload = request.get_json(silent=True)
+    items = payload.get('bookings') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify(error='Expected {"bookings": [...]} with at least one booking.'), 400
+    if len(items) > BULK_BOOKING_MAX_ROWS:
+        return jsonify(error=f"At most {BULK_BOOKING_MAX_ROWS} bookings per request."), 400
+    status = payload.get('status') or 'booked'
+    if status not in dict(BOOKING_STATUSES):
+        return jsonify(error=f"Unknown status '{status}'."), 400
+
+    branch_ids = set(reference_data().branches_by_id)
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        row, error = _parse_bulk_booking(item, branch_ids)
+        if error is not None:
+            errors.append({'index': index, 'error': error})
+        rows.append(row)
+    if errors:
+        return jsonify(error="No bookings were created.", errors=errors), 400
+
+    try:
+        booking_ids = _create_bookings_for_sale(sale, rows, payload.get('booking_name'),
+                                                status, payload.get('noted'))
+    except SlotCapacityError as e:
+        return jsonify(error=f"No bookings were created: {e}"), 409
+    return jsonify(created=len(booking_ids), booking_ids=booking_ids), 201
+
 @booking_bp.route('/update_booking/<int:booking_id>', methods=['GET', 'POST'])
 @login_required
 @roles_required('admin', 'branch_staff')
+@retry_on_lock
 def update_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     form = UpdateBookingForm(obj=booking)
     
     # Populate branch choices
-    form.branch_id.choices = [(b.id, b.name) for b in Branch.query.all()]
+    form.branch_id.choices = reference_data().branch_choices()
     
     if form.validate_on_submit():
         # Update all relevant fields
@@ -93,7 +340,12 @@ def update_booking(booking_id):
         booking.actual_quantity = form.actual_quantity.data
         booking.noted = form.noted.data
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except SlotCapacityError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return render_template('bookings/update_booking.html', form=form, booking=booking)
         flash('Booking updated successfully!', 'success')
         return redirect(url_for('booking.list_bookings'))
     
@@ -102,6 +354,7 @@ def update_booking(booking_id):
 @booking_bp.route('/delete_booking/<int:booking_id>', methods=['GET'])
 @login_required
 @roles_required('admin', 'branch_staff')
+@retry_on_lock
 def delete_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     
@@ -115,6 +368,8 @@ def delete_booking(booking_id):
         db.session.commit()
         flash(f'Booking #{booking_id} has been deleted successfully.', 'success')
     except Exception as e:
+        if is_lock_error(e):
+            raise  # rerun by @retry_on_lock
         db.session.rollback()
         flash(f'An error occurred while deleting the booking: {str(e)}', 'danger')
     
@@ -123,6 +378,7 @@ def delete_booking(booking_id):
 @booking_bp.route('/update_booking_fields/<int:booking_id>', methods=['POST'])
 @login_required
 @roles_required('admin', 'branch_staff')
+@retry_on_lock
 def update_booking_fields(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     
@@ -148,8 +404,85 @@ def update_booking_fields(booking_id):
     try:
         db.session.commit()
         flash(f'Booking #{booking_id} has been updated successfully.', 'success')
+    except SlotCapacityError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
     except Exception as e:
+        if is_lock_error(e):
+            raise  # rerun by @retry_on_lock
         db.session.rollback()
         flash(f'An error occurred while updating the booking: {str(e)}', 'danger')
     
     return redirect(url_for('booking.list_bookings'))
+
+def _parse_field_change(change):
+    """Validate one {booking_id, status, actual_quantity} item; return (booking_id, values, error)."""
+    if not isinstance(change, dict):
+        return None, None, "Each change must be an object."
+    booking_id = change.get('booking_id')
+    if not isinstance(booking_id, int):
+        return booking_id, None, "booking_id must be an integer."
+    values = {}
+    if change.get('status') is not None:
+        if change['status'] not in dict(BOOKING_STATUSES):
+            return booking_id, None, f"Unknown status '{change['status']}'."
+        values['status'] = change['status']
+    if change.get('actual_quantity') not in (None, ''):
+        try:
+            values['actual_quantity'] = int(change['actual_quantity'])
+        except (TypeError, ValueError):
+            return booking_id, None, "Actual Quantity must be an integer."
+        if values['actual_quantity'] < 0:
+            return booking_id, None, "Actual Quantity cannot be negative."
+    if not values:
+        return booking_id, None, "Nothing to update."
+    return booking_id, values, None
+
+@booking_bp.route('/update_booking_fields', methods=['POST'])
+@login_required
+@roles_required('admin', 'branch_staff')
+@retry_on_lock
+def update_booking_fields_bulk():
+    """
+    Apply a batch of inline status / actual_quantity changes in one transaction.
+    Body: {"changes": [{"booking_id": 1, "status": "used", "actual_quantity": 12}, ...]}
+    Invalid or forbidden rows are reported and skipped; the rest are loaded with
+    one query and written in one flush (one executemany UPDATE per column set).
+    """
+    payload = request.get_json(silent=True) or {}
+    changes = payload.get('changes') if isinstance(payload, dict) else payload
+    if not isinstance(changes, list):
+        return jsonify(error='Expected {"changes": [...]}.'), 400
+
+    parsed = [_parse_field_change(change) for change in changes]
+    ids = {booking_id for booking_id, values, error in parsed if error is None}
+    bookings = {b.id: b for b in Booking.query.filter(Booking.id.in_(ids))} if ids else {}
+
+    results, applied = [], []
+    for booking_id, values, error in parsed:
+        booking = bookings.get(booking_id) if error is None else None
+        if error is None and booking is None:
+            error = "Booking not found."
+        elif error is None and current_user.role != 'admin' and booking.branch_id != current_user.branch_id:
+            error = "You do not have permission to update this booking."
+        if error is not None:
+            results.append({'booking_id': booking_id, 'ok': False, 'error': error})
+            continue
+        for name, value in values.items():
+            setattr(booking, name, value)
+        # Read now: after the commit every attribute access would reload the row
+        result = {'booking_id': booking_id, 'ok': True,
+                  'status': booking.status, 'actual_quantity': booking.actual_quantity}
+        results.append(result)
+        applied.append(result)
+
+    try:
+        db.session.commit()
+    except SlotCapacityError as e:
+        db.session.rollback()
+        for result in applied:
+            del result['status'], result['actual_quantity']
+            result.update(ok=False, error=f"Not saved: {e}")
+        return jsonify(results=results, updated=0, error=str(e)), 409
+
+    return jsonify(results=results, updated=len(applied))
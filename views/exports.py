@@ -0,0 +1,170 @@
+# views/exports.py
+import csv
+import io
+import tempfile
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, request, stream_with_context, abort, current_app
+from flask_login import login_required, current_user
+from sqlalchemy.orm import aliased
+from models import db, SalesVoucherGroup, SalesB2BC, Booking, Branch, User
+
+exports_bp = Blueprint('exports', __name__)
+
+# Rows fetched per round-trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+
+def _voucher_group_query():
+    salesperson = aliased(User)
+    s = SalesVoucherGroup
+    columns = [
+        ('Sale ID', s.id), ('Sale Date', s.sale_date), ('Type', s.sale_type),
+        ('Product', s.product_name), ('Quantity', s.quantity), ('Price (Per Unit)', s.price_per_unit),
+        ('Total Price', s.total_price), ('Vat 7%', s.vat_7), ('Total Sale', s.total_sale),
+        ('Partner Name', s.partner_name), ('Partner Company', s.partner_company),
+        ('Branch Name', Branch.name), ('Salesperson', salesperson.username),
+        ('Status', s.status), ('Notes', s.noted),
+    ]
+    query = db.session.query(*[c for _, c in columns])\
+        .outerjoin(Branch, Branch.id == s.branch_id)\
+        .outerjoin(salesperson, salesperson.id == s.salesperson_id)
+    return columns, query, s.sale_date, s.branch_id, [s.sale_date, s.id]
+
+
+def _b2bc_query():
+    salesperson = aliased(User)
+    s = SalesB2BC
+    columns = [
+        ('Sale ID', s.id), ('Sale Date', s.sale_date), ('Course Name', s.course_name),
+        ('Price', s.price), ('Commission Rate', s.commission_rate),
+        ('Commission Amount', s.commission_amount), ('Salesperson', salesperson.username),
+        ('Branch Name', Branch.name), ('Notes', s.noted),
+    ]
+    query = db.session.query(*[c for _, c in columns])\
+        .outerjoin(Branch, Branch.id == s.branch_id)\
+        .outerjoin(salesperson, salesperson.id == s.user_id)
+    return columns, query, s.sale_date, s.branch_id, [s.sale_date, s.id]
+
+
+def _bookings_query():
+    b = Booking
+    columns = [
+        ('Booking ID', b.id), ('Sale ID', b.voucher_group_sale_id), ('Booking Name', b.booking_name),
+        ('Booking Date', b.booking_date), ('Time', b.time_slot), ('Status', b.status),
+        ('Actual Quantity', b.actual_quantity), ('Branch Name', Branch.name), ('Booking Notes', b.noted),
+    ]
+    query = db.session.query(*[c for _, c in columns])\
+        .outerjoin(Branch, Branch.id == b.branch_id)
+    return columns, query, b.booking_date, b.branch_id, [b.booking_date, b.time_slot, b.id]
+
+
+DATASETS = {
+    'voucher_group_sales': _voucher_group_query,
+    'b2bc_sales': _b2bc_query,
+    'bookings': _bookings_query,
+}
+
+
+def _parse_date(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+
+def _export_rows(dataset):
+    """Return (headers, query) for a dataset with the request's filters applied."""
+    columns, query, date_column, branch_column, order = DATASETS[dataset]()
+
+    date_from = _parse_date('date_from')
+    date_to = _parse_date('date_to')
+    is_datetime = date_column.type.python_type is datetime
+    if date_from:
+        query = query.filter(date_column >= (date_from if is_datetime else date_from.date()))
+    if date_to:
+        # date_to is inclusive
+        if is_datetime:
+            query = query.filter(date_column < date_to + timedelta(days=1))
+        else:
+            query = query.filter(date_column <= date_to.date())
+
+    if current_user.role == 'admin':
+        branch_id = request.args.get('branch_id', type=int)
+        if branch_id:
+            query = query.filter(branch_column == branch_id)
+    else:
+        query = query.filter(branch_column == current_user.branch_id)
+
+    query = query.order_by(*order).yield_per(EXPORT_BATCH_SIZE)
+    return [header for header, _ in columns], query
+
+
+def _csv_stream(headers, query):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writerow(headers)
+    yield flush()
+    for row in query:
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield flush()
+    yield flush()
+
+
+def _xlsx_stream(headers, query, title):
+    """
+    Rows go through openpyxl's write-only workbook, which keeps only the
+    current row in memory; the finished file is spooled to disk and sent in
+    chunks (XLSX is a zip archive, so it cannot be emitted before it is complete).
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(headers)
+    for row in query:
+        sheet.append(list(row))
+
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+@exports_bp.route('/<dataset>.<fmt>')
+@login_required
+def export(dataset, fmt):
+    """Stream a dataset as CSV or XLSX, filtered by ?date_from=&date_to=&branch_id=."""
+    if dataset not in DATASETS or fmt not in ('csv', 'xlsx'):
+        abort(404)
+    if fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            current_app.logger.error("XLSX export requested but openpyxl is not installed.")
+            abort(501)
+
+    headers, query = _export_rows(dataset)
+    filename = f"{dataset}_{datetime.utcnow():%Y%m%d}.{fmt}"
+    if fmt == 'csv':
+        body, mimetype = _csv_stream(headers, query), 'text/csv'
+    else:
+        body = _xlsx_stream(headers, query, dataset)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
@@ -1,11 +1,27 @@
 # views/products.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
-from models import db, Product
+from models import db, Product, PricingTier
 from forms import ProductForm
+from utils.pricing import price_list, parse_tiers, format_tiers
 
 products_bp = Blueprint('products', __name__, template_folder='products')
 
+# Upper bound on the lines priced by one quote request
+QUOTE_MAX_LINES = 500
+
+def _set_tiers(product, tiers):
+    """Make the product's tiers match [(max_quantity, unit_price)], updating rows in place."""
+    existing = {t.max_quantity: t for t in product.pricing_tiers}
+    for max_quantity, unit_price in tiers:
+        tier = existing.pop(max_quantity, None)
+        if tier is None:
+            product.pricing_tiers.append(PricingTier(max_quantity=max_quantity, unit_price=unit_price))
+        else:
+            tier.unit_price = unit_price
+    for tier in existing.values():
+        product.pricing_tiers.remove(tier)
+
 @products_bp.route('/list', methods=['GET'])
 @login_required
 def list_products():
@@ -17,10 +33,18 @@ def list_products():
 def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     form = ProductForm(obj=product)
+    if request.method == 'GET':
+        form.pricing_tiers.data = format_tiers(product.pricing_tiers)
     if form.validate_on_submit():
+        try:
+            tiers = parse_tiers(form.pricing_tiers.data)
+        except ValueError as e:
+            flash(f"Invalid pricing tiers: {e}", 'danger')
+            return render_template('products/edit_product.html', form=form, product=product)
         product.name = form.name.data
         product.category = form.category.data
         product.default_price = form.default_price.data
+        _set_tiers(product, tiers)
         db.session.commit()
         flash('Product updated successfully!', 'success')
         return redirect(url_for('products.list_products'))
@@ -31,13 +55,59 @@ def edit_product(product_id):
 def new_product():
     form = ProductForm()
     if form.validate_on_submit():
+        try:
+            tiers = parse_tiers(form.pricing_tiers.data)
+        except ValueError as e:
+            flash(f"Invalid pricing tiers: {e}", 'danger')
+            return render_template('products/new_product.html', form=form)
         new_prod = Product(
             name=form.name.data,
             category=form.category.data,
             default_price=form.default_price.data
         )
+        _set_tiers(new_prod, tiers)
         db.session.add(new_prod)
         db.session.commit()
         flash('New product added!', 'success')
         return redirect(url_for('products.list_products'))
     return render_template('products/new_product.html', form=form)
+
+def _parse_quote_line(item, prices):
+    """Validate one line of a quote request; return ((product_id, quantity), error)."""
+    if not isinstance(item, dict):
+        return None, "Each line must be an object."
+    if item.get('product_id') is not None:
+        product = prices.products_by_id.get(item['product_id'])
+    else:
+        product = prices.products_by_name.get(item.get('product'))
+    if product is None:
+        return None, "Unknown product; give an existing product_id or product name."
+    quantity = item.get('quantity', 1)
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or quantity <= 0:
+        return None, "quantity must be a positive number."
+    return (product.id, quantity), None
+
+@products_bp.route('/api/quote', methods=['POST'])
+@login_required
+def quote_api():
+    """
+    Price many lines in one call with the current tiers.
+    Body: {"lines": [{"product_id": 7, "quantity": 25}, {"product": "1 Day Pass (Group)", "quantity": 3}]}
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get('lines') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify(error='Expected {"lines": [...]} with at least one line.'), 400
+    if len(items) > QUOTE_MAX_LINES:
+        return jsonify(error=f"At most {QUOTE_MAX_LINES} lines per request."), 400
+
+    prices = price_list()
+    lines, errors = [], []
+    for index, item in enumerate(items):
+        line, error = _parse_quote_line(item, prices)
+        if error is not None:
+            errors.append({'index': index, 'error': error})
+        lines.append(line)
+    if errors:
+        return jsonify(error="Nothing was quoted.", errors=errors), 400
+    return jsonify(prices.quote(lines))
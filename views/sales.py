@@ -2,9 +2,13 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 from datetime import datetime
-from models import db, SalesVoucherGroup, User, Product
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, SalesVoucherGroup, User
 from forms import VoucherGroupSaleForm
 from utils.decorators import roles_required
+from utils.db_engine import retry_on_lock
+from utils.pagination import paginate_keyset, page_size_arg
+from utils.reference_data import reference_data
 
 sales_bp = Blueprint('sales', __name__, template_folder='sales')
 
@@ -45,22 +49,30 @@ def list_voucher_group_sales():
         except:
             pass
     
-    sales = query.all()
+    # Load the salesperson and bookings of the whole page up front (no N+1)
+    query = query.options(joinedload(SalesVoucherGroup.salesperson),
+                          selectinload(SalesVoucherGroup.bookings))
+    page = paginate_keyset(query, [SalesVoucherGroup.sale_date, SalesVoucherGroup.id],
+                           cursor=request.args.get('cursor'),
+                           direction=request.args.get('dir', 'next'),
+                           page_size=page_size_arg())
     return render_template('sales/list_voucher_group_sales.html',
-                           sales=sales,
+                           sales=page.items,
+                           page=page,
                            month_filter=month_filter)
 
 @sales_bp.route('/new_voucher_group_sale', methods=['GET', 'POST'])
 @login_required
 @roles_required('admin', 'branch_staff')
+@retry_on_lock
 def new_voucher_group_sale():
     form = VoucherGroupSaleForm()
     # Populate the product dropdown
-    products = Product.query.order_by(Product.name).all()
-    form.product_id.choices = [(p.id, p.name) for p in products]
+    catalog = reference_data()
+    form.product_id.choices = catalog.product_choices()
     
     if form.validate_on_submit():
-        product = Product.query.get(form.product_id.data)
+        product = catalog.products_by_id.get(form.product_id.data)
         if not product:
             flash("Invalid product selected.", "danger")
             return redirect(url_for('sales.new_voucher_group_sale'))
@@ -103,14 +115,15 @@ def new_voucher_group_sale():
 @sales_bp.route('/edit_sale/<int:sale_id>', methods=['GET', 'POST'])
 @login_required
 @roles_required('admin', 'branch_staff')
+@retry_on_lock
 def edit_sale(sale_id):
     sale = SalesVoucherGroup.query.get_or_404(sale_id)
     form = VoucherGroupSaleForm(obj=sale)
-    products = Product.query.order_by(Product.name).all()
-    form.product_id.choices = [(p.id, p.name) for p in products]
+    catalog = reference_data()
+    form.product_id.choices = catalog.product_choices()
     
     # find matching product
-    matching_product = Product.query.filter_by(name=sale.product_name).first()
+    matching_product = catalog.products_by_name.get(sale.product_name)
     
     if request.method == 'GET':
         if matching_product:
@@ -121,7 +134,7 @@ def edit_sale(sale_id):
             form.booking_name.data = sale.bookings[0].booking_name or ''
     
     if form.validate_on_submit():
-        product = Product.query.get(form.product_id.data)
+        product = catalog.products_by_id.get(form.product_id.data)
         if not product:
             flash("Invalid product selection!", "danger")
             return redirect(url_for('sales.edit_sale', sale_id=sale.id))
@@ -141,12 +154,12 @@ def edit_sale(sale_id):
         sale.vat_7 = sale.total_price * 0.07
         sale.total_sale = sale.total_price + sale.vat_7
         
-        db.session.commit()
-        
         if sale.bookings:
             # update booking name if it exists
             sale.bookings[0].booking_name = form.booking_name.data
-            db.session.commit()
+        
+        # One commit: @retry_on_lock reruns the whole view after a lock error
+        db.session.commit()
         
         flash(f"Sale #{sale.id} updated successfully!", "success")
         return redirect(url_for('sales.list_voucher_group_sales'))
@@ -156,6 +169,7 @@ def edit_sale(sale_id):
 @sales_bp.route('/delete_sale/<int:sale_id>', methods=['GET', 'POST'])
 @login_required
 @roles_required('admin', 'branch_staff')
+@retry_on_lock
 def delete_sale(sale_id):
     sale = SalesVoucherGroup.query.get_or_404(sale_id)
     db.session.delete(sale)